@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import functools
+import concurrent.futures
+
+from aquavalet.settings import IO_THREADS
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR = None
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Returns the process wide thread pool used for blocking disk I/O, creating it on first use.
+    The pool is bounded by ``settings.IO_THREADS`` so a burst of slow syscalls (NFS stats, large
+    ``rmtree`` calls) queues up instead of spawning unbounded threads.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+            max_workers=IO_THREADS, thread_name_prefix="aquavalet-io"
+        )
+    return _EXECUTOR
+
+
+async def run(func, *args, **kwargs):
+    """Runs the blocking callable ``func`` in the I/O thread pool and awaits its result, keeping
+    the event loop free to serve other requests.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown(wait=True):
+    """Shuts down the I/O thread pool, a new one will be created on the next call to `run`."""
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=wait)
+        _EXECUTOR = None
+
+
+async def on_cleanup(app):
+    shutdown()
@@ -1,8 +1,11 @@
 import json
+import time
+import asyncio
 from aiohttp import web
 import logging
 
 
+from aquavalet import aio, metrics, session, tracing
 from aquavalet.server.routes import routes
 
 logger = logging.getLogger(__name__)
@@ -18,7 +21,10 @@ def json_error(status_code: int, exception: Exception) -> web.Response:
     """
 
     json_body = json.dumps(
-        {"error": exception.__class__.__name__, "message": exception.message}
+        {
+            "error": exception.__class__.__name__,
+            "message": getattr(exception, "message", None) or str(exception),
+        }
     )
 
     return web.json_response(status=status_code, body=json_body)
@@ -46,7 +52,96 @@ async def error_middleware(app: web.Application, handler):
     return middleware_handler
 
 
+async def tracing_middleware(app: web.Application, handler):
+    """
+    Traces each request, see :mod:`aquavalet.tracing`.
+    :param app:
+    :param handler:
+    :return:
+    """
+
+    async def middleware_handler(request):
+        request["trace"] = trace = tracing.start(f"{request.method} {request.path}")
+        try:
+            return await handler(request)
+        finally:
+            tracing.finish(trace)
+
+    return middleware_handler
+
+
+def request_labels(request):
+    """The provider and action a request is recorded under: the provider of its route, the action
+    its ``?serve=`` asks for or else the name of its route.
+    """
+    action = request.query.get("serve") or request.match_info.route.name
+    return (
+        request.match_info.get("provider", "unknown"),
+        action if action in metrics.ACTIONS else "other",
+    )
+
+
+def response_bytes(request, response):
+    """The bytes of body sent: as counted by handlers that stream, the length of the body
+    otherwise.
+    """
+    if "bytes_downloaded" in request:
+        return request["bytes_downloaded"]
+    body = getattr(response, "body", None)
+    return len(body) if isinstance(body, bytes) else 0
+
+
+async def metrics_middleware(app: web.Application, handler):
+    """
+    Records the status, duration and bytes moved of each request, see :mod:`aquavalet.metrics`.
+    Outermost, so that it sees the responses made of errors.
+    :param app:
+    :param handler:
+    :return:
+    """
+
+    async def middleware_handler(request):
+        provider, action = request_labels(request)
+        started = time.monotonic()
+        status, response = 500, None
+        try:
+            if action in metrics.STREAMING_ACTIONS:
+                with metrics.stream_in_flight(provider, action):
+                    response = await handler(request)
+            else:
+                response = await handler(request)
+            status = response.status
+            return response
+        except asyncio.CancelledError:
+            status = 499  # the client went away
+            raise
+        finally:
+            metrics.observe_request(
+                provider,
+                action,
+                status,
+                time.monotonic() - started,
+                downloaded=response_bytes(request, response),
+                uploaded=request.content.total_bytes,
+            )
+
+    return middleware_handler
+
+
+async def server_timing(request, response):
+    """Sends the spans recorded before the response headers in a ``Server-Timing`` header."""
+    trace = request.get("trace")
+    if trace is not None:
+        response.headers["Server-Timing"] = trace.server_timing()
+
+
 def app():
-    app = web.Application(middlewares=[error_middleware])
+    app = web.Application(
+        middlewares=[metrics_middleware, error_middleware, tracing_middleware]
+    )
     app.add_routes(routes)
+    app.on_startup.append(session.on_startup)
+    app.on_cleanup.append(session.on_cleanup)
+    app.on_cleanup.append(aio.on_cleanup)
+    app.on_response_prepare.append(server_timing)
     return app
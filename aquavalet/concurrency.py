@@ -0,0 +1,142 @@
+"""Adaptive concurrency limits for fan-out operations on a provider's upstream, like recursive
+copies, zips and batches.  A `Limiter` lets up to ``limit`` operations run at once and adjusts
+``limit`` from the responses of the provider's requests (AIMD): it grows by about one per round of
+responses while their latency stays within ``settings.CONCURRENCY_LATENCY_TOLERANCE`` times the
+lowest seen lately, and is multiplied by ``settings.CONCURRENCY_BACKOFF`` on a ``429``, a ``503``
+or a timeout.
+
+Providers pass their limiter to the session as the ``trace_request_ctx`` of their requests, the
+limiter learns from them through `trace_config`.
+"""
+
+import time
+import asyncio
+import weakref
+import collections
+
+import aiohttp
+
+from aquavalet import metrics, settings
+
+OVERLOADED_STATUSES = {429, 503}
+
+_LIMITERS = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+class Limiter:
+    def __init__(self, initial, minimum=1, maximum=None, name=""):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.name = name
+        self.in_flight = 0
+        self.baseline = None  # lowest latency seen lately, in seconds
+        self._decreased = 0.0
+        self._waiters = collections.deque()
+        metrics.concurrency_limit.set(self.name, value=int(self.limit))
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Waits until fewer than ``limit`` operations run, first come first served."""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not waiter.cancelled():
+                self.release()  # the slot was granted as the waiter was cancelled
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def observe(self, started, overloaded=False):
+        """Adjusts the limit from a request sent at ``started``, a ``time.monotonic()`` time,
+        that just got its response or failed.  Requests sent before the last decrease don't
+        decrease it again, a burst of failures backs off once.
+        """
+        latency = time.monotonic() - started
+        if overloaded:
+            if started >= self._decreased:
+                self._decreased = time.monotonic()
+                self._set_limit(self.limit * settings.CONCURRENCY_BACKOFF)
+            return
+
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += (
+                latency - self.baseline
+            ) / 100  # forgets an old low slowly
+
+        busy = self.in_flight + len(self._waiters) >= int(self.limit)
+        if busy and latency <= self.baseline * settings.CONCURRENCY_LATENCY_TOLERANCE:
+            self._set_limit(self.limit + 1 / self.limit)
+
+    def _set_limit(self, limit):
+        self.limit = min(max(limit, self.minimum), self.maximum)
+        metrics.concurrency_limit.set(self.name, value=int(self.limit))
+        self._wake()
+
+
+def limiter(name):
+    """Returns the adaptive limiter of the provider ``name`` for the running event loop."""
+    limiters = _LIMITERS.setdefault(asyncio.get_running_loop(), {})
+    if name not in limiters:
+        limiters[name] = Limiter(
+            settings.CONCURRENT_OPS,
+            settings.CONCURRENT_OPS_MIN,
+            settings.CONCURRENT_OPS_MAX,
+            name=name,
+        )
+    return limiters[name]
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Returns a ``TraceConfig`` reporting the outcome of requests sent with a `Limiter` as their
+    ``trace_request_ctx`` to that limiter.
+    """
+
+    async def on_request_start(session, context, params):
+        context.started = time.monotonic()
+
+    async def on_request_end(session, context, params):
+        if isinstance(context.trace_request_ctx, Limiter):
+            context.trace_request_ctx.observe(
+                context.started, params.response.status in OVERLOADED_STATUSES
+            )
+
+    async def on_request_exception(session, context, params):
+        if isinstance(context.trace_request_ctx, Limiter) and isinstance(
+            params.exception, asyncio.TimeoutError
+        ):
+            context.trace_request_ctx.observe(context.started, overloaded=True)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
@@ -7,6 +7,8 @@ DEFAULT_ERROR_MSG = (
 
 
 class WaterButlerError(HTTPException):
+    status = 500
+
     def __init__(self, message):
         self.message = message
 
@@ -23,6 +25,7 @@ class InvalidParameters(WaterButlerError):
     """
 
     code = 400
+    status = 400
 
 
 class UnsupportedHTTPMethodError(WaterButlerError):
@@ -113,7 +116,7 @@ class DeleteError(UnhandledProviderError):
 
 
 class DownloadError(UnhandledProviderError):
-    pass
+    status = 502
 
 
 class IntraCopyError(UnhandledProviderError):
@@ -1,6 +1,7 @@
 import os
 import abc
 import hashlib
+import functools
 import mimetypes
 from urllib.parse import urlparse, quote
 
@@ -13,19 +14,17 @@ class BaseMetadata(metaclass=abc.ABCMeta):
         self.default_segments = [self.provider]
 
     def serialized(self) -> dict:
-
-        _, ext = os.path.splitext(self.name)
+        name = self.name
+        _, ext = os.path.splitext(name)
         return {
             "kind": self.kind,
-            "name": self.name,
+            "name": name,
             "path": self.id,
             "size": self.size,
             "modified": self.modified,
             "mimetype": mimetypes.types_map.get(ext),
             "provider": self.provider,
-            "etag": hashlib.sha256(
-                "{}::{}".format(self.provider, self.etag).encode("utf-8")
-            ).hexdigest(),
+            "etag": self.etag_hash,
         }
 
     def json_api_serialized(self) -> dict:
@@ -38,24 +37,31 @@ class BaseMetadata(metaclass=abc.ABCMeta):
         return json_api
 
     def _json_api_links(self) -> dict:
-        actions = {}
-        path_segments = [
-            quote(seg) for seg in self.attributes["path"].split("/") if seg
-        ]
-
-        actions["info"] = self.construct_path(path_segments, "meta")
-        actions["delete"] = self.construct_path(path_segments, "delete")
-
-        if self.kind == "folder":
-            actions["children"] = self.construct_path(path_segments, "children")
-            actions["upload"] = self.construct_path(path_segments, "upload")
-            actions["download_as_zip"] = self.construct_path(
-                path_segments, "download_as_zip"
-            )
-        else:
-            actions["download"] = self.construct_path(path_segments, "download")
-
-        return actions
+        """The same links `construct_path` builds, from a prefix shared by every item of the
+        provider and the path quoted once.
+        """
+        path = quote("/".join(seg for seg in self.attributes["path"].split("/") if seg))
+        url = _link_prefix(settings.DOMAIN, tuple(self.default_segments))
+        is_folder = self.kind == "folder"
+        if path:
+            url += "/" + path
+        if is_folder or not path:
+            url += "/"
+        url += "?serve="
+
+        if is_folder:
+            return {
+                "info": url + "meta",
+                "delete": url + "delete",
+                "children": url + "children",
+                "upload": url + "upload",
+                "download_as_zip": url + "download_as_zip",
+            }
+        return {
+            "info": url + "meta",
+            "delete": url + "delete",
+            "download": url + "download",
+        }
 
     def construct_path(self, path, action) -> str:
         segments = self.default_segments + path
@@ -95,3 +101,25 @@ class BaseMetadata(metaclass=abc.ABCMeta):
     @property
     def etag(self) -> str:
         raise NotImplementedError
+
+    @property
+    def etag_hash(self) -> str:
+        """The provider scoped hash of `etag` that is handed out to clients, computed once per
+        etag.
+        """
+        etag = self.etag
+        cached = getattr(self, "_etag_hash", None)
+        if cached is None or cached[0] != etag:
+            cached = self._etag_hash = (
+                etag,
+                hashlib.sha256(
+                    "{}::{}".format(self.provider, etag).encode("utf-8")
+                ).hexdigest(),
+            )
+        return cached[1]
+
+
+@functools.lru_cache(maxsize=1024)
+def _link_prefix(domain, segments) -> str:
+    """``<domain>/<provider segments>``, the start of every link of a provider's items."""
+    return domain + "/" + "/".join(segments)
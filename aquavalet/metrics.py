@@ -0,0 +1,290 @@
+"""In process counters, gauges and histograms, exposed in the Prometheus text format by the
+``/metrics`` route.  Recording is a dict lookup and an addition, with no locks: metrics are only
+recorded from the event loop.  With the pre-fork server each worker reports its own values.
+"""
+
+import bisect
+import time
+import contextlib
+
+import aiohttp
+
+# Seconds, from fast metadata calls up to long transfers
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+)
+
+# Actions requests are labelled with, others are reported as ``other`` to keep the number of label
+# values bounded.  Requests of streaming actions are also counted in ``streams_in_flight``.
+ACTIONS = {
+    "children",
+    "delete",
+    "meta",
+    "rename",
+    "upload",
+    "create_folder",
+    "download",
+    "download_as_zip",
+    "parent",
+    "copy",
+    "move",
+    "versions",
+    "usage",
+    "batch",
+}
+STREAMING_ACTIONS = {"download", "download_as_zip", "upload"}
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return (
+            "{"
+            + ",".join(
+                '{}="{}"'.format(
+                    name,
+                    str(value)
+                    .replace("\\", "\\\\")
+                    .replace("\n", "\\n")
+                    .replace('"', '\\"'),
+                )
+                for name, value in pairs
+            )
+            + "}"
+        )
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        for key in sorted(self.values, key=lambda key: tuple(map(str, key))):
+            lines.extend(self._render_sample(key, self.values[key]))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        try:
+            counts, total = self.values[labels]
+        except KeyError:
+            counts, total = [0] * (len(self.buckets) + 1), 0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[labels] = (counts, total + value)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            labels = self._format_labels(key, ("le", bound))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+requests = REGISTRY.register(
+    Counter(
+        "aquavalet_requests_total",
+        "Requests handled.",
+        ("provider", "action", "status"),
+    )
+)
+request_duration = REGISTRY.register(
+    Histogram(
+        "aquavalet_request_duration_seconds",
+        "Time taken to handle a request.",
+        ("provider", "action"),
+    )
+)
+bytes_downloaded = REGISTRY.register(
+    Counter(
+        "aquavalet_downloaded_bytes_total",
+        "Bytes sent to clients.",
+        ("provider", "action"),
+    )
+)
+bytes_uploaded = REGISTRY.register(
+    Counter(
+        "aquavalet_uploaded_bytes_total",
+        "Bytes received from clients.",
+        ("provider", "action"),
+    )
+)
+streams_in_flight = REGISTRY.register(
+    Gauge(
+        "aquavalet_streams_in_flight",
+        "Downloads and uploads currently streaming.",
+        ("provider", "action"),
+    )
+)
+coalesced_reads = REGISTRY.register(
+    Counter(
+        "aquavalet_coalesced_reads_total",
+        "Provider reads answered by joining an identical read in flight.",
+        ("provider", "action"),
+    )
+)
+ratelimit_waiters = REGISTRY.register(
+    Gauge(
+        "aquavalet_ratelimit_waiters",
+        "Outgoing requests waiting for their host's rate limit.",
+        ("host",),
+    )
+)
+ratelimit_wait = REGISTRY.register(
+    Counter(
+        "aquavalet_ratelimit_wait_seconds_total",
+        "Time outgoing requests spent waiting for their host's rate limit.",
+        ("host",),
+    )
+)
+concurrency_limit = REGISTRY.register(
+    Gauge(
+        "aquavalet_concurrency_limit",
+        "Operations a provider runs against its upstream at once, as adapted to its responses.",
+        ("provider",),
+    )
+)
+retries = REGISTRY.register(
+    Counter(
+        "aquavalet_upstream_retries_total",
+        "Requests to upstream services retried, by status or error of the failed attempt.",
+        ("host", "reason"),
+    )
+)
+retry_give_ups = REGISTRY.register(
+    Counter(
+        "aquavalet_upstream_retry_give_ups_total",
+        "Failed requests to upstream services not retried: out of attempts, out of budget, or "
+        "asked to wait too long.",
+        ("host", "reason"),
+    )
+)
+upstream_duration = REGISTRY.register(
+    Histogram(
+        "aquavalet_upstream_request_duration_seconds",
+        "Time until the response headers of requests made to upstream services.",
+        ("host", "method", "status"),
+    )
+)
+
+
+def observe_request(provider, action, status, duration, downloaded=0, uploaded=0):
+    requests.inc(provider, action, status)
+    request_duration.observe(duration, provider, action)
+    if downloaded:
+        bytes_downloaded.inc(provider, action, amount=downloaded)
+    if uploaded:
+        bytes_uploaded.inc(provider, action, amount=uploaded)
+
+
+@contextlib.contextmanager
+def stream_in_flight(provider, action):
+    streams_in_flight.inc(provider, action)
+    try:
+        yield
+    finally:
+        streams_in_flight.dec(provider, action)
+
+
+def upstream_trace_config() -> aiohttp.TraceConfig:
+    """Returns a ``TraceConfig`` recording the latency of every request made by a session."""
+
+    async def on_request_start(session, context, params):
+        context.started = time.monotonic()
+
+    async def on_request_end(session, context, params):
+        upstream_duration.observe(
+            time.monotonic() - context.started,
+            params.url.host,
+            params.method,
+            params.response.status,
+        )
+
+    async def on_request_exception(session, context, params):
+        upstream_duration.observe(
+            time.monotonic() - context.started,
+            params.url.host,
+            params.method,
+            type(params.exception).__name__,
+        )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
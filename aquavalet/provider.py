@@ -1,50 +1,61 @@
 import os
 import abc
+import json
 import time
+import heapq
 import typing
+import hashlib
 import asyncio
 import logging
-import weakref
+import mimetypes
 import functools
+import collections
 
+import yarl
 import aiohttp
 
-from aquavalet import metadata as wb_metadata, exceptions
+from aquavalet import (
+    metadata as wb_metadata,
+    concurrency,
+    exceptions,
+    metrics,
+    retry,
+    settings,
+    singleflight,
+    transfer,
+)
+from aquavalet.session import get_session
 from aquavalet.settings import CONCURRENT_OPS
 from aquavalet.streams.zip import ZipStreamReader, ZipStreamGeneratorReader
+from aquavalet.streams.byteranges import ByteRangesStream
 
 
 logger = logging.getLogger(__name__)
-_THROTTLES = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+_USAGE_CACHE = collections.OrderedDict()  # type: collections.OrderedDict
+_IN_FLIGHT = singleflight.Group()
 
 
-def throttle(concurrency=10, interval=1):
-    def _throttle(func):
-        @functools.wraps(func)
-        async def wrapped(*args, **kwargs):
-            if asyncio.get_event_loop() not in _THROTTLES:
-                count, last_call, event = 0, time.time(), asyncio.Event()
-                _THROTTLES[asyncio.get_event_loop()] = (count, last_call, event)
-                event.set()
-            else:
-                count, last_call, event = _THROTTLES[asyncio.get_event_loop()]
-
-            await event.wait()
-            count += 1
-            if count > concurrency:
-                count = 0
-                if (time.time() - last_call) < interval:
-                    event.clear()
-                    await asyncio.sleep(interval - (time.time() - last_call))
-                    event.set()
-
-            last_call = time.time()
-            _THROTTLES[asyncio.get_event_loop()] = (count, last_call, event)
-            return await func(*args, **kwargs)
+def splits_reads(func):
+    """Marks a provider method as a write: shared reads of the items it is passed are split off,
+    when it starts and again when it is done, see `BaseProvider.shared_read`.
+    """
 
-        return wrapped
+    @functools.wraps(func)
+    async def wrapped(self, *args, **kwargs):
+        items = [
+            arg
+            for arg in (*args, *kwargs.values())
+            if isinstance(arg, wb_metadata.BaseMetadata)
+        ]
+        for item in items:
+            self._split_reads(item)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            for item in items:
+                self._split_reads(item)
 
-    return _throttle
+    return wrapped
 
 
 class BaseProvider(metaclass=abc.ABCMeta):
@@ -62,7 +73,10 @@ class BaseProvider(metaclass=abc.ABCMeta):
     BASE_URL = None
 
     def __init__(
-        self, auth: dict, retry_on: typing.Set[int] = {408, 502, 503, 504}
+        self,
+        auth: dict,
+        retry_on: typing.Set[int] = {408, 429, 502, 503, 504},
+        session: aiohttp.ClientSession = None,
     ) -> None:
         """
         :param auth: ( :class:`dict` ) Information about the user this provider will act on the behalf of
@@ -70,14 +84,96 @@ class BaseProvider(metaclass=abc.ABCMeta):
             ofter an OAuth 2 token
         :param settings: ( :class:`dict` ) Configuration settings for this provider,
             often folder or repo
+        :param retry_on: ( :class:`set` ) Statuses of upstream responses worth retrying, see
+            `make_request`
+        :param session: ( :class:`aiohttp.ClientSession` ) The pooled session to make requests
+            with, defaults to the process wide one from :mod:`aquavalet.session`
         """
         self._retry_on = retry_on
+        self._session = session
         self.auth = auth
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._session or get_session()
+
+    def make_request(
+        self, method: str, url: str, headers: dict = None, idempotent=None, **kwargs
+    ):
+        """Sends a request through the shared session with `default_headers`, every outgoing
+        request goes through here.  The result can be awaited for the response, or used as an
+        ``async with`` block to release the connection when done.  Responses are reported to the
+        provider's `limiter`.
+
+        Failures worth trying again, a status in ``retry_on`` included, are retried by
+        :mod:`aquavalet.retry` when the request is ``idempotent``, by default when its method is
+        safe, and its body can be sent again.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in retry.SAFE_METHODS
+
+        def send():
+            return self.session.request(
+                method,
+                url,
+                headers={**self.default_headers, **(headers or {})},
+                trace_request_ctx=self.limiter,
+                **kwargs,
+            )
+
+        return retry.RetryingRequest(
+            send,
+            yarl.URL(url).host,
+            self._retry_on,
+            retryable=idempotent and retry.is_replayable(kwargs.get("data")),
+        )
+
+    @property
+    def limiter(self) -> typing.Optional[concurrency.Limiter]:
+        """The `concurrency.Limiter` shared by operations that fan out to this provider's upstream,
+        ``None`` for providers without one, which run up to ``CONCURRENT_OPS`` at a time.
+        """
+        return None
+
     @property
     def name(self) -> str:
         return "base provider"
 
+    async def shared_read(self, segments, path, action, func, version=None):
+        """Returns ``await func()``, the ``action`` read of ``path`` in the resource identified by
+        ``segments``, an item's ``default_segments``.  Concurrent identical reads, keyed by
+        provider, resource, credentials, path, action and version, share a single call: callers
+        with other credentials never get a result fetched with someone else's.  Writes marked
+        with `splits_reads` make later reads start afresh instead of joining one that may miss the
+        write.
+        """
+        if not settings.COALESCE_READS:
+            return await func()
+        key = (*segments, self._identity(), path, action, version)
+        result, shared = await _IN_FLIGHT.do(key, func)
+        if shared:
+            metrics.coalesced_reads.inc(self.name, action)
+        return result
+
+    def _split_reads(self, item):
+        scope = tuple(item.default_segments)
+        affected = self._affected_paths(item)
+        # Reads of every caller of the resource, whatever their credentials
+        _IN_FLIGHT.forget(lambda key: key[:-4] == scope and affected(key[-3]))
+
+    def _identity(self) -> str:
+        """A digest of the credentials requests are made with, ``auth`` and `default_headers`."""
+        credentials = json.dumps(
+            [self.auth, self.default_headers], sort_keys=True, default=str
+        )
+        return hashlib.sha256(credentials.encode()).hexdigest()
+
+    def _affected_paths(self, item):
+        """Returns whether a read of a path may see a write to ``item``.  Any path of its resource
+        by default, providers with nested paths narrow it down.
+        """
+        return lambda path: True
+
     def __eq__(self, other):
         try:
             return type(self) == type(other) and self.auth == other.auth
@@ -120,9 +216,7 @@ class BaseProvider(metaclass=abc.ABCMeta):
                 400: exceptions.InvalidPathError(item),
                 401: exceptions.AuthError(f"Bad credentials provided"),
                 403: exceptions.Forbidden(f"Forbidden"),
-                404: exceptions.NotFoundError(
-                    f"Item at path '{path or item.name}' cannot be found."
-                ),
+                404: exceptions.NotFoundError(path or item.name),
                 410: exceptions.Gone(
                     f"Item at path '{path or item.name}' has been removed."
                 ),
@@ -179,61 +273,77 @@ class BaseProvider(metaclass=abc.ABCMeta):
             num += 1
         return await self.upload(item, stream=stream, new_name=new_name)
 
-    async def move(self, dest_provider, item, destination_item, conflict):
-
-        if item.is_folder:
-            return await self._recursive_op(self.move, dest_provider, item, destination_item)  # type: ignore
-
-        async with aiohttp.ClientSession() as session:
-            download_stream = await self.download(item, session)
-            await dest_provider.upload(
-                destination_item, download_stream, new_name=item.name, conflict=conflict
-            )
-
+    async def move(self, item, destination_item, dest_provider, conflict):
+        """Copies ``item`` into the folder ``destination_item``, then deletes it."""
+        result = await self.copy(item, destination_item, dest_provider, conflict)
         await self.delete(item)
+        return result
 
     async def copy(self, item, destination_item, dest_provider, conflict):
-
+        """Copies ``item`` into the folder ``destination_item`` of ``dest_provider``, folders with
+        a `transfer.TreeTransfer`.
+        """
         if item.is_folder:
-            return await self._recursive_op(
-                self.copy, item, destination_item, dest_provider
+            return await transfer.TreeTransfer(self, dest_provider, conflict).run(
+                item, destination_item
             )
 
-        async with aiohttp.ClientSession() as session:
-            download_stream = await self.download(item, session)
-            await dest_provider.upload(
-                destination_item, download_stream, new_name=item.name, conflict=conflict
-            )
-
-    async def _recursive_op(self, func, src_path, dest_item, dest_provider):
-        folder = await dest_provider.create_folder(
-            item=dest_item, new_name=src_path.name
+        return await transfer.copy_file(
+            self, item, dest_provider, destination_item, conflict
         )
-        folder.children = []
-
-        items = await self.children(item=src_path)
-
-        for i in range(0, len(items), CONCURRENT_OPS):
-            futures = []
-            for item in items[i : i + CONCURRENT_OPS]:
-                futures.append(
-                    asyncio.ensure_future(
-                        func(dest_provider, item=item, destination_item=folder)
-                    )
-                )
 
-                if item.is_folder:
-                    await futures[-1]
+    async def usage(self, item) -> dict:
+        """Returns the total ``size`` in bytes and the number of ``files`` and ``folders`` below
+        the given folder.  Results are cached for ``settings.USAGE_CACHE_TTL`` seconds, or until
+        the folder's etag changes.
+        """
+        key = (*item.default_segments, item.id)
+        try:
+            etag, expires, usage = _USAGE_CACHE[key]
+        except KeyError:
+            pass
+        else:
+            if etag == item.etag and expires > time.monotonic():
+                _USAGE_CACHE.move_to_end(key)
+                return usage.copy()
 
-            if not futures:
-                continue
+        usage = await self._usage(
+            item, self.limiter or asyncio.Semaphore(CONCURRENT_OPS)
+        )
 
-            done, _ = await asyncio.wait(futures)
+        _USAGE_CACHE[key] = (
+            item.etag,
+            time.monotonic() + settings.USAGE_CACHE_TTL,
+            usage,
+        )
+        _USAGE_CACHE.move_to_end(key)
+        while len(_USAGE_CACHE) > settings.USAGE_CACHE_SIZE:
+            _USAGE_CACHE.popitem(last=False)
+
+        return usage.copy()
+
+    async def _usage(self, item, semaphore) -> dict:
+        """Walks the tree with `children`, listing as many folders at once as ``semaphore`` lets."""
+        async with semaphore:
+            children = await self.children(item)
+
+        usage = {"size": 0, "files": 0, "folders": 0}
+        folders = []
+        for child in children:
+            if child.is_folder:
+                usage["folders"] += 1
+                folders.append(child)
+            else:
+                usage["files"] += 1
+                usage["size"] += child.size or 0
 
-            for fut in done:
-                folder.children.append(fut.result())
+        for subtree in await asyncio.gather(
+            *(self._usage(folder, semaphore) for folder in folders)
+        ):
+            for name, value in subtree.items():
+                usage[name] += value
 
-        return folder
+        return usage
 
     def can_intra_copy(self, dest_provider, item=None):
         return False
@@ -241,14 +351,28 @@ class BaseProvider(metaclass=abc.ABCMeta):
     def can_intra_move(self, other, path) -> bool:
         return False
 
-    async def zip(self, item, session) -> ZipStreamGeneratorReader:
+    async def zip(self, item) -> ZipStreamGeneratorReader:
         """Streams a Zip archive of the given folder"""
         children = await self.children(item)
-        return ZipStreamReader(ZipStreamGeneratorReader(self, item, children, session))
+        return ZipStreamReader(ZipStreamGeneratorReader(self, item, children))
 
     async def download(self, item=None, version=None, range=None):
         raise NotImplementedError
 
+    async def download_ranges(self, item, ranges, version=None) -> ByteRangesStream:
+        """Streams several inclusive ``(start, end)`` ranges of a file as ``multipart/byteranges``,
+        the ranges sorted and not overlapping.  By default each part is a ranged `download`.
+        """
+
+        def open_part(range):
+            return lambda: self.download(item, version=version, range=range)
+
+        return ByteRangesStream(
+            [(start, end, open_part((start, end))) for start, end in ranges],
+            item.size,
+            _content_type(item.name),
+        )
+
     async def upload(self, stream, new_name, item=None):
         raise NotImplementedError
 
@@ -261,6 +385,29 @@ class BaseProvider(metaclass=abc.ABCMeta):
     async def children(self, item=None) -> []:
         raise NotImplementedError
 
+    async def iter_children(self, item):
+        """Yields the children of a folder as they are listed, in no particular order.  Providers
+        that can list a folder in pieces override this so memory use doesn't grow with its size.
+        """
+        for child in await self.children(item):
+            yield child
+
+    async def children_page(self, item, limit, cursor=None):
+        """Returns the first ``limit`` children of a folder, by name, whose name sorts after
+        ``cursor``, and the cursor of the next page, ``None`` on the last page.  Only the best
+        ``limit`` candidates seen so far are kept while walking `iter_children`.
+        """
+        page = []
+        async for child in self.iter_children(item):
+            if cursor is None or child.name > cursor:
+                page.append(child)
+                if len(page) > 2 * (limit + 1):
+                    page = heapq.nsmallest(limit + 1, page, key=_name)
+        page = heapq.nsmallest(limit + 1, page, key=_name)
+
+        next_cursor = page[limit - 1].name if len(page) > limit else None
+        return page[:limit], next_cursor
+
     async def validate_item(self, item=None) -> wb_metadata.BaseMetadata:
         raise NotImplementedError
 
@@ -280,3 +427,12 @@ class BaseProvider(metaclass=abc.ABCMeta):
         start = "" if start is None else start
         end = "" if end is None else end
         return "bytes={}-{}".format(start, end)
+
+
+def _content_type(name):
+    _, ext = os.path.splitext(name or "")
+    return mimetypes.types_map.get(ext, "application/octet-stream")
+
+
+def _name(item):
+    return item.name
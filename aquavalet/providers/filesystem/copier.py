@@ -0,0 +1,173 @@
+import os
+import time
+import errno
+import fcntl
+import shutil
+import asyncio
+import logging
+import threading
+
+from aquavalet import aio, settings
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int), from linux/fs.h
+
+# Errors meaning the kernel can't do this copy for us, the next strategy is tried instead
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+in_progress = set()  # CopyProgress of every running tree copy
+
+
+class CopyProgress:
+    """Running totals of a copy.  Updated from the worker threads, read from anywhere."""
+
+    def __init__(self, src, dest):
+        self.src = src
+        self.dest = dest
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, files=0, bytes=0):
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += bytes
+
+    def serialized(self) -> dict:
+        return {
+            "src": self.src,
+            "dest": self.dest,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "bytes_total": self.bytes_total,
+            "bytes_done": self.bytes_done,
+            "elapsed": time.monotonic() - self.started,
+        }
+
+
+def _clone(fsrc, fdst):
+    """Shares the source's extents with the destination (reflink), XFS and btrfs support this."""
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError as exc:
+        if exc.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(fsrc, fdst, progress):
+    """Copies inside the kernel with ``copy_file_range``, which can also offload the copy to the
+    filesystem or storage.  Returns True once the end of the file was reached, False if the kernel
+    stopped short: the file offsets are then where it stopped, for the rest to be copied buffered.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    while True:
+        try:
+            sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30)
+        except OSError as exc:
+            if exc.errno in _UNSUPPORTED:
+                return False
+            raise
+        if not sent:
+            return True
+        if progress:
+            progress.add(bytes=sent)
+
+
+def _copy_buffered(fsrc, fdst, progress):
+    while True:
+        chunk = fsrc.read(settings.COPY_BUFFER_SIZE)
+        if not chunk:
+            return
+        fdst.write(chunk)
+        if progress:
+            progress.add(bytes=len(chunk))
+
+
+def copy_file(src, dest, progress=None):
+    """Copies the file at ``src`` to ``dest`` and its permission bits, blocking.  Uses a reflink
+    where the filesystem supports it, then ``copy_file_range``, then a buffered copy.
+    """
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        if settings.KERNEL_COPY and _clone(fsrc, fdst):
+            if progress:
+                progress.add(bytes=os.fstat(fsrc.fileno()).st_size)
+        elif not (settings.KERNEL_COPY and _copy_file_range(fsrc, fdst, progress)):
+            _copy_buffered(fsrc, fdst, progress)
+    shutil.copymode(src, dest)
+    if progress:
+        progress.add(files=1)
+
+
+def _plan_tree(src, dest, progress):
+    """Creates ``dest`` and every folder below it, and returns the (src, dest) pairs of the files
+    that need copying.  Symlinks are recreated as they are, never followed.
+    """
+    files = []
+    folders = [(src, dest)]
+    while folders:
+        src_folder, dest_folder = folders.pop()
+        os.mkdir(dest_folder)
+        shutil.copymode(src_folder, dest_folder)
+        with os.scandir(src_folder) as entries:
+            for entry in entries:
+                target = os.path.join(dest_folder, entry.name)
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir(follow_symlinks=False):
+                    folders.append((entry.path, target))
+                else:
+                    files.append((entry.path, target))
+                    progress.files_total += 1
+                    progress.bytes_total += entry.stat(follow_symlinks=False).st_size
+    return files
+
+
+async def copy_tree(src, dest, workers=None, progress=None):
+    """Copies the folder ``src`` to ``dest``, which must not exist yet.  The folder structure is
+    created first, then the files are shared out between ``workers`` (default
+    ``settings.COPY_WORKERS``) copying in parallel in the I/O thread pool.  The first error
+    cancels the remaining copies.  Returns the `CopyProgress` of the copy.
+    """
+    progress = progress or CopyProgress(src, dest)
+
+    async def worker(files):
+        for src_file, dest_file in files:
+            await aio.run(copy_file, src_file, dest_file, progress=progress)
+
+    in_progress.add(progress)
+    try:
+        files = iter(await aio.run(_plan_tree, src, dest, progress))
+        tasks = [
+            asyncio.ensure_future(worker(files))
+            for _ in range(workers or settings.COPY_WORKERS)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    finally:
+        in_progress.discard(progress)
+
+    logger.debug(
+        "Copied {files_done} files ({bytes_done} bytes) from {src} to {dest} "
+        "in {elapsed:.2f}s".format(**progress.serialized())
+    )
+    return progress
@@ -0,0 +1,143 @@
+import os
+import mmap
+import logging
+import threading
+import collections
+
+from aquavalet import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Mapping:
+    """A read only memory map of one version of a file, shared by every stream reading it.  The
+    map is closed once it has been evicted from its `MappingCache` and the last reader has
+    called `release`.
+    """
+
+    def __init__(self, cache, key, path, mmap):
+        self.cache = cache
+        self.key = key
+        self.path = path
+        self.mmap = mmap
+        self.size = len(mmap)
+        self.refs = 0
+        self.evicted = False
+
+    def release(self):
+        self.cache.release(self)
+
+    def close(self):
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Slices are still held by a transport; the map is unmapped once they are collected
+            pass
+
+
+class MappingCache:
+    """Reference counted, least recently used cache of `Mapping` objects.
+
+    Files larger than ``max_file_size`` are never mapped and the total size of the mapped files
+    is kept under ``max_total`` by evicting the least recently used mappings that no stream is
+    reading.  Mappings are keyed on the file's inode, mtime and size so a modified file is mapped
+    afresh instead of serving stale pages.  A hit costs a ``stat`` of the path, files are only
+    opened to be mapped.
+
+    `acquire` stats and opens files so it should be called from the I/O thread pool.
+    """
+
+    def __init__(self, max_file_size, max_total):
+        self.max_file_size = max_file_size
+        self.max_total = max_total
+        self.mapped_bytes = 0
+        self._lock = threading.Lock()
+        self._mappings = collections.OrderedDict()  # key -> Mapping, oldest first
+        self._keys = {}  # path -> key of the latest mapping of that path
+
+    def __len__(self):
+        return len(self._mappings)
+
+    def acquire(self, path):
+        """Returns a `Mapping` of ``path`` with its reference count raised, or None if the file
+        shouldn't or can't be mapped.  The caller must call `Mapping.release` when done.
+        """
+        key = self._key(os.stat(path))
+        if key is None:
+            return None
+        with self._lock:
+            mapping = self._mappings.get(key)
+            if mapping is not None:
+                self._mappings.move_to_end(key)
+                mapping.refs += 1
+                return mapping
+
+        with open(path, "rb") as file_pointer:
+            # Keyed on what is mapped, the path may have been replaced since it was stat'ed
+            key = self._key(os.fstat(file_pointer.fileno()))
+            if key is None:
+                return None
+            try:
+                mapped = mmap.mmap(file_pointer.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as exc:
+                logger.info("Could not map {}: {!r}".format(path, exc))
+                return None
+
+        with self._lock:
+            mapping = self._mappings.get(key)
+            if mapping is not None:  # mapped by a concurrent reader in the meantime
+                mapped.close()
+                mapping.refs += 1
+                return mapping
+
+            stale = self._mappings.get(self._keys.get(path))
+            if stale is not None:
+                self._evict(stale)
+
+            mapping = Mapping(self, key, path, mapped)
+            self._evict_until(self.max_total - mapping.size)
+            if self.mapped_bytes + mapping.size > self.max_total:
+                mapping.close()
+                return None
+
+            mapping.refs = 1
+            self._mappings[key] = mapping
+            self._keys[path] = key
+            self.mapped_bytes += mapping.size
+            return mapping
+
+    def _key(self, stat):
+        """The key of the file ``stat`` describes, None if it is empty or too large to map."""
+        if not 0 < stat.st_size <= self.max_file_size:
+            return None
+        return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def release(self, mapping):
+        with self._lock:
+            mapping.refs -= 1
+            if mapping.evicted and mapping.refs <= 0:
+                mapping.close()
+
+    def clear(self):
+        with self._lock:
+            for mapping in list(self._mappings.values()):
+                self._evict(mapping)
+
+    def _evict_until(self, limit):
+        for mapping in list(self._mappings.values()):
+            if self.mapped_bytes <= limit:
+                break
+            if mapping.refs <= 0:
+                self._evict(mapping)
+
+    def _evict(self, mapping):
+        del self._mappings[mapping.key]
+        if self._keys.get(mapping.path) == mapping.key:
+            del self._keys[mapping.path]
+        self.mapped_bytes -= mapping.size
+        mapping.evicted = True
+        if mapping.refs <= 0:
+            mapping.close()
+
+
+mappings = MappingCache(settings.MMAP_MAX_FILE_SIZE, settings.MMAP_MAX_TOTAL)
@@ -6,22 +6,28 @@ from aquavalet import metadata
 
 
 class FileSystemMetadata(metadata.BaseMetadata):
-    def __init__(self, raw=None, path=None):
+    def __init__(self, raw=None, path=None, stat=None):
+        """
+        :param stat: an ``os.stat_result`` for ``path``, if the caller already has one (from
+            ``os.scandir`` for instance) no further syscalls are made.
+        """
         self.raw = {}
         path = path or raw["path"]
+        stat = stat or os.stat(path)
         self.default_segments = [self.provider]
-        modified = datetime.datetime.utcfromtimestamp(os.path.getmtime(path)).replace(
+        modified = datetime.datetime.utcfromtimestamp(stat.st_mtime).replace(
             tzinfo=datetime.timezone.utc
         )
         self.raw.update(
             {
-                "size": os.path.getsize(path),
+                "size": stat.st_size,
                 "modified": modified.isoformat(),
                 "mime_type": mimetypes.guess_type(path)[0],
                 "path": path,
                 "name": os.path.basename(path.rstrip("/")),
             }
         )
+        self.attributes = self.raw  # what BaseMetadata builds its links from
 
     @classmethod
     def root(cls):
@@ -35,6 +41,14 @@ class FileSystemMetadata(metadata.BaseMetadata):
 
         return cls(raw)
 
+    @classmethod
+    def from_dir_entry(cls, entry):
+        """Builds metadata from an ``os.DirEntry``, reusing the file type cached by ``os.scandir``
+        so the only syscall made is a single ``stat``.
+        """
+        path = entry.path + "/" if entry.is_dir() else entry.path
+        return cls(path=path, stat=entry.stat())
+
     @property
     def provider(self):
         return "filesystem"
@@ -1,102 +1,374 @@
 import os
+import copy
+import stat
+import time
+import asyncio
+import errno
+import heapq
 import shutil
 import logging
+import secrets
 
-from aquavalet import streams, provider, exceptions
+from aquavalet import aio, settings, provider, exceptions
+from aquavalet.streams.file import FileStreamReader, MappedFileStreamReader
+from aquavalet.streams.byteranges import ByteRangesStream
 
+from . import copier
+from .mapping import mappings
 from .metadata import FileSystemMetadata
 
 logger = logging.getLogger(__name__)
 
+TEMP_PREFIX = ".upload-"  # uploads in progress, never listed
+
+
+def _stream_size(stream):
+    try:
+        size = stream.size
+    except (TypeError, ValueError, NotImplementedError):
+        return None
+    return size if isinstance(size, int) else None
+
+
+def _preallocate(fd, size):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except AttributeError:
+        pass  # not available on this platform
+    except OSError as exc:
+        if exc.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+
+
+def _create_temp(directory):
+    """Creates an empty file to upload into in ``directory``, returns its descriptor and path.
+    Unlike ``mkstemp``'s 0600, it is created 0666 less the umask, as a plain open() would.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_CLOEXEC", 0)
+    while True:
+        temp_path = os.path.join(directory, TEMP_PREFIX + secrets.token_hex(8))
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def _finish(file_pointer, written, temp_path, path):
+    file_pointer.flush()
+    file_pointer.truncate(written)  # drop any preallocated space the client didn't fill
+    os.fsync(file_pointer.fileno())
+    file_pointer.close()
+    os.replace(temp_path, path)
+    _fsync_directory(os.path.dirname(path) or ".")  # makes the rename itself durable
+
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError as exc:
+        # Some filesystems can't sync a directory, the rename is as durable as they make it
+        if exc.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+    finally:
+        os.close(fd)
+
+
+def _is_listed(entry):
+    """Whether a folder entry is shown, upload temp files are not.  Those a crash left behind,
+    untouched for ``settings.UPLOAD_STALE_AFTER`` seconds, are removed.
+    """
+    if not entry.name.startswith(TEMP_PREFIX):
+        return True
+    try:
+        modified = entry.stat(follow_symlinks=False).st_mtime
+        if time.time() - modified > settings.UPLOAD_STALE_AFTER:
+            os.remove(entry.path)
+            logger.info("Removed stale upload {}".format(entry.path))
+    except OSError:
+        pass  # finished, removed or not ours to remove
+    return False
+
+
+def _discard(file_pointer, temp_path):
+    file_pointer.close()
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
 
 class FileSystemProvider(provider.BaseProvider):
-    """Provider using the local filesystem as a backend-store"""
+    """Provider using the local filesystem as a backend-store, all blocking disk I/O is run in
+    the thread pool from :mod:`aquavalet.aio`.
+    """
 
     name = "filesystem"
 
     async def validate_item(self, path, **kwargs):
-        if not os.path.exists(path) or os.path.isdir(path) and not path.endswith("/"):
-            raise exceptions.NotFoundError(
-                f"Item at '{path}' could not be found, folders must end with '/'"
-            )
+        return await aio.run(self._validate_item, path)
+
+    def _validate_item(self, path):
+        try:
+            stat_result = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            stat_result = None
+
+        if (
+            stat_result is None
+            or stat.S_ISDIR(stat_result.st_mode)
+            and not path.endswith("/")
+        ):
+            raise exceptions.NotFoundError(path)
 
         if path == "/":
             return FileSystemMetadata.root()
 
-        return FileSystemMetadata(path=path)
+        return FileSystemMetadata(path=path, stat=stat_result)
 
-    async def intra_copy(self, src_path, dest_path, dest_provider=None):
+    @provider.splits_reads
+    async def intra_copy(self, src_path, dest_path, dest_provider=None, progress=None):
+        """Copies with reflinks or ``copy_file_range`` where possible, folders are copied by a
+        pool of workers, see :mod:`.copier`.  Pass a `copier.CopyProgress` to follow along.
+        """
         try:
             if src_path.kind == "file":
-                shutil.copy(src_path.path, dest_path.path)
+                dest = os.path.join(dest_path.path, src_path.name)
+                await aio.run(copier.copy_file, src_path.path, dest, progress=progress)
             else:
-                shutil.copytree(src_path.path, dest_path.child(src_path.path))
+                dest = dest_path.child(src_path.name)
+                await copier.copy_tree(src_path.path, dest, progress=progress)
         except FileNotFoundError as exc:
             raise exceptions.NotFoundError(exc.filename)
+        except FileExistsError:
+            raise exceptions.Conflict(f"Conflict '{src_path.name}'.")
 
+    @provider.splits_reads
     async def intra_move(self, src_path, dest_path, dest_provider=None):
         try:
-            shutil.move(src_path.path, dest_path.path)
+            await aio.run(shutil.move, src_path.path, dest_path.path)
         except FileNotFoundError as exc:
             raise exceptions.NotFoundError(exc.filename)
 
+    @provider.splits_reads
     async def rename(self, item, new_name):
         try:
-            os.rename(item.path, item.rename(new_name))
+            await aio.run(os.rename, item.path, item.rename(new_name))
         except FileNotFoundError as exc:
             raise exceptions.NotFoundError(exc.filename)
 
-    async def download(self, item, session=None, version=None, range=None):
+    async def download(self, item, version=None, range=None):
+
+        if settings.MMAP_ENABLED:
+            mapping = await aio.run(mappings.acquire, item.path)
+            if mapping is not None:
+                return MappedFileStreamReader(mapping, range=range)
+
+        file_pointer = await aio.run(open, item.path, "rb")
 
-        file_pointer = open(item.path, "rb")
+        return FileStreamReader(file_pointer, range=range)
 
-        if range is not None and range[1] is not None:
-            return streams.file.FileStreamReader(file_pointer, range=range)
+    async def download_ranges(self, item, ranges, version=None):
+        """Opens the file once, each part seeks to its range as it is reached."""
+        file_pointer = await aio.run(open, item.path, "rb")
 
-        return streams.file.FileStreamReader(file_pointer)
+        def open_part(range):
+            async def open_part():
+                return FileStreamReader(file_pointer, range=range)
 
+            return open_part
+
+        return ByteRangesStream(
+            [(start, end, open_part((start, end))) for start, end in ranges],
+            item.size,
+            provider._content_type(item.name),
+            on_close=file_pointer.close,
+        )
+
+    @provider.splits_reads
     async def upload(self, item, stream=None, new_name=None, conflict="warn"):
-        if os.path.isfile(item.path + new_name):
+        if await aio.run(os.path.isfile, item.path + new_name):
             return await self.handle_conflict(
                 item=item, conflict=conflict, new_name=new_name, stream=stream
             )
 
-        with open(item.path + new_name, "wb") as file_pointer:
+        await self._write(item.path + new_name, stream)
+
+    async def handle_conflict_replace(self, new_name, item, stream):
+        """The new file is written next to the old one and swapped in with a single rename, the old
+        file stays in place until the upload has completed.
+        """
+        await self._write(item.path + new_name, stream)
+
+    async def _write(self, path, stream):
+        """Writes ``stream`` to a temporary file in the destination folder and atomically renames
+        it to ``path`` once complete, a failed upload never leaves a truncated file behind.  Chunks
+        are coalesced into `UPLOAD_BUFFER_SIZE` writes and the file is preallocated when the size of
+        the stream is known, to avoid fragmenting it on disk.
+        """
+        fd, temp_path = await aio.run(_create_temp, os.path.dirname(path) or ".")
+        file_pointer = os.fdopen(fd, "wb")
+        try:
+            size = _stream_size(stream)
+            if size and settings.UPLOAD_PREALLOCATE:
+                await aio.run(_preallocate, file_pointer.fileno(), size)
+
+            written = 0
+            buffer = bytearray()
             async for chunk in stream:
-                file_pointer.write(chunk)
+                buffer += chunk
+                if len(buffer) >= settings.UPLOAD_BUFFER_SIZE:
+                    data, buffer = buffer, bytearray()
+                    await aio.run(file_pointer.write, data)
+                    written += len(data)
 
+            await aio.run(file_pointer.write, buffer)
+            written += len(buffer)
+            await aio.run(_finish, file_pointer, written, temp_path, path)
+        except BaseException:
+            await aio.run(_discard, file_pointer, temp_path)
+            raise
+
+    @provider.splits_reads
     async def delete(self, item, comfirm_delete=False):
 
         if item.is_file:
             try:
-                os.remove(item.path)
+                await aio.run(os.remove, item.path)
             except FileNotFoundError:
                 raise exceptions.NotFoundError(item.path)
         else:
             if item.is_root:
                 raise Exception("That's the root!")
-            shutil.rmtree(item.path)
+            await aio.run(shutil.rmtree, item.path)
 
     async def metadata(self, item, version=None):
         return item
 
     async def children(self, item):
+        children = await self.shared_read(
+            item.default_segments,
+            item.id,
+            "children",
+            lambda: aio.run(self._children, item.path),
+        )
+        return copy.deepcopy(children)  # shared with concurrent identical requests
+
+    def _children(self, path):
+        children = []
+        with os.scandir(path) as entries:
+            for entry in filter(_is_listed, entries):
+                try:
+                    children.append(FileSystemMetadata.from_dir_entry(entry))
+                except FileNotFoundError:
+                    continue  # removed since the directory was read, or a broken link
+        return children
+
+    async def iter_children(self, item):
+        """Lists the folder ``CHILDREN_BATCH_SIZE`` entries at a time in the I/O thread pool."""
+        entries = await aio.run(os.scandir, item.path)
+        try:
+            while True:
+                batch = await aio.run(self._next_children, entries)
+                if not batch:
+                    return
+                for child in batch:
+                    yield child
+        finally:
+            entries.close()
+
+    def _next_children(self, entries):
+        children = []
+        for entry in filter(_is_listed, entries):
+            try:
+                children.append(FileSystemMetadata.from_dir_entry(entry))
+            except FileNotFoundError:
+                continue
+            if len(children) >= settings.CHILDREN_BATCH_SIZE:
+                break
+        return children
+
+    async def children_page(self, item, limit, cursor=None):
+        return await aio.run(self._children_page, item.path, limit, cursor)
+
+    def _children_page(self, path, limit, cursor):
+        """Picks the page from the names alone in a single pass over the folder, only the
+        entries on the page are ``stat``-ed.
+        """
+        with os.scandir(path) as entries:
+            page = heapq.nsmallest(
+                limit + 1,
+                (
+                    entry
+                    for entry in filter(_is_listed, entries)
+                    if cursor is None or entry.name > cursor
+                ),
+                key=lambda entry: entry.name,
+            )
+
+        children = []
+        for entry in page[:limit]:
+            try:
+                children.append(FileSystemMetadata.from_dir_entry(entry))
+            except FileNotFoundError:
+                continue
+        next_cursor = page[limit - 1].name if len(page) > limit else None
+        return children, next_cursor
+
+    async def _usage(self, item, semaphore):
+        return await self._usage_walk(item.path, semaphore)
+
+    async def _usage_walk(self, path, semaphore):
+        """Scans up to ``CONCURRENT_OPS`` folders at once in the I/O thread pool."""
+        async with semaphore:
+            usage, folders = await aio.run(self._scan_usage, path)
 
-        children = os.listdir(item.path)
-        children = [os.path.join(item.path, child) for child in children]
-        children = [
-            child + "/" if os.path.isdir(child) else child for child in children
-        ]
+        for subtree in await asyncio.gather(
+            *(self._usage_walk(folder, semaphore) for folder in folders)
+        ):
+            for name, value in subtree.items():
+                usage[name] += value
 
-        return [FileSystemMetadata(path=child) for child in children]
+        return usage
 
+    def _scan_usage(self, path):
+        """Totals the files directly in ``path`` and returns the folders to scan next.  Symlinks
+        are counted as files and never followed.
+        """
+        usage = {"size": 0, "files": 0, "folders": 0}
+        folders = []
+        try:
+            entries = os.scandir(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return usage, folders  # removed while the walk was running
+
+        with entries:
+            for entry in filter(_is_listed, entries):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        usage["folders"] += 1
+                        folders.append(entry.path)
+                    else:
+                        usage["size"] += entry.stat(follow_symlinks=False).st_size
+                        usage["files"] += 1
+                except FileNotFoundError:
+                    continue
+
+        return usage, folders
+
+    @provider.splits_reads
     async def create_folder(self, item, new_name):
-        os.makedirs(item.child(new_name), exist_ok=True)
-        item.raw["path"] = item.child(new_name)  # TODO: Do this better
-        return item
+        path = item.child(new_name)
+        await aio.run(os.makedirs, path, exist_ok=True)
+        return await aio.run(FileSystemMetadata, path=path)
 
     def can_intra_copy(self, dest_provider, item=None):
         return type(self) == type(dest_provider)
 
+    def _affected_paths(self, item):
+        """The item, anything below it, and the listing of its parent."""
+        path, parent = item.id, item.parent
+        return lambda read: read.startswith(path) or read == parent
+
     def can_intra_move(self, dest_provider, item=None):
         return type(self) == type(dest_provider)
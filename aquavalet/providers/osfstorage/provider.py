@@ -9,7 +9,8 @@ class OSFStorageProvider(OsfProvider):
 
     Item = OsfMetadata
 
-    def __init__(self, auth):
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session=session)
         self.token = OSF_TOKEN
 
     @property
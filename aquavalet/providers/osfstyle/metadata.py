@@ -1,5 +1,4 @@
 import os
-import hashlib
 import mimetypes
 
 from aquavalet import metadata
@@ -151,8 +150,6 @@ class BaseOsfStyleItemMetadata(metadata.BaseMetadata):
             "provider": self.provider,
             "md5": self.md5,
             "sha256": self.sha256,
-            "etag": hashlib.sha256(
-                "{}::{}".format(self.provider, self.etag).encode("utf-8")
-            ).hexdigest(),
+            "etag": self.etag_hash,
             "version_id": self.version_id,
         }
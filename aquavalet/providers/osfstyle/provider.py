@@ -1,7 +1,14 @@
+import copy
 import json
-import aiohttp
+import asyncio
 
-from aquavalet import streams, provider, exceptions
+from aquavalet import concurrency, provider, settings, exceptions
+from aquavalet.streams.http import ResponseStreamReader
+from aquavalet.streams.byteranges import (
+    ByteRangesStream,
+    SectionReader,
+    coalesce_ranges,
+)
 from aquavalet.providers.utils import require_group, require_match
 
 message_no_internal_provider = "No internal provider in url, path must follow pattern ^\/(?P<internal_provider>(?:\w|\d)+)?\/(?P<resource>[a-zA-Z0-9]{5,})?(?P<path>\/.*)?"
@@ -17,6 +24,10 @@ class OsfProvider(provider.BaseProvider):
     def default_headers(self):
         return {"Authorization": f"Bearer {self.token}"}
 
+    @property
+    def limiter(self):
+        return concurrency.limiter(self.name)
+
     async def validate_item(self, path):
         match = require_match(self.PATH_PATTERN, path, "match could not be found")
         self.internal_provider = require_group(
@@ -29,20 +40,24 @@ class OsfProvider(provider.BaseProvider):
         else:
             path = require_group(match, "path", message_no_path)
         if self.internal_provider == "osfstorage":
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url=self.API_URL.format(path=path),
-                    headers=self.default_headers,
-                ) as resp:
-                    if resp.status == 200:
-                        data = (await resp.json())["data"]
-                    else:
-                        raise await self.handle_response(resp, path=path)
+            data = await self.shared_read(
+                [self.name, self.internal_provider, self.resource],
+                path,
+                "meta",
+                lambda: self._fetch_item(path),
+            )
+            data = copy.deepcopy(data)  # shared with concurrent identical requests
 
         return self.Item(data, self.internal_provider, self.resource)
 
-    async def download(self, item, session, version=None, range=None):
-        download_header = self.default_headers
+    async def _fetch_item(self, path):
+        async with self.make_request("GET", self.API_URL.format(path=path)) as resp:
+            if resp.status == 200:
+                return (await resp.json())["data"]
+            raise await self.handle_response(resp, path=path)
+
+    async def download(self, item, version=None, range=None):
+        download_header = {}
 
         if range:
             download_header.update({"Range": str(self._build_range_header(range))})
@@ -52,30 +67,77 @@ class OsfProvider(provider.BaseProvider):
         if version:
             path += f"?version={version}"
 
-        resp = await session.get(url=self.BASE_URL + path, headers=download_header)
-        return streams.http.ResponseStreamReader(resp, range)
+        resp = await self.make_request(
+            "GET", self.BASE_URL + path, headers=download_header
+        )
+        return ResponseStreamReader(resp, range)
+
+    async def download_ranges(self, item, ranges, version=None):
+        """Ranges separated by at most ``settings.RANGE_COALESCE_GAP`` bytes are fetched with one
+        spanning request and cut apart as it streams, the gaps are read and dropped.  Farther apart
+        ranges get their own requests, up to ``settings.RANGE_PREFETCH`` made ahead of the part
+        being sent.
+        """
+        groups = {}
+
+        def fetch(group):
+            if group not in groups:
+                groups[group] = asyncio.ensure_future(
+                    self.download(item, version=version, range=group)
+                )
+            return groups[group]
+
+        def open_part(group, skip, length):
+            async def open_part():
+                return SectionReader(await fetch(group), skip, length)
+
+            return open_part
+
+        def release():
+            for download in groups.values():
+                if not download.done():
+                    download.cancel()
+                elif not download.cancelled() and download.exception() is None:
+                    download.result().close()
 
+        parts = []
+        for group, members in coalesce_ranges(ranges, settings.RANGE_COALESCE_GAP):
+            position = group[0]
+            for start, end in members:
+                parts.append(
+                    (start, end, open_part(group, start - position, end - start + 1))
+                )
+                position = end + 1
+
+        return ByteRangesStream(
+            parts,
+            item.size,
+            provider._content_type(item.name),
+            prefetch=settings.RANGE_PREFETCH,
+            on_close=release,
+        )
+
+    @provider.splits_reads
     async def upload(self, item, stream, new_name, conflict="warn"):
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                data=stream,
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                headers=self.default_headers,
-                params={"kind": "file", "name": new_name, "conflict": conflict},
-            ) as resp:
-                if resp.status in (200, 201):
-                    data = (await resp.json())["data"]
-                else:
-                    return await self.handle_response(
-                        resp=resp,
-                        item=item,
-                        new_name=new_name,
-                        stream=stream,
-                        conflict=conflict,
-                    )
+        async with self.make_request(
+            "PUT",
+            data=stream,
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+            params={"kind": "file", "name": new_name, "conflict": conflict},
+        ) as resp:
+            if resp.status in (200, 201):
+                data = (await resp.json())["data"]
+            else:
+                return await self.handle_response(
+                    resp=resp,
+                    item=item,
+                    new_name=new_name,
+                    stream=stream,
+                    conflict=conflict,
+                )
 
-            return self.Item(data, self.internal_provider, self.resource)
+        return self.Item(data, self.internal_provider, self.resource)
 
     async def handle_conflict_new_version(
         self, resp, item, path, stream, new_name, conflict
@@ -86,117 +148,129 @@ class OsfProvider(provider.BaseProvider):
         except StopIteration:
             raise exceptions.Gone(f"Item at path '{item.name}' is gone.")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                data=stream,
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                headers=self.default_headers,
-            ) as resp:
-                if resp.status in (200, 201):
-                    data = (await resp.json())["data"]
-                else:
-                    return await self.handle_response(
-                        resp=resp,
-                        item=item,
-                        new_name=new_name,
-                        stream=stream,
-                        conflict=conflict,
-                    )
+        async with self.make_request(
+            "PUT",
+            data=stream,
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+        ) as resp:
+            if resp.status in (200, 201):
+                data = (await resp.json())["data"]
+            else:
+                return await self.handle_response(
+                    resp=resp,
+                    item=item,
+                    new_name=new_name,
+                    stream=stream,
+                    conflict=conflict,
+                )
 
-            return self.Item(data, self.internal_provider, self.resource)
+        return self.Item(data, self.internal_provider, self.resource)
 
+    @provider.splits_reads
     async def delete(self, item, confirm_delete=0):
-        async with aiohttp.ClientSession() as session:
-            async with session.delete(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                params={"confirm_delete": 0},
-                headers=self.default_headers,
-            ) as resp:
-                if resp.status in (204,):
-                    return None
-                else:
-                    raise await self.handle_response(resp, item)
+        async with self.make_request(
+            "DELETE",
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+            params={"confirm_delete": 0},
+        ) as resp:
+            if resp.status in (204,):
+                return None
+            else:
+                raise await self.handle_response(resp, item)
 
     async def metadata(self, item, version=None):
         return item
 
+    @provider.splits_reads
     async def create_folder(self, item, new_name):
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                headers=self.default_headers,
-                params={"kind": "folder", "name": new_name},
-            ) as resp:
-                if resp.status in (201,):
-                    data = (await resp.json())["data"]
-                else:
-                    raise await self.handle_response(resp, item, new_name=new_name)
+        async with self.make_request(
+            "PUT",
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+            params={"kind": "folder", "name": new_name},
+        ) as resp:
+            if resp.status in (201,):
+                data = (await resp.json())["data"]
+            else:
+                raise await self.handle_response(resp, item, new_name=new_name)
 
-                return self.Item(data, self.internal_provider, self.resource)
+            return self.Item(data, self.internal_provider, self.resource)
 
+    @provider.splits_reads
     async def rename(self, item, new_name):
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                data=json.dumps({"action": "rename", "rename": new_name}),
-                headers=self.default_headers,
-            ) as resp:
-                if resp.status == 200:
-                    data = (await resp.json())["data"]
-                else:
-                    raise await self.handle_response(resp, item)
+        async with self.make_request(
+            "POST",
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+            data=json.dumps({"action": "rename", "rename": new_name}),
+        ) as resp:
+            if resp.status == 200:
+                data = (await resp.json())["data"]
+            else:
+                raise await self.handle_response(resp, item)
 
-                return self.Item(data, self.internal_provider, self.resource)
+            return self.Item(data, self.internal_provider, self.resource)
 
     async def children(self, item):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                headers=self.default_headers,
-            ) as resp:
+        async def list_children():
+            return [child async for child in self.iter_children(item)]
+
+        children = await self.shared_read(
+            item.default_segments, item.id, "children", list_children
+        )
+        return copy.deepcopy(children)  # shared with concurrent identical requests
+
+    async def iter_children(self, item):
+        """Yields the listing a page at a time, following the JSON API ``links.next`` of each
+        response.
+        """
+        url = (
+            self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}"
+        )
+        while url:
+            async with self.make_request("GET", url=url) as resp:
                 if resp.status == 200:
-                    data = (await resp.json())["data"]
+                    body = await resp.json()
                 else:
                     raise await self.handle_response(resp, item)
 
-        return self.Item.list(item, data)
+            for child in self.Item.list(item, body["data"]):
+                yield child
+            url = (body.get("links") or {}).get("next")
 
     def can_intra_copy(self, dest_provider, item=None):
         if type(self) == type(dest_provider):
             return True
 
+    @provider.splits_reads
     async def intra_copy(self, item, dest_item, dest_provider=None):
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}",
-                data=json.dumps(
-                    {
-                        "action": "copy",
-                        "path": dest_item.path + "/",
-                        "provider": "osfstorage",
-                        "resource": dest_provider.resource,
-                    }
-                ),
-                headers=self.default_headers,
-            ) as resp:
-                print(resp)
+        async with self.make_request(
+            "POST",
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}",
+            data=json.dumps(
+                {
+                    "action": "copy",
+                    "path": dest_item.path + "/",
+                    "provider": "osfstorage",
+                    "resource": dest_provider.resource,
+                }
+            ),
+        ) as resp:
+            print(resp)
 
     async def versions(self, item):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=self.BASE_URL
-                + f"{self.resource}/providers/{self.internal_provider}{item.id}?versions=",
-                headers=self.default_headers,
-            ) as resp:
-                if resp.status == 200:
-                    data = (await resp.json())["data"]
-                else:
-                    raise await self.handle_response(resp, item)
+        async with self.make_request(
+            "GET",
+            url=self.BASE_URL
+            + f"{self.resource}/providers/{self.internal_provider}{item.id}?versions=",
+        ) as resp:
+            if resp.status == 200:
+                data = (await resp.json())["data"]
+            else:
+                raise await self.handle_response(resp, item)
 
         return self.Item.versions(item, data)
@@ -0,0 +1,102 @@
+"""Per host rate limiting of outgoing requests with token buckets.  ``settings.RATE_LIMITS`` maps a
+host to ``(rate, burst)``: ``rate`` requests per second sustained, and up to ``burst`` at once
+after a quiet period.  Hosts that aren't listed use ``settings.RATE_LIMIT_DEFAULT``, ``None`` for
+no limit.
+
+Requests wait their turn in FIFO order, so a steady stream of new requests can't starve one that
+has been waiting.  A ``429 Too Many Requests`` empties the host's bucket for the ``Retry-After``
+period.  The limiter hooks into the shared session through `trace_config`.
+"""
+
+import time
+import asyncio
+import weakref
+
+import aiohttp
+
+from aquavalet import metrics, settings
+
+_BUCKETS = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, name=""):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self._lock = asyncio.Lock()  # wakes its waiters in the order they arrived
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Waits for a token and takes it, returns the number of seconds spent waiting."""
+        if not self.waiting:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+
+        started = time.monotonic()
+        self.waiting += 1
+        metrics.ratelimit_waiters.inc(self.name)
+        try:
+            async with self._lock:
+                self._refill()
+                while self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        finally:
+            self.waiting -= 1
+            metrics.ratelimit_waiters.dec(self.name)
+
+        waited = time.monotonic() - started
+        metrics.ratelimit_wait.inc(self.name, amount=waited)
+        return waited
+
+    def pause(self, seconds):
+        """Lets no request through for ``seconds``, as asked by the upstream."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+def bucket(host):
+    """Returns the bucket of ``host`` for the running event loop, ``None`` if it isn't limited."""
+    buckets = _BUCKETS.setdefault(asyncio.get_running_loop(), {})
+    if host not in buckets:
+        limit = settings.RATE_LIMITS.get(host, settings.RATE_LIMIT_DEFAULT)
+        buckets[host] = None if limit is None else TokenBucket(*limit, name=host)
+    return buckets[host]
+
+
+def _retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return 1.0  # missing, or an HTTP date
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Returns a ``TraceConfig`` that holds every request until its host's bucket has a token."""
+
+    async def on_request_start(session, context, params):
+        host_bucket = bucket(params.url.host)
+        if host_bucket is not None:
+            await host_bucket.acquire()
+
+    async def on_request_end(session, context, params):
+        if params.response.status == 429:
+            host_bucket = bucket(params.url.host)
+            if host_bucket is not None:
+                host_bucket.pause(_retry_after(params.response))
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    return config
@@ -0,0 +1,150 @@
+"""Retries of outgoing requests that failed in a way worth trying again: a connection error, a
+timeout, or a status in the provider's ``retry_on``.  Only idempotent requests whose body can be
+sent again are retried, by default those with a safe method.
+
+Attempts are spaced by an exponential backoff with full jitter, or the response's
+``Retry-After`` when it asks for longer, up to ``settings.RETRY_MAX_DELAY``.  Retries also draw
+from a process wide `Budget`: each request adds ``settings.RETRY_BUDGET_RATIO`` of a retry to it,
+so when an upstream is down retries can't multiply the load on it by more than that ratio.
+"""
+
+import time
+import random
+import asyncio
+
+import aiohttp
+
+from aquavalet import metrics, settings
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRIED_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class Budget:
+    """Retries earned by requests, ``ratio`` per request, and ``minimum`` per second so that a
+    quiet process can still retry.  At most ten seconds worth of ``minimum`` can be saved up.
+    """
+
+    def __init__(self, ratio, minimum):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.capacity = max(1.0, minimum * 10)
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, amount=0.0):
+        now = time.monotonic()
+        self.balance = min(
+            self.capacity,
+            self.balance + amount + (now - self.updated) * self.minimum,
+        )
+        self.updated = now
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        """Takes one retry from the budget, returns False when there is none left."""
+        self._refill()
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+_BUDGET = None
+
+
+def get_budget() -> Budget:
+    """Returns the budget shared by every request of the process."""
+    global _BUDGET
+    if _BUDGET is None:
+        _BUDGET = Budget(settings.RETRY_BUDGET_RATIO, settings.RETRY_BUDGET_MINIMUM)
+    return _BUDGET
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number ``attempt``, counting from 0."""
+    ceiling = min(settings.RETRY_MAX_DELAY, settings.RETRY_BACKOFF * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+def retry_after(response):
+    """The delay asked for by the ``Retry-After`` of ``response`` in seconds, ``None`` when it
+    has none or it isn't a number of seconds.
+    """
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def is_replayable(data):
+    return data is None or isinstance(data, (bytes, str, dict))
+
+
+class RetryingRequest:
+    """Sends a request with ``send``, a coroutine function, and retries it as described in the
+    module.  Like the result of ``ClientSession.request`` it can be awaited for the response, or
+    used as an ``async with`` block to release the connection when done.  When the retries are
+    given up the last response is returned, or the last error raised.
+    """
+
+    def __init__(self, send, host, retry_on, retryable=True, budget=None):
+        self.send = send
+        self.host = host
+        self.retry_on = retry_on
+        self.retryable = retryable
+        self.budget = budget
+        self._response = None
+
+    def __await__(self):
+        return self._request().__await__()
+
+    async def __aenter__(self):
+        self._response = await self._request()
+        return self._response
+
+    async def __aexit__(self, *exc_info):
+        self._response.release()
+
+    async def _request(self):
+        budget = self.budget or get_budget()
+        budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self.send()
+            except RETRIED_ERRORS as exc:
+                if not self._retry(type(exc).__name__, attempt, None, budget):
+                    raise
+                delay = backoff(attempt)
+            else:
+                if response.status not in self.retry_on:
+                    return response
+                delay = backoff(attempt)
+                asked = retry_after(response)
+                if asked is not None and asked > delay:
+                    delay = asked
+                if not self._retry(response.status, attempt, delay, budget):
+                    return response
+                response.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _retry(self, reason, attempt, delay, budget) -> bool:
+        """Whether to retry after a failure, a retry taken is recorded along with its reason."""
+        if not self.retryable:
+            return False
+        if attempt >= settings.RETRY_ATTEMPTS:
+            gave_up = "attempts"
+        elif delay is not None and delay > settings.RETRY_MAX_DELAY:
+            gave_up = "retry_after"
+        elif not budget.withdraw():
+            gave_up = "budget"
+        else:
+            metrics.retries.inc(self.host, reason)
+            return True
+        metrics.retry_give_ups.inc(self.host, gave_up)
+        return False
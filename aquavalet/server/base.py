@@ -1,3 +1,8 @@
+import base64
+import hashlib
+import datetime
+import email.utils
+
 from aquavalet import settings, exceptions
 
 CORS_ACCEPT_HEADERS = [
@@ -14,6 +19,9 @@ CORS_EXPOSE_HEADERS = [
     "Content-Range",
     "Content-Length",
     "Content-Encoding",
+    "ETag",
+    "Last-Modified",
+    "X-Next-Cursor",
 ]
 
 
@@ -31,6 +39,20 @@ class BaseHandler(object):
     def set_status(self, code, reason=None):
         return super().set_status(code, reason)
 
+    def not_modified(self, etag, last_modified=None):
+        """Sends the validators of the response, and a 304 when the request's conditional headers
+        show the client already has it.  Returns True if so, the caller should then send no body.
+        """
+        if etag is not None:
+            self.set_header("ETag", etag)
+        if last_modified is not None:
+            self.set_header("Last-Modified", last_modified)
+
+        if is_not_modified(self.request.headers, etag, last_modified):
+            self.set_status(304)
+            return True
+        return False
+
     def _cross_origin_is_allowed(self):
         if self.request.method == "OPTIONS":
             return True
@@ -39,6 +61,80 @@ class BaseHandler(object):
         return False
 
 
+def strong_etag(item):
+    """The ``ETag`` of a file or folder, ``None`` when its provider has no etag for it."""
+    if not item.etag:
+        return None
+    return '"{}"'.format(item.etag_hash)
+
+
+def weak_etag(items):
+    """A weak ``ETag`` for a listing, it changes whenever a child is added, removed or changed."""
+    digest = hashlib.sha256()
+    for etag_hash in sorted(item.etag_hash for item in items):
+        digest.update(etag_hash.encode("utf-8"))
+    return 'W/"{}"'.format(digest.hexdigest())
+
+
+def http_date(modified):
+    """Formats an ISO 8601 ``modified`` timestamp as an HTTP date, ``None`` if it can't be parsed."""
+    try:
+        modified = datetime.datetime.fromisoformat(modified)
+    except (TypeError, ValueError):
+        return None
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=datetime.timezone.utc)
+    return email.utils.format_datetime(
+        modified.astimezone(datetime.timezone.utc), usegmt=True
+    )
+
+
+def _opaque_tag(etag):
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def is_not_modified(headers, etag, last_modified=None):
+    """Evaluates ``If-None-Match``, or when absent ``If-Modified-Since``, as in RFC 7232 section 6.
+    ``If-None-Match`` uses the weak comparison.
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque_tag(etag) in (
+            _opaque_tag(tag) for tag in if_none_match.split(",")
+        )
+
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False  # not a valid HTTP date
+    return email.utils.parsedate_to_datetime(last_modified) <= since
+
+
+def encode_cursor(name):
+    """Makes the opaque ``cursor`` of a children page from the name it resumes after."""
+    return base64.urlsafe_b64encode(name.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        raise exceptions.InvalidParameters(message=f"Invalid cursor {cursor!r}")
+
+
 def _int_or_none(val):
     val = val.strip()
     if val == "":
@@ -83,3 +179,42 @@ def parse_request_range(range_header):
             return None
 
     return start, end
+
+
+def parse_request_ranges(range_header, size):
+    """Parses a ``Range`` header of one or more byte ranges, suffix ranges included, against a file
+    of ``size`` bytes.  Returns the inclusive ``(start, end)`` ranges sorted, with those that
+    overlap or touch merged, and those starting past the end dropped: an empty list means none
+    is satisfiable.  Returns ``None`` for a malformed header or more than ``settings.MAX_RANGES``
+    ranges, the whole file should then be sent.
+    """
+    unit, _, value = range_header.partition("=")
+    if unit.strip() != "bytes":
+        return None
+    specs = value.split(",")
+    if len(specs) > settings.MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        request_range = _parse_request_range("bytes=" + spec)
+        if request_range is None:
+            return None
+        start, end = request_range
+        if start is None:  # bytes=-0
+            continue
+        if start < 0:
+            start = max(0, size + start)
+        if end is not None and end <= start:
+            return None
+        end = size if end is None else min(end, size)
+        if start < size:
+            ranges.append((start, end - 1))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+from aquavalet import settings, utils, exceptions
+
+logger = logging.getLogger(__name__)
+
+
+def _error(exc):
+    """The body `app.json_error` would send for ``exc``, with its status."""
+    if isinstance(exc, exceptions.WaterButlerError):
+        return {
+            "error": exc.__class__.__name__,
+            "message": exc.message,
+            "status": exc.status,
+        }
+
+    logger.warning(f"Batch item failed with exception: {exc!r}")
+    return {"error": exc.__class__.__name__, "message": str(exc), "status": 500}
+
+
+async def resolve(provider_name, paths, auth=None, version=None):
+    """Resolves the metadata of every path in ``paths``, as many at a time as the provider's
+    limiter lets or ``settings.BATCH_CONCURRENCY`` without one, and returns one result per path
+    in the same order: ``{"path", "data"}`` for a resolved item, ``{"path", "error"}``
+    otherwise.  Each path gets its own provider instance, as providers keep the state of the last
+    validated path.
+    """
+    if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+        raise exceptions.InvalidParameters("'paths' must be a list of paths")
+    if len(paths) > settings.BATCH_MAX_PATHS:
+        raise exceptions.InvalidParameters(
+            f"At most {settings.BATCH_MAX_PATHS} paths can be resolved at once"
+        )
+
+    limiter = utils.make_provider(provider_name, auth).limiter or asyncio.Semaphore(
+        settings.BATCH_CONCURRENCY
+    )
+
+    async def resolve_one(path):
+        async with limiter:
+            try:
+                provider = utils.make_provider(provider_name, auth)
+                item = await provider.validate_item(path)
+                metadata = await provider.metadata(item, version=version)
+                return {"path": path, "data": metadata.json_api_serialized()}
+            except Exception as exc:
+                return {"path": path, "error": _error(exc)}
+
+    return await asyncio.gather(*(resolve_one(path) for path in paths))
@@ -0,0 +1,195 @@
+"""Pre-fork server: a master process forks ``settings.WORKERS`` workers, each running its own event
+loop on a listening socket bound with ``SO_REUSEPORT`` so the kernel spreads connections across
+them.
+
+    python -m aquavalet.server.prefork --workers 8
+
+Signals sent to the master:
+
+* ``SIGHUP`` restarts the workers one at a time, each replacement is listening before the worker
+  it replaces is asked to stop, so no connection is refused.
+* ``SIGTERM`` / ``SIGINT`` stop every worker gracefully and exit.
+
+Workers stop on ``SIGTERM`` by closing their socket and finishing in flight requests for up to
+``settings.WORKER_SHUTDOWN_TIMEOUT`` seconds.  A worker that dies is replaced.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+from aiohttp import web
+
+from aquavalet import settings
+
+logger = logging.getLogger(__name__)
+
+
+def bind(address, port, listen=True):
+    """Returns a TCP socket bound to ``(address, port)`` with ``SO_REUSEPORT`` set."""
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((address, port))
+    if listen:
+        sock.listen(settings.LISTEN_BACKLOG)
+    return sock
+
+
+def _default_app():
+    from aquavalet.app import app
+
+    return app()
+
+
+class Arbiter:
+    """Forks, watches and restarts the workers, see the module docstring."""
+
+    def __init__(self, workers=None, address=None, port=None, app_factory=_default_app):
+        self.workers = workers or settings.WORKERS
+        self.address = address or settings.ADDRESS
+        self.port = settings.PORT if port is None else port
+        self.app_factory = app_factory
+        self.pids = set()
+        self._stopping = False
+        self._reloading = False
+
+    def run(self):
+        # Reserves the port, and resolves port 0, without listening, so the master never accepts
+        self.sock = bind(self.address, self.port, listen=False)
+        self.port = self.sock.getsockname()[1]
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._reload)
+
+        logger.info(
+            f"Serving on {self.address}:{self.port} with {self.workers} workers"
+        )
+        for _ in range(self.workers):
+            self.spawn()
+
+        try:
+            while not self._stopping:
+                self.reap()
+                if self._reloading:
+                    self._reloading = False
+                    self.restart()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+            self.sock.close()
+
+    def spawn(self):
+        """Forks a worker and waits until it is listening."""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            self._run_worker(ready_write)
+
+        os.close(ready_write)
+        with os.fdopen(ready_read, "rb") as ready:
+            if not ready.read(1):
+                logger.warning(f"Worker {pid} exited before it was ready")
+        self.pids.add(pid)
+        return pid
+
+    def _run_worker(self, ready):
+        code = 0
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            self.sock.close()
+
+            sock = bind(self.address, self.port)
+            os.write(ready, b"1")
+            os.close(ready)
+
+            web.run_app(
+                self.app_factory(),
+                sock=sock,
+                shutdown_timeout=settings.WORKER_SHUTDOWN_TIMEOUT,
+                print=None,
+            )
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} failed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def reap(self):
+        """Collects exited workers, replacing them unless the server is stopping."""
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.pids:
+                self.pids.discard(pid)
+                if not self._stopping:
+                    logger.warning(
+                        f"Worker {pid} exited with status {status}, replacing it"
+                    )
+                    self.spawn()
+
+    def restart(self):
+        """Replaces each worker in turn, the new one is listening before the old one stops."""
+        for pid in list(self.pids):
+            self.spawn()
+            self.pids.discard(pid)
+            self._terminate(pid)
+
+    def stop(self):
+        self._stopping = True
+        for pid in list(self.pids):
+            self.pids.discard(pid)
+            self._terminate(pid)
+
+    def _terminate(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        deadline = time.monotonic() + settings.WORKER_SHUTDOWN_TIMEOUT + 5
+        while time.monotonic() < deadline:
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    return
+            except ChildProcessError:
+                return
+            time.sleep(0.05)
+
+        logger.warning(f"Worker {pid} did not stop in time, killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _reload(self, signum, frame):
+        self._reloading = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Runs aquavalet with pre-forked workers."
+    )
+    parser.add_argument("--workers", type=int, default=settings.WORKERS)
+    parser.add_argument("--address", default=settings.ADDRESS)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    args = parser.parse_args(argv)
+
+    Arbiter(workers=args.workers, address=args.address, port=args.port).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,9 @@
-import asyncio
 import logging
 import mimetypes
 import os
-import socket
 
-import aiohttp
-
-from aquavalet import settings, utils, exceptions
+from aquavalet import settings, tracing, utils, exceptions
+from aquavalet.streams.file import FileStreamReader
 from aquavalet.streams.http import RequestStreamReader
 from aquavalet.server import base
 
@@ -41,43 +38,145 @@ class ProviderHandler(base.BaseHandler):
         provider = self.path_kwargs["provider"]
 
         self.auth = None  # Figure out best approach
-        self.provider = utils.make_provider(provider, self.auth)
-        self.provider.item = await self.provider.validate_item(self.path)
+        tracing.mark("dispatch")
+        with tracing.span("make_provider"):
+            self.provider = utils.make_provider(provider, self.auth)
+        with tracing.span("validate_item"):
+            self.provider.item = await self.provider.validate_item(self.path)
 
         if self.request.method == "UPLOAD":
             self.stream = await self.prepare_stream()
 
     async def prepare_stream(self):
-        self.rsock, self.wsock = socket.socketpair()
-        self.reader, _ = await asyncio.open_unix_connection(sock=self.rsock)
-        _, self.writer = await asyncio.open_unix_connection(sock=self.wsock)
-
-        return RequestStreamReader(self.request, self.reader)
-
-    async def data_received(self, chunk):
-        """Note: Only called during uploads."""
-        self.bytes_uploaded += len(chunk)
-        if self.stream:
-            self.writer.write(chunk)
-            await self.writer.drain()
+        return RequestStreamReader(self.request)
 
     async def metadata(self, provider, path):
 
         version = self.get_query_argument("version", default=None)
-        metadata = await self.provider.metadata(self.provider.item, version=version)
+        with tracing.span("provider"):
+            metadata = await self.provider.metadata(self.provider.item, version=version)
+
+        if version is None and self.not_modified(
+            base.strong_etag(metadata), base.http_date(metadata.modified)
+        ):
+            return
 
         return self.write({"data": metadata.json_api_serialized()})
 
     async def children(self, provider, path):
+        """Lists a folder.  With ``limit`` or ``cursor`` a page of the listing is sent, sorted by
+        name, with the cursor of the next page in ``meta.next_cursor``.  With ``format=ndjson``,
+        or an ``Accept: application/x-ndjson`` header, children are streamed one JSON object per
+        line as the provider lists them, the cursor of the next page, if any, is sent in the
+        ``X-Next-Cursor`` header.
+        """
         if not self.provider.item.is_folder:
             raise exceptions.InvalidPathError(
                 "Only folders can be queried for children."
             )
 
-        metadata = await self.provider.children(self.provider.item)
+        limit = self.get_query_argument("limit", default=None)
+        cursor = self.get_query_argument("cursor", default=None)
+        accept = self.get_header("Accept") or ""
+        ndjson = (
+            self.get_query_argument("format", default=None) == "ndjson"
+            or "application/x-ndjson" in accept
+        )
+
+        if limit is None and cursor is None:
+            if ndjson:
+                return await self.write_ndjson(
+                    self.provider.iter_children(self.provider.item)
+                )
+
+            with tracing.span("provider"):
+                metadata = await self.provider.children(self.provider.item)
+
+            if self.not_modified(base.weak_etag(metadata)):
+                return
+
+            return self.write(
+                {"data": [metadata.json_api_serialized() for metadata in metadata]}
+            )
+
+        with tracing.span("provider"):
+            metadata, next_cursor = await self.provider.children_page(
+                self.provider.item, self.page_limit(limit), base.decode_cursor(cursor)
+            )
+        if next_cursor is not None:
+            next_cursor = base.encode_cursor(next_cursor)
+
+        if ndjson:
+            if next_cursor is not None:
+                self.set_header("X-Next-Cursor", next_cursor)
+            return await self.write_ndjson(metadata)
+
+        if self.not_modified(base.weak_etag(metadata)):
+            return
 
         return self.write(
-            {"data": [metadata.json_api_serialized() for metadata in metadata]}
+            {
+                "data": [metadata.json_api_serialized() for metadata in metadata],
+                "meta": {"next_cursor": next_cursor},
+            }
+        )
+
+    def page_limit(self, limit):
+        if limit is None:
+            return settings.CHILDREN_PAGE_SIZE
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.CHILDREN_MAX_PAGE_SIZE:
+            raise exceptions.InvalidParameters(
+                message=f"'limit' must be between 1 and {settings.CHILDREN_MAX_PAGE_SIZE}"
+            )
+        return limit
+
+    async def write_ndjson(self, children):
+        """Writes ``children``, a list or an async iterator, one JSON object per line, flushing
+        every ``CHILDREN_BATCH_SIZE`` lines.
+        """
+        self.set_header("Content-Type", "application/x-ndjson")
+        if isinstance(children, list):
+            children = _aiter(children)
+
+        lines = []
+        try:
+            with tracing.span("stream"):
+                async for child in children:
+                    lines.append(utils.json_dumps(child.json_api_serialized()) + "\n")
+                    if len(lines) >= settings.CHILDREN_BATCH_SIZE:
+                        await self.write_lines(lines)
+                        lines = []
+                await self.write_lines(lines)
+        finally:
+            await children.aclose()
+
+    async def write_lines(self, lines):
+        if not self.bytes_downloaded:
+            tracing.mark("first_byte")
+        chunk = "".join(lines).encode("utf-8")
+        self.write(chunk)
+        self.bytes_downloaded += len(chunk)
+        await self.flush()
+
+    async def usage(self, provider, path):
+        if not self.provider.item.is_folder:
+            raise exceptions.InvalidPathError("Only folders can be queried for usage.")
+
+        with tracing.span("provider"):
+            usage = await self.provider.usage(self.provider.item)
+
+        return self.write(
+            {
+                "data": {
+                    "id": self.provider.item.id,
+                    "type": "usage",
+                    "attributes": usage,
+                }
+            }
         )
 
     async def rename(self, provider, path):
@@ -85,7 +184,8 @@ class ProviderHandler(base.BaseHandler):
             "new_name", "'new_name' is a required argument"
         )
 
-        await self.provider.rename(self.provider.item, new_name)
+        with tracing.span("provider"):
+            await self.provider.rename(self.provider.item, new_name)
 
     async def get(self, provider, path):
         action = self.get_query_argument("serve", default=None)
@@ -116,6 +216,8 @@ class ProviderHandler(base.BaseHandler):
             return await self.move(provider, path)
         elif action == "versions":
             return await self.versions(provider, path)
+        elif action == "usage":
+            return await self.usage(provider, path)
         else:
             return await self.children(provider, path)
 
@@ -125,18 +227,16 @@ class ProviderHandler(base.BaseHandler):
         )
         conflict = self.get_query_argument("conflict", default="warn")
 
-        self.writer.write_eof()
-        conflict = await self.provider.upload(
-            self.provider.item, self.stream, new_name, conflict
-        )
+        with tracing.span("provider"):
+            conflict = await self.provider.upload(
+                self.provider.item, self.stream, new_name, conflict
+            )
+        self.bytes_uploaded += self.request.content.total_bytes
         if conflict in ["new_version", "replace"]:
             self.set_status(200)
         else:
             self.set_status(201)
 
-        self.writer.close()
-        self.wsock.close()
-
     async def create_folder(self, provider, path):
         if not self.provider.item.is_folder:
             raise exceptions.InvalidPathError(
@@ -147,7 +247,8 @@ class ProviderHandler(base.BaseHandler):
             "new_name", "'new_name' is a required argument"
         )
 
-        metadata = await self.provider.create_folder(self.provider.item, new_name)
+        with tracing.span("provider"):
+            metadata = await self.provider.create_folder(self.provider.item, new_name)
 
         self.set_status(201)
 
@@ -177,27 +278,29 @@ class ProviderHandler(base.BaseHandler):
 
     async def move(self, provider, path):
         conflict = self.get_query_argument("conflict", default="warn")
-        self.dest_provider = self.get_destination()
+        self.dest_provider = await self.get_destination()
 
         if self.provider.can_intra_move(self.dest_provider):
             return await self.provider.intra_move(
-                self.provider.item, self.dest_provider
+                self.provider.item, self.dest_provider.item, self.dest_provider
             )
 
-        await self.provider.move(self.provider.item, self.dest_provider, conflict)
-
-        await self.provider.delete()
+        return await self.provider.move(
+            self.provider.item, self.dest_provider.item, self.dest_provider, conflict
+        )
 
     async def delete(self, provider, path):
         comfirm_delete = self.get_query_argument("comfirm_delete", default=None)
-        await self.provider.delete(self.provider.item, comfirm_delete)
+        with tracing.span("provider"):
+            await self.provider.delete(self.provider.item, comfirm_delete)
         self.set_status(204)
 
     async def versions(self, provider, path):
         if self.provider.item.is_folder:
             raise exceptions.InvalidPathError(message="Directories have no revisions")
 
-        metadata = await self.provider.versions(self.provider.item)
+        with tracing.span("provider"):
+            metadata = await self.provider.versions(self.provider.item)
 
         return self.write(
             {"data": [metadata.json_api_serialized() for metadata in metadata]}
@@ -207,53 +310,84 @@ class ProviderHandler(base.BaseHandler):
         return self.request.headers.get(key)
 
     async def download(self, provider, path):
-        range = self.get_header("Range")
+        range_header = self.get_header("Range")
         version = self.get_query_argument("version", default=None)
 
         # if self.provider.direct_download_url() and not range: auth problems
         #    self.redirect(self.provider.direct_download_url())
         #    return
 
-        if range:
-            range = tornado.httputil._parse_request_range(range)
-
-        async with aiohttp.ClientSession() as session:
-            stream = await self.provider.download(
-                self.provider.item,
-                session,
-                version=version,
-                range=range,
-            )
-
-            if range:
-                await stream.response.content.readexactly(range[0])
-
-            if getattr(stream, "partial", None):
-                self.set_status(206)
-                self.set_header("Content-Range", stream.content_range)
-
-            if stream.content_type is not None:
-                self.set_header("Content-Type", stream.content_type)
-
-            if stream.content_range is not None:
-                self.set_header("Content-Length", stream.content_range)
+        # Checked before the provider is asked for the file, a 304 never opens or fetches it
+        item = self.provider.item
+        if version is None and self.not_modified(
+            base.strong_etag(item), base.http_date(item.modified)
+        ):
+            return
+
+        # An unsupported or malformed range is ignored, the whole file is sent
+        range, ranges = None, None
+        if range_header and item.size is not None:
+            ranges = base.parse_request_ranges(range_header, item.size)
+            if ranges is not None and len(ranges) == 1:
+                range, ranges = ranges[0], None
+        elif range_header:
+            range = base.parse_request_range(range_header)
+
+        self.set_header("Accept-Ranges", "bytes")
+        if ranges == [] or (range and item.size is not None and range[0] >= item.size):
+            self.set_status(416)
+            self.set_header("Content-Range", f"bytes */{item.size}")
+            return
+
+        with tracing.span("provider"):
+            if ranges:
+                stream = await self.provider.download_ranges(
+                    self.provider.item, ranges, version=version
+                )
+            else:
+                stream = await self.provider.download(
+                    self.provider.item,
+                    version=version,
+                    range=range,
+                )
+
+        if stream.partial:
+            self.set_status(206)
+        if stream.content_range is not None:
+            self.set_header("Content-Range", stream.content_range)
+
+        if stream.content_type is not None:
+            self.set_header("Content-Type", stream.content_type)
+
+        if stream.content_length is not None:
+            self.set_header("Content-Length", stream.content_length)
 
-            self.set_header(
-                "Content-Disposition",
-                'attachment;filename="{}"'.format(self.provider.item.name),
-            )
-
-            _, ext = os.path.splitext(self.provider.item.name)
-            if ext in mimetypes.types_map:
-                self.set_header("Content-Type", mimetypes.types_map[ext])
-
-            async for chunk in stream:
-                self.write(chunk)
-                self.bytes_downloaded += len(chunk)
-                await self.flush()
+        self.set_header(
+            "Content-Disposition",
+            'attachment;filename="{}"'.format(self.provider.item.name),
+        )
 
-            if getattr(stream, "partial", False):
-                await stream.response.release()
+        _, ext = os.path.splitext(self.provider.item.name)
+        if ext in mimetypes.types_map and not ranges:
+            self.set_header("Content-Type", mimetypes.types_map[ext])
+
+        if isinstance(stream, FileStreamReader):
+            await self.flush()
+            tracing.mark("first_byte")
+            try:
+                with tracing.span("stream"):
+                    self.bytes_downloaded += await stream.sendfile(
+                        self.request.transport
+                    )
+            finally:
+                stream.close()
+            return
+
+        try:
+            await self.write_stream(stream)
+        finally:
+            # Releases the upstream response or mapping, also when the client went away
+            stream.close()
 
     async def download_folder_as_zip(self, provider, path):
         zipfile_name = self.provider.item.name or "{}-archive".format(
@@ -263,11 +397,16 @@ class ProviderHandler(base.BaseHandler):
         self.set_header(
             "Content-Disposition", 'attachment;filename="{}.zip"'.format(zipfile_name)
         )
-        async with aiohttp.ClientSession() as session:
+        with tracing.span("provider"):
+            stream = await self.provider.zip(self.provider.item)
 
-            stream = await self.provider.zip(self.provider.item, session)
+        await self.write_stream(stream)
 
+    async def write_stream(self, stream):
+        with tracing.span("stream"):
             async for chunk in stream:
+                if not self.bytes_downloaded:
+                    tracing.mark("first_byte")
                 self.write(chunk)
                 self.bytes_downloaded += len(chunk)
                 await self.flush()
@@ -282,3 +421,8 @@ class ProviderHandler(base.BaseHandler):
         if not value:
             raise exceptions.InvalidParameters(message=message)
         return value
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
@@ -1,7 +1,16 @@
+import os
+import mimetypes
+
 from aiohttp import web
 from aiohttp import hdrs
 from aquavalet import settings
+from aquavalet import metrics
+from aquavalet import tracing
 from aquavalet import utils
+from aquavalet import exceptions
+from aquavalet.server import base, batch
+from aquavalet.streams.file import FileStreamReader
+from aquavalet.streams.byteranges import ByteRangesStream
 
 routes = web.RouteTableDef()
 
@@ -11,7 +20,30 @@ async def get_handler(request):
     return web.json_response({"status": "up"})
 
 
-@routes.view(r"/{path:/.*/?}")
+@routes.get("/metrics")
+async def metrics_handler(request):
+    return web.Response(
+        body=metrics.REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+@routes.post(r"/batch/{provider:(?:osfstorage|filesystem)}", name="batch")
+async def batch_handler(request):
+    """Resolves the metadata of many paths of one provider, the body is ``{"paths": [...]}``."""
+    try:
+        body = await request.json()
+        paths = body["paths"]
+    except (ValueError, TypeError, KeyError):
+        raise exceptions.InvalidParameters('The body must be {"paths": [...]}')
+
+    results = await batch.resolve(
+        request.match_info["provider"], paths, version=body.get("version")
+    )
+    return web.json_response({"data": results}, dumps=utils.json_dumps)
+
+
+@routes.view(r"/{provider:(?:osfstorage|filesystem)}{path:/.*}")
 class MyView(web.View):
 
     bytes_downloaded = 0
@@ -37,6 +69,7 @@ class MyView(web.View):
         method = getattr(self, self.request.method.lower(), None)
         if method is None:
             self._raise_allowed_methods()
+        tracing.mark("dispatch")
         await self.prepare()
         resp = await method()
         return resp
@@ -48,18 +81,267 @@ class MyView(web.View):
         path = request.match_info.get("path")
 
         auth = None  # Figure out best approach
-        self.provider = utils.make_provider(provider, auth)
-        self.provider.item = await self.provider.validate_item(path)
-
-    # async def get(self):
-    #    return web.json_response(self.request.match_info)
+        with tracing.span("make_provider"):
+            self.provider = utils.make_provider(provider, auth)
+        with tracing.span("validate_item"):
+            self.provider.item = await self.provider.validate_item(path)
 
     async def get(self):
+        action = self.request.query.get("serve")
+
+        if action == "download":
+            return await self.download()
+        elif action == "children":
+            return await self.children()
+        elif action == "usage":
+            return await self.usage()
+        return await self.metadata()
+
+    def not_modified(self, headers, etag, last_modified=None):
+        """Adds the validators of the response to ``headers``, returns True when the request's
+        conditional headers show the client already has it and a 304 should be sent.
+        """
+        if etag is not None:
+            headers["ETag"] = etag
+        if last_modified is not None:
+            headers["Last-Modified"] = last_modified
+        return base.is_not_modified(self.request.headers, etag, last_modified)
 
+    async def metadata(self):
         version = self.request.query.get("version")
-        metadata = await self.provider.metadata(self.provider.item, version=version)
+        with tracing.span("provider"):
+            metadata = await self.provider.metadata(self.provider.item, version=version)
+
+        headers = {}
+        if version is None and self.not_modified(
+            headers, base.strong_etag(metadata), base.http_date(metadata.modified)
+        ):
+            return web.Response(status=304, headers=headers)
+
+        return web.json_response(
+            {"data": metadata.json_api_serialized()},
+            headers=headers,
+            dumps=utils.json_dumps,
+        )
+
+    async def children(self):
+        """Lists a folder.  With ``limit`` or ``cursor`` a page of the listing is sent, sorted by
+        name, with the cursor of the next page in ``meta.next_cursor``.  With ``format=ndjson``,
+        or an ``Accept: application/x-ndjson`` header, children are streamed one JSON object per
+        line as the provider lists them, the cursor of the next page, if any, is sent in the
+        ``X-Next-Cursor`` header.
+        """
+        item = self.provider.item
+        if not item.is_folder:
+            raise exceptions.InvalidPathError(
+                "Only folders can be queried for children."
+            )
+
+        limit = self.request.query.get("limit")
+        cursor = self.request.query.get("cursor")
+        accept = self.request.headers.get("Accept", "")
+        ndjson = (
+            self.request.query.get("format") == "ndjson"
+            or "application/x-ndjson" in accept
+        )
+
+        headers = {}
+        if limit is None and cursor is None:
+            if ndjson:
+                return await self.write_ndjson(
+                    self.provider.iter_children(item), headers
+                )
+
+            with tracing.span("provider"):
+                metadata = await self.provider.children(item)
+
+            if self.not_modified(headers, base.weak_etag(metadata)):
+                return web.Response(status=304, headers=headers)
+
+            return web.json_response(
+                {"data": [metadata.json_api_serialized() for metadata in metadata]},
+                headers=headers,
+                dumps=utils.json_dumps,
+            )
+
+        with tracing.span("provider"):
+            metadata, next_cursor = await self.provider.children_page(
+                item, self.page_limit(limit), base.decode_cursor(cursor)
+            )
+        if next_cursor is not None:
+            next_cursor = base.encode_cursor(next_cursor)
+
+        if ndjson:
+            if next_cursor is not None:
+                headers["X-Next-Cursor"] = next_cursor
+            return await self.write_ndjson(metadata, headers)
+
+        if self.not_modified(headers, base.weak_etag(metadata)):
+            return web.Response(status=304, headers=headers)
 
-        return web.json_response({"data": metadata.json_api_serialized()})
+        return web.json_response(
+            {
+                "data": [metadata.json_api_serialized() for metadata in metadata],
+                "meta": {"next_cursor": next_cursor},
+            },
+            headers=headers,
+            dumps=utils.json_dumps,
+        )
+
+    def page_limit(self, limit):
+        if limit is None:
+            return settings.CHILDREN_PAGE_SIZE
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.CHILDREN_MAX_PAGE_SIZE:
+            raise exceptions.InvalidParameters(
+                message=f"'limit' must be between 1 and {settings.CHILDREN_MAX_PAGE_SIZE}"
+            )
+        return limit
+
+    async def write_ndjson(self, children, headers):
+        """Streams ``children``, a list or an async iterator, one JSON object per line, writing
+        every ``CHILDREN_BATCH_SIZE`` lines.
+        """
+        if isinstance(children, list):
+            children = _aiter(children)
+
+        try:
+            response = web.StreamResponse(headers=headers)
+            response.content_type = "application/x-ndjson"
+            await response.prepare(self.request)
+
+            self.request["bytes_downloaded"] = 0
+            lines = []
+            with tracing.span("stream"):
+                async for child in children:
+                    lines.append(utils.json_dumps(child.json_api_serialized()) + "\n")
+                    if len(lines) >= settings.CHILDREN_BATCH_SIZE:
+                        await self.write_lines(response, lines)
+                        lines = []
+                await self.write_lines(response, lines)
+            await response.write_eof()
+            return response
+        finally:
+            await children.aclose()
+
+    async def write_lines(self, response, lines):
+        if not self.request["bytes_downloaded"]:
+            tracing.mark("first_byte")
+        chunk = "".join(lines).encode("utf-8")
+        await response.write(chunk)
+        self.request["bytes_downloaded"] += len(chunk)
+
+    async def download(self):
+        """Streams the file, or the ranges of it asked for in a ``Range`` header, several ranges
+        as ``multipart/byteranges``.  Files the provider reads from local disk are handed to the
+        kernel with ``sendfile``, their bytes never go through Python.
+        """
+        range_header = self.request.headers.get("Range")
+        version = self.request.query.get("version")
+        item = self.provider.item
+
+        # Checked before the provider is asked for the file, a 304 never opens or fetches it
+        headers = {}
+        if version is None and self.not_modified(
+            headers, base.strong_etag(item), base.http_date(item.modified)
+        ):
+            return web.Response(status=304, headers=headers)
+
+        # An unsupported or malformed range is ignored, the whole file is sent
+        range, ranges = None, None
+        if range_header and item.size is not None:
+            ranges = base.parse_request_ranges(range_header, item.size)
+            if ranges is not None and len(ranges) == 1:
+                range, ranges = ranges[0], None
+        elif range_header:
+            range = base.parse_request_range(range_header)
+
+        headers["Accept-Ranges"] = "bytes"
+        if ranges == [] or (range and item.size is not None and range[0] >= item.size):
+            headers["Content-Range"] = f"bytes */{item.size}"
+            return web.Response(status=416, headers=headers)
+
+        with tracing.span("provider"):
+            if ranges:
+                stream = await self.provider.download_ranges(
+                    item, ranges, version=version
+                )
+            else:
+                stream = await self.provider.download(
+                    item, version=version, range=range
+                )
+
+        try:
+            response = web.StreamResponse(
+                status=206 if stream.partial else 200, headers=headers
+            )
+            self.set_stream_headers(response, stream)
+            await response.prepare(self.request)
+
+            if isinstance(stream, FileStreamReader):
+                tracing.mark("first_byte")
+                with tracing.span("stream"):
+                    self.request["bytes_downloaded"] = await stream.sendfile(
+                        self.request.transport
+                    )
+            else:
+                await self.write_stream(response, stream)
+            await response.write_eof()
+            return response
+        finally:
+            # Releases the file, mapping or upstream response, also when the client went away
+            stream.close()
+
+    def set_stream_headers(self, response, stream):
+        if stream.content_range is not None:
+            response.headers["Content-Range"] = stream.content_range
+        if stream.content_length is not None:
+            response.content_length = stream.content_length
+
+        name = self.provider.item.name
+        _, ext = os.path.splitext(name)
+        # A multipart body keeps the content type naming its boundary
+        if ext in mimetypes.types_map and not isinstance(stream, ByteRangesStream):
+            response.content_type = mimetypes.types_map[ext]
+        elif stream.content_type is not None:
+            response.content_type = stream.content_type
+        response.headers["Content-Disposition"] = f'attachment;filename="{name}"'
+
+    async def write_stream(self, response, stream):
+        """Writes ``stream`` out, counting the bytes sent in ``request["bytes_downloaded"]``."""
+        self.request["bytes_downloaded"] = 0
+        with tracing.span("stream"):
+            async for chunk in stream:
+                if not self.request["bytes_downloaded"]:
+                    tracing.mark("first_byte")
+                await response.write(chunk)
+                self.request["bytes_downloaded"] += len(chunk)
+
+    async def usage(self):
+        if not self.provider.item.is_folder:
+            raise exceptions.InvalidPathError("Only folders can be queried for usage.")
+
+        with tracing.span("provider"):
+            usage = await self.provider.usage(self.provider.item)
+
+        return web.json_response(
+            {
+                "data": {
+                    "id": self.provider.item.id,
+                    "type": "usage",
+                    "attributes": usage,
+                }
+            },
+            dumps=utils.json_dumps,
+        )
 
     async def post(self):
         pass
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
@@ -0,0 +1,61 @@
+import logging
+
+import aiohttp
+
+from aquavalet import concurrency, metrics, ratelimit, settings
+
+logger = logging.getLogger(__name__)
+
+_SESSION = None
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Returns a new ``ClientSession`` over a keep-alive connection pool configured from
+    ``settings.HTTP_*``, DNS lookups are cached for ``HTTP_DNS_CACHE_TTL`` seconds.  Requests are
+    rate limited per host by :mod:`aquavalet.ratelimit`, their responses feed the adaptive limits
+    of :mod:`aquavalet.concurrency`, and their latency is recorded in :mod:`aquavalet.metrics`.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=settings.HTTP_POOL_LIMIT,
+        limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=[
+            ratelimit.trace_config(),
+            concurrency.trace_config(),
+            metrics.upstream_trace_config(),
+        ],
+        timeout=aiohttp.ClientTimeout(
+            total=None, connect=settings.HTTP_CONNECT_TIMEOUT
+        ),
+    )
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Returns the process wide session shared by every provider, creating it on first use.
+    Must be called with the event loop running.
+    """
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = create_session()
+    return _SESSION
+
+
+async def close_session():
+    """Closes the shared session and its pooled connections."""
+    global _SESSION
+    if _SESSION is not None:
+        await _SESSION.close()
+        _SESSION = None
+
+
+async def on_startup(app):
+    app["session"] = get_session()
+
+
+async def on_cleanup(app):
+    await close_session()
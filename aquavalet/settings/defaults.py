@@ -1,14 +1,93 @@
+import os
 import logging.config
 
 ADDRESS = "0.0.0.0"
 PORT = 8000
 DOMAIN = "http://localhost:{}".format(PORT)
+WORKERS = os.cpu_count() or 1  # processes forked by aquavalet.server.prefork
+WORKER_SHUTDOWN_TIMEOUT = 30  # seconds a stopping worker has to finish its requests
+LISTEN_BACKLOG = 1024
 
 DEBUG = True
+TRACE_FILE = None  # path to append a JSON timing trace of every request to
 
 CHUNK_SIZE = 65536  # 64KB
 DEFAULT_CONFLICT = "warn"
-CONCURRENT_OPS = 5
+CONCURRENT_OPS = 5  # files copied or folders listed at once by recursive operations
+BATCH_CONCURRENCY = 16  # paths of a batch metadata request resolved at once
+BATCH_MAX_PATHS = 1000
+IO_THREADS = 16  # threads available for blocking disk I/O
+CHILDREN_BATCH_SIZE = 1000  # folder entries listed and streamed at a time
+CHILDREN_PAGE_SIZE = 1000  # default ``limit`` of a paginated children listing
+CHILDREN_MAX_PAGE_SIZE = 10000
+FAST_JSON = True  # encode responses with orjson when it is installed
+COALESCE_READS = True  # identical concurrent reads share one provider call
+
+# Outgoing HTTP requests share one keep-alive connection pool per process
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = 30
+HTTP_KEEPALIVE_TIMEOUT = 30  # seconds an idle connection is kept open
+HTTP_DNS_CACHE_TTL = 300
+HTTP_CONNECT_TIMEOUT = 30
+
+# Outgoing requests per host, as {host: (requests per second, burst)}, see aquavalet.ratelimit
+RATE_LIMITS = {}
+RATE_LIMIT_DEFAULT = None  # (rate, burst) for hosts not listed, None for no limit
+
+# Providers with an upstream start at CONCURRENT_OPS and adapt it to the upstream's responses: the
+# limit grows while latencies stay within the tolerance times the lowest seen, and is multiplied
+# by the backoff on a 429, a 503 or a timeout, see aquavalet.concurrency
+CONCURRENT_OPS_MIN = 1
+CONCURRENT_OPS_MAX = 64
+CONCURRENCY_BACKOFF = 0.5
+CONCURRENCY_LATENCY_TOLERANCE = 2.0
+
+# Idempotent upstream requests that fail with a connection error, a timeout or a retryable status
+# are retried up to RETRY_ATTEMPTS times after an exponential backoff with jitter, or the
+# Retry-After asked for.  Retries are limited to RETRY_BUDGET_RATIO of the requests made plus
+# RETRY_BUDGET_MINIMUM per second, see aquavalet.retry
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.1  # seconds, the first backoff's ceiling, doubled for each retry
+RETRY_MAX_DELAY = 10  # seconds, a longer Retry-After is not waited for
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MINIMUM = 10
+
+# Uploads to the filesystem are coalesced into writes of this size and, when the size is known,
+# preallocated with posix_fallocate
+UPLOAD_BUFFER_SIZE = 4 * 1024 * 1024  # 4MB
+UPLOAD_PREALLOCATE = True
+# Uploads are written to hidden ".upload-" files, those left behind by a crash and untouched for
+# this long are removed when a listing of their folder comes across them
+UPLOAD_STALE_AFTER = 24 * 60 * 60  # seconds
+
+# Local copies use reflinks or copy_file_range when the filesystem supports them, and copy the
+# files of a folder with this many workers
+KERNEL_COPY = True
+COPY_WORKERS = 4
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB, used when the kernel can't copy for us
+
+# Copies between providers read the source ahead of the destination, in chunks, into a buffer
+# of up to TRANSFER_BUFFER_SIZE bytes per file.  0 reads and writes in lock-step
+TRANSFER_CHUNK_SIZE = 256 * 1024  # 256KB
+TRANSFER_BUFFER_SIZE = 4 * 1024 * 1024  # 4MB
+
+# Folder usage totals are cached until the folder's etag changes or this many seconds pass, changes
+# deeper in the tree only show up once the entry expires
+USAGE_CACHE_TTL = 60
+USAGE_CACHE_SIZE = 1024
+
+# Serve small to medium local files from shared memory maps instead of reading them per request
+MMAP_ENABLED = False
+MMAP_MAX_FILE_SIZE = 64 * 1024 * 1024  # 64MB, larger files are always read
+MMAP_MAX_TOTAL = (
+    1024 * 1024 * 1024
+)  # 1GB mapped at most, least recently used maps are dropped
+
+# Downloads of several ranges are sent as multipart/byteranges.  Upstream, ranges closer than the
+# gap are fetched with one spanning request, the others with concurrent requests
+MAX_RANGES = 64  # a Range header with more is ignored and the whole file sent
+RANGE_COALESCE_GAP = 256 * 1024  # 256KB
+RANGE_PREFETCH = 4  # upstream range requests made ahead of the part being sent
 
 ROOT_PATTERN = r"/(?P<provider>(?:osfstorage|filesystem)+)(?P<path>/.*/?)"
 
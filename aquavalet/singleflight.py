@@ -0,0 +1,39 @@
+"""Coalesces identical concurrent calls: while a call for a key is running, callers with the same key
+wait for it and share its result instead of starting their own.  Only meant for reads, the result
+is handed to every caller as is.
+"""
+
+import asyncio
+
+
+class Group:
+    def __init__(self):
+        self.calls = {}  # key -> future of the call in flight
+
+    def __len__(self):
+        return len(self.calls)
+
+    async def do(self, key, func):
+        """Returns the result of ``await func()``, or of the identical call already in flight.
+        Returns ``(result, shared)``, ``shared`` is True when another caller's call was joined.
+        A caller that is cancelled does not cancel the call for the others.
+        """
+        call = self.calls.get(key)
+        shared = call is not None
+        if not shared:
+            call = self.calls[key] = asyncio.ensure_future(func())
+            call.add_done_callback(lambda call: self._done(key, call))
+        return await asyncio.shield(call), shared
+
+    def _done(self, key, call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+        if not call.cancelled():
+            call.exception()  # retrieved, it was raised to whoever was waiting
+
+    def forget(self, predicate):
+        """Calls whose key matches ``predicate`` keep running for the callers already waiting,
+        callers from now on start a new call.
+        """
+        for key in [key for key in self.calls if predicate(key)]:
+            del self.calls[key]
@@ -0,0 +1,162 @@
+import uuid
+import asyncio
+
+from aquavalet import exceptions
+from aquavalet.streams.base import BaseStream
+
+
+def coalesce_ranges(ranges, gap):
+    """Groups sorted, inclusive ``(start, end)`` ranges whose distance from the previous range is at
+    most ``gap`` bytes, so each group can be fetched with a single spanning request.  Returns a
+    list of ``((start, end), ranges)`` pairs.
+    """
+    groups = []
+    for start, end in ranges:
+        if groups and start - groups[-1][0][1] - 1 <= gap:
+            (group_start, group_end), members = groups[-1]
+            groups[-1] = ((group_start, max(group_end, end)), members + [(start, end)])
+        else:
+            groups.append(((start, end), [(start, end)]))
+    return groups
+
+
+class SectionReader(BaseStream):
+    """Reads ``length`` bytes of ``stream`` after discarding the next ``skip`` bytes, to cut the
+    parts of a coalesced range out of a single upstream response.
+    """
+
+    def __init__(self, stream, skip, length):
+        super().__init__()
+        self.stream = stream
+        self._skip = skip
+        self._remaining = length
+
+    @property
+    def size(self):
+        return self._remaining
+
+    def close(self):
+        if hasattr(self.stream, "close"):
+            self.stream.close()
+
+    async def _read(self, size):
+        while self._skip:
+            skipped = await self.stream.read(min(self._skip, self.CHUNK_SIZE))
+            if not skipped:
+                break
+            self._skip -= len(skipped)
+
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        chunk = await self.stream.read(size) if size else b""
+        self._remaining -= len(chunk)
+        if not chunk:
+            self.feed_eof()
+        return chunk
+
+
+class ByteRangesStream(BaseStream):
+    """A ``multipart/byteranges`` body (RFC 7233, appendix A) made of one part per range of a
+    file of ``size`` bytes.  ``parts`` is a list of ``(start, end, open_part)``, where
+    ``open_part`` is a coroutine function returning a stream of exactly the bytes of that
+    inclusive range.  Parts are opened as they are reached, ``prefetch`` more are opened ahead of
+    the one being read so their upstream requests overlap.  Each part is read to EOF, resources
+    shared by parts, like a file, are released by ``on_close``.  `close` also closes the parts
+    still open, as when the client went away.
+    """
+
+    def __init__(self, parts, size, content_type, prefetch=0, on_close=None):
+        super().__init__()
+        self.parts = parts
+        self.file_size = size
+        self.part_content_type = content_type
+        self.prefetch = prefetch
+        self.on_close = on_close
+        self.boundary = uuid.uuid4().hex
+        self.partial = True
+        self.content_range = None
+        self.content_length = sum(
+            len(self._part_header(start, end)) + end - start + 1 + 2
+            for start, end, _ in parts
+        ) + len(self._closing())
+
+        self._opened = {}
+        self._chunks = self._generate()
+
+    @property
+    def content_type(self):
+        return "multipart/byteranges; boundary={}".format(self.boundary)
+
+    @property
+    def size(self):
+        return self.content_length
+
+    def _part_header(self, start, end):
+        return (
+            "--{}\r\nContent-Type: {}\r\nContent-Range: bytes {}-{}/{}\r\n\r\n".format(
+                self.boundary, self.part_content_type, start, end, self.file_size
+            ).encode("latin-1")
+        )
+
+    def _closing(self):
+        return "--{}--\r\n".format(self.boundary).encode("latin-1")
+
+    def _open(self, index):
+        if index < len(self.parts) and index not in self._opened:
+            self._opened[index] = asyncio.ensure_future(self.parts[index][2]())
+        return self._opened.get(index)
+
+    async def _generate(self):
+        for index, (start, end, _) in enumerate(self.parts):
+            part = self._open(index)
+            for ahead in range(index + 1, index + 1 + self.prefetch):
+                self._open(ahead)
+
+            yield self._part_header(start, end)
+            stream = await part
+            remaining = end - start + 1
+            while remaining:
+                chunk = await stream.read(min(remaining, self.CHUNK_SIZE))
+                if not chunk:
+                    raise exceptions.DownloadError(
+                        "Range {}-{} ended {} bytes early".format(start, end, remaining)
+                    )
+                remaining -= len(chunk)
+                yield chunk
+            # Reading to EOF releases upstream responses back to the pool
+            if await stream.read(self.CHUNK_SIZE):
+                raise exceptions.DownloadError(
+                    "Range {}-{} is longer than requested".format(start, end)
+                )
+            del self._opened[index]
+            yield b"\r\n"
+
+        yield self._closing()
+
+    def close(self):
+        for part in self._opened.values():
+            if part.done():
+                if not part.cancelled() and part.exception() is None:
+                    _close_part(part.result())
+            else:
+                part.cancel()
+        self._opened.clear()
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+        self.feed_eof()
+
+    async def _read(self, size):
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.close()
+            return b""
+        except BaseException:
+            self.close()
+            raise
+
+
+def _close_part(stream):
+    if hasattr(stream, "close"):
+        stream.close()
@@ -1,49 +1,164 @@
 import os
-from aquavalet.providers.filesystem.settings import CHUNK_SIZE
+import asyncio
+
+from aquavalet import aio
+from aquavalet.settings import CHUNK_SIZE
 from aquavalet.streams.base import BaseStream
 
 
 class FileStreamReader(BaseStream):
+    """Streams a file, or a range of it, in `CHUNK_SIZE` pieces.  The file size is taken from a
+    single ``fstat`` when the stream is created and the read position is tracked here, so `size`
+    and `at_eof` never touch the file and memory use doesn't depend on the size of the range.
+    """
 
     CHUNK_SIZE = CHUNK_SIZE
 
     def __init__(self, file_pointer, range=None):
         super().__init__()
         self.file_pointer = file_pointer
-        self.read_size = None
         self.file_gen = None
         self.content_type = "application/octet-stream"
+        self.file_size = os.fstat(file_pointer.fileno()).st_size
 
         if range:
-            self.file_pointer.seek(range[0])
-            self.read_size = range[1] - range[0] + 1
+            start, end = range
+            self.file_pointer.seek(start)
+            self.read_size = None if end is None else end - start + 1
             self.partial = True
         else:
+            start = self.file_pointer.tell()
+            self.read_size = None
             self.partial = False
 
+        self._start = self._position = start
+        self._end = self.file_size
+        if self.read_size is not None:
+            self._end = min(self._end, start + self.read_size)
+
     @property
     def size(self):
         if self.read_size:
             return self.read_size
-        else:
-            cursor = self.file_pointer.tell()
-            self.file_pointer.seek(0, os.SEEK_END)
-            ret = self.file_pointer.tell()
-            self.file_pointer.seek(cursor)
-            return ret
+        return self.file_size - self._start
 
     def close(self):
         self.file_pointer.close()
         self.feed_eof()
 
     def at_eof(self):
-        return self.file_pointer.tell() == self.size
+        return self._position >= self._end
 
     @property
     def content_range(self):
-        return None
+        """The ``Content-Range`` of a ranged stream, ``None`` for the whole file."""
+        if not self.partial:
+            return None
+        return "bytes {}-{}/{}".format(self._start, self._end - 1, self.file_size)
+
+    @property
+    def content_length(self):
+        """The number of bytes left to send, the requested range clipped to the end of the file."""
+        return max(0, self._end - self._position)
+
+    async def sendfile(self, transport):
+        """Sends the rest of the stream to ``transport`` with ``loop.sendfile``, which hands the
+        file descriptor to the kernel (``os.sendfile``) so the bytes never enter user space.  Falls
+        back to plain reads and writes for transports that can't use it, like TLS.  Ranges are
+        honoured through the offset and count.  Returns the number of bytes sent.
+        """
+        loop = asyncio.get_event_loop()
+        count = self.content_length
+        if count:
+            count = await loop.sendfile(
+                transport, self.file_pointer, self._position, count
+            )
+            self._position += count
+        self.feed_eof()
+        return count
 
     async def _read(self, size):
+        remaining = self.content_length
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if not size:
+            return self.file_pointer.read(0)
+
+        data = await aio.run(self.file_pointer.read, size)
+        if data:
+            self._position += len(data)
+        else:
+            self._position = self._end  # the file was truncated under us
+        return data
+
+
+class MappedFileStreamReader(BaseStream):
+    """Streams a file, or a range of it, as ``memoryview`` slices of a shared memory map (see
+    :class:`aquavalet.providers.filesystem.mapping.Mapping`).  Readers of the same file share the
+    page cache pages without opening, seeking or copying per request.  The mapping's reference is
+    released at EOF or on `close`.
+    """
+
+    CHUNK_SIZE = CHUNK_SIZE
+
+    def __init__(self, mapping, range=None):
+        super().__init__()
+        self.mapping = mapping
+        self.content_type = "application/octet-stream"
+        self.file_size = mapping.size
+        self._view = memoryview(mapping.mmap)
+
+        if range:
+            start, end = range
+            self.read_size = None if end is None else end - start + 1
+            self.partial = True
+        else:
+            start = 0
+            self.read_size = None
+            self.partial = False
+
+        self._start = self._position = min(start, self.file_size)
+        self._end = self.file_size
+        if self.read_size is not None:
+            self._end = min(self._end, start + self.read_size)
+
+    @property
+    def size(self):
         if self.read_size:
-            return self.file_pointer.read(self.read_size)
-        return self.file_pointer.read(size)
+            return self.read_size
+        return self.file_size - self._start
+
+    @property
+    def content_range(self):
+        """The ``Content-Range`` of a ranged stream, ``None`` for the whole file."""
+        if not self.partial:
+            return None
+        return "bytes {}-{}/{}".format(self._start, self._end - 1, self.file_size)
+
+    @property
+    def content_length(self):
+        return max(0, self._end - self._position)
+
+    def at_eof(self):
+        return self._position >= self._end
+
+    def close(self):
+        self._release()
+        self.feed_eof()
+
+    def _release(self):
+        if self.mapping is not None:
+            self._view = None
+            self.mapping.release()
+            self.mapping = None
+
+    async def _read(self, size):
+        remaining = self.content_length
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+
+        chunk = self._view[self._position : self._position + size] if size else b""
+        self._position += size
+        if self.at_eof():
+            self._release()
+        return chunk
@@ -1,18 +1,73 @@
 import uuid
 import asyncio
+import logging
 
+from aquavalet import exceptions
 from aquavalet.streams.base import BaseStream, MultiStream, StringStream
 
+logger = logging.getLogger(__name__)
+
+
+def parse_content_range(content_range):
+    """Parses a ``Content-Range: bytes start-end/total`` header into ``(start, end, total)``,
+    ``total`` is ``None`` when the server sent ``*``.  Returns ``None`` if it can't be parsed.
+    """
+    unit, _, value = (content_range or "").partition(" ")
+    span, _, total = value.partition("/")
+    start, _, end = span.partition("-")
+    if unit.strip() != "bytes":
+        return None
+    try:
+        return int(start), int(end), None if total.strip() == "*" else int(total)
+    except ValueError:
+        return None
+
 
 class ResponseStreamReader(BaseStream):
-    def __init__(self, response, size=None, name=None):
+    """Streams the body of an upstream response.  When a ``range`` ``(start, end or None)`` was
+    requested, the upstream ``206`` and its ``Content-Range`` are checked against it.  An upstream
+    that ignored the range and sent the whole file (``200``) still yields only the requested
+    bytes, by skipping to the start as they arrive.
+    """
+
+    def __init__(self, response, range=None, name=None):
         super().__init__()
         self._name = name
         self.response = response
+        self._skip = 0
+        self._remaining = None
+        self._range = None
+
+        if range is not None:
+            start, end = range
+            if response.status == 206:
+                self._range = parse_content_range(response.headers.get("Content-Range"))
+                if (
+                    self._range is None
+                    or self._range[0] != start
+                    or (end is not None and self._range[1] > end)
+                ):
+                    response.release()
+                    raise exceptions.DownloadError(
+                        "Upstream sent Content-Range {!r} for the range {}-{}".format(
+                            response.headers.get("Content-Range"),
+                            start,
+                            "" if end is None else end,
+                        )
+                    )
+            elif response.status == 200 and response.content_length is not None:
+                total = response.content_length
+                end = total - 1 if end is None else min(end, total - 1)
+                logger.warning(
+                    f"Upstream ignored the range {start}-{end}, skipping to it"
+                )
+                self._range = (start, end, total)
+                self._skip = start
+                self._remaining = max(0, end - start + 1)
 
     @property
     def partial(self):
-        return self.response.status == 206
+        return self._range is not None
 
     @property
     def content_type(self):
@@ -20,7 +75,18 @@ class ResponseStreamReader(BaseStream):
 
     @property
     def content_range(self):
-        return self.size
+        if self._range is None:
+            return None
+        start, end, total = self._range
+        return "bytes {}-{}/{}".format(start, end, "*" if total is None else total)
+
+    @property
+    def content_length(self):
+        """The number of bytes this stream yields, ``None`` if upstream didn't say."""
+        if self._range is not None:
+            start, end, _ = self._range
+            return end - start + 1
+        return self.response.content_length
 
     @property
     def name(self):
@@ -28,10 +94,26 @@ class ResponseStreamReader(BaseStream):
 
     @property
     def size(self):
-        return self.response.content._size
+        return self.content_length
+
+    def close(self):
+        self.response.release()
 
     async def _read(self, size):
-        chunk = await self.response.content.read(size)
+        while self._skip:
+            skipped = await self.response.content.read(min(self._skip, 1024 * 1024))
+            if not skipped:
+                break
+            self._skip -= len(skipped)
+
+        if self._remaining is not None:
+            if size is None or size < 0 or size > self._remaining:
+                size = self._remaining
+            chunk = await self.response.content.read(size) if size else b""
+            self._remaining -= len(chunk)
+        else:
+            chunk = await self.response.content.read(size)
+
         if not chunk:
             self.feed_eof()
             await self.response.release()
@@ -40,14 +122,20 @@ class ResponseStreamReader(BaseStream):
 
 
 class RequestStreamReader(BaseStream):
-    def __init__(self, request, reader):
+    """Reads the body of an aiohttp request straight from its payload (``request.content``).
+    aiohttp stops reading from the socket while the payload buffer is full, so a slow provider
+    slows the client down instead of the body piling up in memory.
+    """
+
+    def __init__(self, request, reader=None):
         super().__init__()
-        self.reader = reader
+        self.reader = request.content if reader is None else reader
         self.request = request
 
     @property
     def size(self):
-        return int(self.request.headers.get("Content-Length"))
+        length = self.request.headers.get("Content-Length")
+        return None if length is None else int(length)
 
     def at_eof(self):
         return self.reader.at_eof()
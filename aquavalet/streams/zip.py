@@ -4,6 +4,7 @@ import struct
 import asyncio
 import zipfile
 import binascii
+import contextlib
 
 from aquavalet.streams.base import BaseStream, MultiStream, StringStream, EmptyStream
 from aquavalet.utils import lreplace
@@ -404,8 +405,7 @@ class ZipStreamReader(asyncio.StreamReader):
 
 
 class ZipStreamGeneratorReader:
-    def __init__(self, provider, item, children, session):
-        self.session = session
+    def __init__(self, provider, item, children):
         self.provider = provider
         self.parent_path = item.unix_path
         self.remaining = children
@@ -419,14 +419,18 @@ class ZipStreamGeneratorReader:
         if not self.remaining:
             raise StopAsyncIteration
         current = self.remaining.pop(0)
+        # Listings and downloads take a slot of the provider's limiter, if it has one, until
+        # their response starts
+        limiter = self.provider.limiter or contextlib.nullcontext()
         if current.is_folder:
-            items = await self.provider.children(current)
+            async with limiter:
+                items = await self.provider.children(current)
             if items:
                 self.remaining.extend(items)
                 return await self.__anext__()
             else:
                 return current.unix_path.lstrip(self.parent_path), EmptyStream()
 
-        return lreplace(
-            self.parent_path, "", current.unix_path
-        ), await self.provider.download(current, self.session)
+        async with limiter:
+            stream = await self.provider.download(current)
+        return lreplace(self.parent_path, "", current.unix_path), stream
@@ -0,0 +1,101 @@
+"""Per request timing spans, sent back in the ``Server-Timing`` header and, when
+``settings.TRACE_FILE`` is set, appended to that file as one JSON object per request.
+
+The trace of the current request is held in a context variable, code anywhere below the handler
+records into it with `span` and `mark`, which do nothing outside of a traced request.
+"""
+
+import json
+import time
+import logging
+import contextlib
+import contextvars
+
+from aquavalet import aio, settings
+
+logger = logging.getLogger(__name__)
+
+_CURRENT = contextvars.ContextVar("aquavalet_trace", default=None)
+
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []  # (name, offset from the start, duration) in seconds
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start - self.started, time.perf_counter() - start))
+
+    def mark(self, name):
+        """Records the time elapsed since the start of the request, ``first_byte`` for instance."""
+        self.spans.append((name, 0.0, time.perf_counter() - self.started))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Formats the spans recorded so far, and the total so far, as a ``Server-Timing`` value.
+        Spans still running when the headers go out, like streaming the body, are not included.
+        """
+        metrics = [
+            f"{name};dur={duration * 1000:.3f}" for name, _, duration in self.spans
+        ]
+        metrics.append(f"total;dur={self.elapsed * 1000:.3f}")
+        return ", ".join(metrics)
+
+    def serialized(self) -> dict:
+        return {
+            "name": self.name,
+            "started": time.time() - self.elapsed,
+            "duration": self.elapsed,
+            "spans": [
+                {"name": name, "offset": offset, "duration": duration}
+                for name, offset, duration in self.spans
+            ],
+        }
+
+
+def start(name) -> Trace:
+    """Starts tracing the current request, in the current context."""
+    trace = Trace(name)
+    _CURRENT.set(trace)
+    return trace
+
+
+def current():
+    return _CURRENT.get()
+
+
+def span(name):
+    trace = _CURRENT.get()
+    if trace is None:
+        return contextlib.nullcontext()
+    return trace.span(name)
+
+
+def mark(name):
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def finish(trace):
+    """Appends the finished trace to ``settings.TRACE_FILE``, in the I/O thread pool."""
+    if settings.TRACE_FILE:
+        line = json.dumps(trace.serialized()) + "\n"
+        aio.get_executor().submit(_append, settings.TRACE_FILE, line)
+
+
+def _append(path, line):
+    try:
+        with open(path, "a") as trace_file:
+            trace_file.write(line)
+    except OSError:
+        logger.exception(f"Could not write trace to {path}")
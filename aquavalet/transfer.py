@@ -0,0 +1,178 @@
+"""Copies of files and folder trees from one provider to another.
+
+A `TreeTransfer` walks the source tree with a single walker, which creates each folder at the
+destination as soon as it shows up in its parent's listing and queues the files it finds.  A pool
+of workers takes files off the queue, so a fixed number of transfers stay in flight across the
+whole tree: a large file only occupies its worker, never a whole batch.  The queue is bounded, the
+walker waits for the workers instead of listing ahead of them without limit.  The first error
+cancels the walker and every worker, and is raised.
+
+Each file is piped through a `ReadAheadStream`, so reading the source and writing the destination
+overlap instead of taking turns.
+"""
+
+import asyncio
+import contextlib
+
+from aquavalet import settings
+from aquavalet.streams.base import BaseStream
+
+
+class ReadAheadStream(BaseStream):
+    """Reads ``stream`` in a task of its own, ahead of the consumer, into a bounded queue of
+    chunks of ``chunk_size`` bytes holding at most ``buffer_size`` bytes.  The source keeps reading
+    while the destination writes, and each side only waits on the other when the buffer is
+    empty or full.  An error reading the source is raised to the consumer once the chunks read
+    before it are consumed.  `close` stops reading and closes the source.
+    """
+
+    def __init__(self, stream, chunk_size, buffer_size):
+        super().__init__()
+        self.stream = stream
+        self.CHUNK_SIZE = chunk_size  # what `async for` consumers read at a time
+        self._queue = asyncio.Queue(maxsize=max(1, buffer_size // chunk_size))
+        self._pending = b""
+        self._filler = asyncio.ensure_future(self._fill())
+
+    @property
+    def size(self):
+        return self.stream.size
+
+    async def _fill(self):
+        try:
+            while True:
+                chunk = await self.stream.read(self.CHUNK_SIZE)
+                await self._queue.put(chunk)
+                if not chunk:
+                    return
+        except Exception as exc:
+            await self._queue.put(exc)
+
+    async def _read(self, size):
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = await self._read(self.CHUNK_SIZE)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+
+        if not self._pending:
+            if self.at_eof():
+                return b""
+            chunk = await self._queue.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                self.feed_eof()
+                return b""
+            self._pending = chunk
+
+        if len(self._pending) <= size:
+            chunk, self._pending = self._pending, b""
+        else:
+            chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    def close(self):
+        # The source is closed once the read in progress, if any, has stopped
+        self._filler.add_done_callback(lambda _: self._close_source())
+        self._filler.cancel()
+
+    def _close_source(self):
+        if hasattr(self.stream, "close"):
+            self.stream.close()
+
+
+async def copy_file(src_provider, item, dest_provider, dest_folder, conflict="warn"):
+    """Streams the file ``item`` into ``dest_folder`` under the same name, through a
+    `ReadAheadStream` unless ``settings.TRANSFER_BUFFER_SIZE`` is 0.
+    """
+    stream = await src_provider.download(item)
+    if settings.TRANSFER_BUFFER_SIZE:
+        stream = ReadAheadStream(
+            stream, settings.TRANSFER_CHUNK_SIZE, settings.TRANSFER_BUFFER_SIZE
+        )
+    try:
+        return await dest_provider.upload(
+            dest_folder, stream, new_name=item.name, conflict=conflict
+        )
+    finally:
+        # Also when the upload failed, the download would otherwise hold its file or connection
+        stream.close()
+
+
+class TreeTransfer:
+    """Copies a folder into another, possibly on another provider.  ``workers`` files are
+    transferred at once, by default as many as the limiter of the provider with an upstream lets
+    or ``settings.CONCURRENT_OPS`` when neither has one.
+    """
+
+    def __init__(self, src_provider, dest_provider, conflict="warn", workers=None):
+        self.src_provider = src_provider
+        self.dest_provider = dest_provider
+        self.conflict = conflict
+        self.limiter = src_provider.limiter or dest_provider.limiter
+        if workers is None:
+            workers = (
+                self.limiter.maximum
+                if self.limiter is not None
+                else settings.CONCURRENT_OPS
+            )
+        self.workers = workers
+        self.files = 0
+        self.folders = 0
+        self._queue = asyncio.Queue(maxsize=2 * workers)
+
+    async def run(self, item, dest_item):
+        """Copies the folder ``item`` into the folder ``dest_item``, returns the new folder."""
+        root = await self._create_folder(dest_item, item)
+        tasks = [asyncio.ensure_future(self._walk(item, root))]
+        tasks.extend(asyncio.ensure_future(self._work()) for _ in range(self.workers))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return root
+
+    async def _create_folder(self, dest_parent, item):
+        folder = await self.dest_provider.create_folder(dest_parent, item.name)
+        self.folders += 1
+        return folder
+
+    async def _walk(self, item, root):
+        folders = [(item, root)]
+        while folders:
+            folder, dest_folder = folders.pop()
+            async for child in self.src_provider.iter_children(folder):
+                if child.is_folder:
+                    folders.append(
+                        (child, await self._create_folder(dest_folder, child))
+                    )
+                else:
+                    await self._queue.put((child, dest_folder))
+
+        for _ in range(self.workers):
+            await self._queue.put(None)
+
+    async def _work(self):
+        slot = self.limiter or contextlib.nullcontext()
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            item, dest_folder = job
+            async with slot:
+                await copy_file(
+                    self.src_provider,
+                    item,
+                    self.dest_provider,
+                    dest_folder,
+                    self.conflict,
+                )
+            self.files += 1
@@ -1,15 +1,26 @@
+import json
+import random
 import asyncio
+import inspect
 import logging
 import functools
 
+try:
+    import orjson
+except ImportError:  # optional, only makes large responses faster to encode
+    orjson = None
+
+from aquavalet import settings
+
 logger = logging.getLogger(__name__)
 
 
-def make_provider(name: str, auth: dict):
+def make_provider(name: str, auth: dict, session=None):
     """Returns an instance of :class:`aquavalet.core.provider.BaseProvider`
 
     :param str name: The name of the provider to instantiate. (s3, box, etc)
     :param dict auth:
+    :param session: the pooled ``aiohttp.ClientSession`` the provider should use
     :param dict \*\*kwargs: currently there to absorb ``callback_url``
 
     :rtype: :class:`waterbutler.core.provider.BaseProvider`
@@ -18,13 +29,27 @@ def make_provider(name: str, auth: dict):
     from aquavalet.providers.osfstorage import OSFStorageProvider
 
     return {"filesystem": FileSystemProvider, "osfstorage": OSFStorageProvider}[name](
-        auth
+        auth, session=session
     )
 
 
+def json_dumps(obj) -> str:
+    """Encodes ``obj`` as compact JSON, with ``orjson`` when it is installed and
+    ``settings.FAST_JSON`` is set.  Anything ``orjson`` refuses, like integers over 64 bits, goes
+    through the standard library encoder.
+    """
+    if orjson is not None and settings.FAST_JSON:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
 def as_task(func):
+    """Makes calls to ``func`` run as tasks, scheduled whether or not they are awaited."""
     if not asyncio.iscoroutinefunction(func):
-        func = asyncio.coroutine(func)
+        func = _as_coroutine_function(func)
 
     @functools.wraps(func)
     def wrapped(*args, **kwargs):
@@ -33,18 +58,35 @@ def as_task(func):
     return wrapped
 
 
+def _as_coroutine_function(func):
+    @functools.wraps(func)
+    async def wrapped(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    return wrapped
+
+
 def async_retry(retries=5, backoff=1, exceptions=(Exception,)):
+    """Retries calls to ``func`` that raise one of ``exceptions`` up to ``retries`` times, after
+    an exponential backoff with full jitter starting at ``backoff`` seconds.
+    """
+
     def _async_retry(func):
+        func = _as_coroutine_function(func)
+
         @as_task
         @functools.wraps(func)
         async def wrapped(*args, __retries=0, **kwargs):
             try:
-                return await asyncio.coroutine(func)(*args, **kwargs)
+                return await func(*args, **kwargs)
             except exceptions as e:
                 if __retries < retries:
-                    wait_time = backoff * __retries
+                    wait_time = random.uniform(0, backoff * 2**__retries)
                     logger.warning(
-                        "Task {0} failed with {1!r}, {2} / {3} retries. Waiting {4} seconds before retrying".format(
+                        "Task {0} failed with {1!r}, {2} / {3} retries. Waiting {4:.3f} seconds before retrying".format(
                             func, e, __retries, retries, wait_time
                         )
                     )
@@ -0,0 +1,82 @@
+"""Times building metadata for every entry of a large directory, comparing the old
+``os.listdir`` + ``isdir`` + ``getmtime`` + ``getsize`` listing with the ``os.scandir`` based
+``FileSystemProvider.children``.
+
+    python benchmarks/fs_listing.py --entries 100000
+"""
+
+import os
+import sys
+import time
+import types
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet.providers.filesystem import FileSystemProvider  # noqa: E402
+from aquavalet.providers.filesystem.metadata import FileSystemMetadata  # noqa: E402
+
+
+def legacy_children(path):
+    """The listing as it was before scandir, three to four syscalls per entry."""
+    children = os.listdir(path)
+    children = [os.path.join(path, child) for child in children]
+    children = [child + "/" if os.path.isdir(child) else child for child in children]
+    return [
+        FileSystemMetadata(
+            path=child,
+            stat=types.SimpleNamespace(
+                st_mtime=os.path.getmtime(child), st_size=os.path.getsize(child)
+            ),
+        )
+        for child in children
+    ]
+
+
+def populate(folder, entries, folder_ratio):
+    folders = int(entries * folder_ratio)
+    for i in range(folders):
+        os.mkdir(os.path.join(folder, f"folder-{i}"))
+    for i in range(entries - folders):
+        with open(os.path.join(folder, f"file-{i}.txt"), "wb"):
+            pass
+
+
+def best_of(runs, func):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(args):
+    provider = FileSystemProvider({})
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        folder = tmp + "/"
+        populate(folder, args.entries, args.folder_ratio)
+
+        # Both listings run synchronously, as they would inside the I/O thread pool
+        legacy, _ = best_of(args.runs, lambda: legacy_children(folder))
+        scandir, children = best_of(args.runs, lambda: provider._children(folder))
+
+    assert len(children) == args.entries
+    print(f"entries:          {args.entries}")
+    print(
+        f"listdir + stats:  {legacy:.3f}s ({legacy / args.entries * 1e6:.1f}us/entry)"
+    )
+    print(
+        f"scandir:          {scandir:.3f}s ({scandir / args.entries * 1e6:.1f}us/entry)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--folder-ratio", type=float, default=0.1)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    main(parser.parse_args())
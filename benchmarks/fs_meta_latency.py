@@ -0,0 +1,132 @@
+"""Measures the latency of concurrent metadata requests (what ``?serve=meta`` does: validate the
+path, fetch metadata and serialize it) against the filesystem provider while a large upload is
+being written to the same disk.
+
+    python benchmarks/fs_meta_latency.py --upload-mb 2048 --rate 500
+
+Run with ``--inline`` to execute disk I/O directly on the event loop instead of the
+:mod:`aquavalet.aio` thread pool, for comparison.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet import aio  # noqa: E402
+from aquavalet.providers.filesystem import FileSystemProvider  # noqa: E402
+
+
+class FakeUploadStream:
+    """Yields ``total`` bytes in ``chunk_size`` pieces as fast as the consumer reads them."""
+
+    def __init__(self, total, chunk_size):
+        self.remaining = total
+        self.chunk = os.urandom(chunk_size)
+
+    @property
+    def size(self):
+        return self.remaining
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.remaining <= 0:
+            raise StopAsyncIteration()
+        chunk = self.chunk[: self.remaining]
+        self.remaining -= len(chunk)
+        await asyncio.sleep(0)
+        return chunk
+
+
+async def inline_run(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def meta_request(provider, path):
+    item = await provider.validate_item(path)
+    metadata = await provider.metadata(item)
+    return metadata.serialized()
+
+
+async def timed_request(provider, path, issued, latencies):
+    await meta_request(provider, path)
+    latencies.append(time.perf_counter() - issued)
+
+
+async def meta_load(provider, paths, rate, latencies, stop):
+    """Issues metadata requests at a fixed ``rate`` per second regardless of how fast earlier ones
+    complete, so time spent waiting for a blocked event loop counts towards latency.
+    """
+    pending = []
+    i = 0
+    while not stop.is_set():
+        issued = time.perf_counter()
+        pending.append(
+            asyncio.ensure_future(
+                timed_request(provider, paths[i % len(paths)], issued, latencies)
+            )
+        )
+        i += 1
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*pending)
+
+
+def percentile(data, pct):
+    data = sorted(data)
+    return data[min(len(data) - 1, int(len(data) * pct / 100))]
+
+
+async def main(args):
+    if args.inline:
+        aio.run = inline_run
+
+    provider = FileSystemProvider({})
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        folder = tmp.rstrip("/") + "/"
+        paths = []
+        for i in range(100):
+            path = os.path.join(folder, f"file-{i}.txt")
+            with open(path, "wb") as fp:
+                fp.write(b"x" * 1024)
+            paths.append(path)
+
+        item = await provider.validate_item(folder)
+        latencies = []
+        stop = asyncio.Event()
+        load = asyncio.ensure_future(
+            meta_load(provider, paths, args.rate, latencies, stop)
+        )
+
+        start = time.perf_counter()
+        await provider.upload(
+            item,
+            FakeUploadStream(args.upload_mb * 1024 * 1024, args.chunk_size),
+            "upload.bin",
+        )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await load
+
+    print(f"mode:          {'inline' if args.inline else 'thread pool'}")
+    print(f"upload:        {args.upload_mb}MB in {elapsed:.2f}s")
+    print(f"meta requests: {len(latencies)}")
+    print(f"p50:           {statistics.median(latencies) * 1000:.2f}ms")
+    print(f"p99:           {percentile(latencies, 99) * 1000:.2f}ms")
+    print(f"max:           {max(latencies) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--upload-mb", type=int, default=512)
+    parser.add_argument("--chunk-size", type=int, default=1024 * 1024)
+    parser.add_argument("--rate", type=int, default=500, help="meta requests/second")
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    parser.add_argument("--inline", action="store_true")
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""Measures zip download throughput with 1 to N pre-forked workers, to check that a CPU bound
+workload scales with cores.  Every request zips the same folder of compressible files with
+``FileSystemProvider.zip``.
+
+    python benchmarks/prefork_zip.py --workers 1 2 4 8 --duration 10
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet.server.prefork import Arbiter  # noqa: E402
+from aquavalet.providers.filesystem import FileSystemProvider  # noqa: E402
+
+
+def zip_app(folder):
+    provider = FileSystemProvider({})
+
+    async def download_as_zip(request):
+        item = await provider.validate_item(folder)
+        response = web.StreamResponse(headers={"Content-Type": "application/zip"})
+        await response.prepare(request)
+        async for chunk in await provider.zip(item):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/zip", download_as_zip)
+    return app
+
+
+def populate(folder, files, size):
+    line = b"aquavalet benchmark line of fairly compressible text\n"
+    for i in range(files):
+        with open(os.path.join(folder, f"file-{i}.txt"), "wb") as fp:
+            fp.write(line * (size // len(line)))
+
+
+async def load(port, concurrency, duration):
+    done = 0
+    deadline = time.monotonic() + duration
+
+    async def client(session):
+        nonlocal done
+        while time.monotonic() < deadline:
+            async with session.get(f"http://127.0.0.1:{port}/zip") as resp:
+                await resp.read()
+                done += 1
+
+    # A connection per request so the kernel spreads the load over the workers
+    connector = aiohttp.TCPConnector(force_close=True)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    return done / duration
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        folder = tmp + "/"
+        populate(folder, args.files, args.file_kb * 1024)
+
+        baseline = None
+        for workers in args.workers:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+
+            arbiter = Arbiter(
+                workers=workers,
+                address="127.0.0.1",
+                port=port,
+                app_factory=lambda: zip_app(folder),
+            )
+            process = multiprocessing.Process(target=arbiter.run)
+            process.start()
+            time.sleep(1)
+            try:
+                rate = asyncio.run(load(port, args.concurrency, args.duration))
+            finally:
+                process.terminate()
+                process.join()
+
+            baseline = baseline or rate
+            print(
+                f"workers: {workers:3}  {rate:8.1f} zips/s  "
+                f"({rate / baseline:.2f}x, ideal {workers / args.workers[0]:.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""Times serializing a large listing to a JSON API response body, comparing the link building,
+etag hashing and encoding as they were with the current ``json_api_serialized`` and
+``utils.json_dumps``.
+
+    python benchmarks/serialize.py --items 100000
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import argparse
+import mimetypes
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet import settings, utils  # noqa: E402
+from aquavalet.providers.filesystem.metadata import FileSystemMetadata  # noqa: E402
+
+
+def legacy_serialized(item):
+    """``json_api_serialized`` as it was: five `construct_path` calls and a hash per item."""
+    _, ext = os.path.splitext(item.name)
+    attributes = {
+        "kind": item.kind,
+        "name": item.name,
+        "path": item.id,
+        "size": item.size,
+        "modified": item.modified,
+        "mimetype": mimetypes.types_map.get(ext),
+        "provider": item.provider,
+        "etag": hashlib.sha256(
+            "{}::{}".format(item.provider, item.etag).encode("utf-8")
+        ).hexdigest(),
+    }
+    segments = [quote(seg) for seg in item.attributes["path"].split("/") if seg]
+    links = {
+        "info": item.construct_path(segments, "meta"),
+        "delete": item.construct_path(segments, "delete"),
+    }
+    if item.kind == "folder":
+        links["children"] = item.construct_path(segments, "children")
+        links["upload"] = item.construct_path(segments, "upload")
+        links["download_as_zip"] = item.construct_path(segments, "download_as_zip")
+    else:
+        links["download"] = item.construct_path(segments, "download")
+    return {"id": item.id, "type": "files", "attributes": attributes, "links": links}
+
+
+def make_items(count):
+    stat = types.SimpleNamespace(st_mtime=1500000000, st_size=1024)
+    return [
+        FileSystemMetadata(
+            path=f"/data/project files/folder {i // 1000}/"
+            + (f"sub folder {i}/" if i % 10 == 0 else f"file {i}.txt"),
+            stat=stat,
+        )
+        for i in range(count)
+    ]
+
+
+def best_of(runs, func):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(args):
+    items = make_items(args.items)
+
+    def legacy():
+        [
+            hashlib.sha256(f"{item.provider}::{item.etag}".encode("utf-8")).hexdigest()
+            for item in items
+        ]
+        return json.dumps({"data": [legacy_serialized(item) for item in items]})
+
+    def current():
+        # The listing is usually serialized twice, for the weak ETag and for the body
+        [item.etag_hash for item in items]
+        return utils.json_dumps(
+            {"data": [item.json_api_serialized() for item in items]}
+        )
+
+    legacy_time, legacy_body = best_of(args.runs, legacy)
+    settings.FAST_JSON = False
+    stdlib_time, _ = best_of(args.runs, current)
+    settings.FAST_JSON = True
+    current_time, current_body = best_of(args.runs, current)
+    assert json.loads(legacy_body) == json.loads(current_body)
+
+    print(f"items:               {args.items}")
+    for label, seconds in (
+        ("legacy:", legacy_time),
+        ("prefixes + json:", stdlib_time),
+        ("prefixes + orjson:", current_time),
+    ):
+        print(
+            f"{label:20} {seconds:.3f}s ({seconds / args.items * 1e6:.1f}us/item, "
+            f"{legacy_time / seconds:.2f}x)"
+        )
+    if utils.orjson is None:
+        print("orjson is not installed, both runs used the standard library encoder")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
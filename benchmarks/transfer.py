@@ -0,0 +1,197 @@
+"""Times copies between the filesystem and osfstorage providers against a local mock of the OSF
+files API, comparing reading and writing in lock-step (``TRANSFER_BUFFER_SIZE = 0``) with the
+read-ahead pipeline of ``aquavalet.transfer``.  Copies from osfstorage to itself, with latency on
+both sides, show the most the overlap can save.
+
+    python benchmarks/transfer.py --size-mb 32 --stall-ms 1000 --stall-mb 8 --buffer-mb 16
+
+The mock server runs in a separate process and injects latency: ``--latency-ms`` before each
+response, ``--chunk-ms`` for every ``--chunk-kb`` sent or received as a slow link would, and a
+``--stall-ms`` pause every ``--stall-mb``, as a storage backend flushing or a congested link.
+Socket buffers on both ends are capped to ``--socket-kb``, as the window of a real link caps the
+data in flight; loopback's default buffers of several megabytes would hide the lock-step.
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet import settings, transfer  # noqa: E402
+from aquavalet.providers.filesystem import FileSystemProvider  # noqa: E402
+from aquavalet.providers.osfstorage import OSFStorageProvider  # noqa: E402
+from aquavalet.providers.osfstorage.metadata import OsfMetadata  # noqa: E402
+
+RESOURCE = "guid0"
+
+
+def file_data(name, size):
+    return {
+        "attributes": {
+            "name": name,
+            "kind": "file",
+            "path": f"/{name}",
+            "materialized": f"/{name}",
+            "size": size,
+            "etag": name,
+        }
+    }
+
+
+def make_app(args):
+    size = args.size_mb * 1024 * 1024
+    chunk_size = args.chunk_kb * 1024
+    stall_every = args.stall_mb * 1024 * 1024
+    chunk = os.urandom(chunk_size)
+
+    async def transmit(position, length):
+        """Waits as long as moving ``length`` bytes from ``position`` over the link takes.  Uploads
+        stall half way between the stalls of downloads, the two sides are independent.
+        """
+        delay = args.chunk_ms * length / chunk_size
+        if stall_every and (position + length) // stall_every > position // stall_every:
+            delay += args.stall_ms
+        await asyncio.sleep(delay / 1000)
+
+    async def download(request):
+        await asyncio.sleep(args.latency_ms / 1000)
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        await response.prepare(request)
+        for position in range(0, size, chunk_size):
+            await transmit(position, chunk_size)
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    async def upload(request):
+        await asyncio.sleep(args.latency_ms / 1000)
+        received = 0
+        while True:
+            data = await request.content.read(chunk_size)
+            if not data:
+                break
+            await transmit(received + stall_every // 2, len(data))
+            received += len(data)
+        return web.json_response(
+            {"data": file_data(request.query["name"], received)}, status=201
+        )
+
+    app = web.Application(client_max_size=0)
+    path = f"/v1/resources/{RESOURCE}/providers/osfstorage/{{id:.*}}"
+    app.router.add_get(path, download)
+    app.router.add_put(path, upload)
+    return app
+
+
+def small_buffers(sock, args):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, args.socket_kb * 1024)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.socket_kb * 1024)
+    return sock
+
+
+def serve(args, ports):
+    async def run():
+        runner = web.AppRunner(make_app(args), access_log=None)
+        await runner.setup()
+        sock = small_buffers(socket.socket(), args)
+        sock.bind(("127.0.0.1", 0))
+        site = web.SockSite(runner, sock)
+        await site.start()
+        ports.put(sock.getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def osf_provider(port, session):
+    provider = OSFStorageProvider({}, session=session)
+    provider.BASE_URL = f"http://127.0.0.1:{port}/v1/resources/"
+    provider.resource = RESOURCE
+    provider.internal_provider = "osfstorage"
+    return provider
+
+
+async def measure(port, folder, direction, buffered, args):
+    settings.TRANSFER_BUFFER_SIZE = args.buffer_mb * 1024 * 1024 if buffered else 0
+    size = args.size_mb * 1024 * 1024
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            socket_factory=lambda info: small_buffers(socket.socket(*info[:3]), args)
+        )
+    )
+    fs = FileSystemProvider({})
+    osf = osf_provider(port, session)
+    osf_root = OsfMetadata.root("osfstorage", RESOURCE)
+    fs_root = await fs.validate_item(folder)
+
+    if direction == "filesystem -> osfstorage":
+        for i in range(args.files):
+            with open(os.path.join(folder, f"source-{i}.bin"), "wb") as source:
+                source.write(os.urandom(size))
+        jobs = [
+            (fs, await fs.validate_item(os.path.join(folder, f"source-{i}.bin")), osf)
+            for i in range(args.files)
+        ]
+        dest_folder = osf_root
+    else:
+        dest = fs if direction == "osfstorage -> filesystem" else osf
+        jobs = [
+            (osf, OsfMetadata(file_data(f"f{i}", size), "osfstorage", RESOURCE), dest)
+            for i in range(args.files)
+        ]
+        dest_folder = fs_root if dest is fs else osf_root
+
+    started = time.perf_counter()
+    for src, item, dest in jobs:
+        await transfer.copy_file(src, item, dest, dest_folder, conflict="replace")
+    elapsed = time.perf_counter() - started
+
+    await session.close()
+    print(
+        f"{direction:26} {'read-ahead' if buffered else 'lock-step':10} "
+        f"{size * args.files / elapsed / 1024**2:8.1f} MB/s"
+    )
+
+
+def main(args):
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args, ports), daemon=True)
+    server.start()
+    port = ports.get()
+    try:
+        for direction in (
+            "filesystem -> osfstorage",
+            "osfstorage -> filesystem",
+            "osfstorage -> osfstorage",
+        ):
+            for buffered in (False, True):
+                with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                    asyncio.run(measure(port, tmp + "/", direction, buffered, args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument(
+        "--buffer-mb", type=int, default=settings.TRANSFER_BUFFER_SIZE // 1024**2
+    )
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    parser.add_argument("--chunk-ms", type=float, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--stall-ms", type=float, default=0)
+    parser.add_argument("--stall-mb", type=int, default=4)
+    parser.add_argument("--socket-kb", type=int, default=64)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    main(parser.parse_args())
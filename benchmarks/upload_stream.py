@@ -0,0 +1,128 @@
+"""Measures upload throughput and server CPU per GB into the filesystem provider, comparing the
+old socketpair relay (every chunk written into a unix socket and read back out of its peer) with
+streaming the request payload directly through ``RequestStreamReader``.
+
+    python benchmarks/upload_stream.py --size-mb 2048
+
+The client runs in a separate process so the CPU time reported is the server's alone.
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aquavalet.providers.filesystem import FileSystemProvider  # noqa: E402
+from aquavalet.streams.http import RequestStreamReader  # noqa: E402
+
+
+async def relay_stream(request):
+    """The upload path as it was, a socketpair fed from the request body."""
+    rsock, wsock = socket.socketpair()
+    # Both pairs are kept, a collected StreamWriter closes its transport
+    reader, rwriter = await asyncio.open_unix_connection(sock=rsock)
+    wreader, writer = await asyncio.open_unix_connection(sock=wsock)
+
+    async def feed():
+        async for chunk in request.content.iter_any():
+            writer.write(chunk)
+            await writer.drain()
+        writer.write_eof()
+
+    return (
+        RequestStreamReader(request, reader),
+        asyncio.ensure_future(feed()),
+        (rwriter, wreader, writer),
+    )
+
+
+def make_app(folder, relay):
+    provider = FileSystemProvider({})
+
+    async def upload(request):
+        item = await provider.validate_item(folder)
+        name = request.query["name"]
+        if relay:
+            stream, feeder, (rwriter, wreader, writer) = await relay_stream(request)
+            await provider.upload(item, stream, name)
+            await feeder
+            writer.close()
+            rwriter.close()
+        else:
+            await provider.upload(item, RequestStreamReader(request), name)
+        return web.Response(status=201)
+
+    app = web.Application(client_max_size=0)
+    app.router.add_put("/upload", upload)
+    return app
+
+
+def client(port, size, chunk_size, uploads):
+    async def body():
+        chunk = os.urandom(chunk_size)
+        for _ in range(size // chunk_size):
+            yield chunk
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            for i in range(uploads):
+                async with session.put(
+                    f"http://127.0.0.1:{port}/upload",
+                    params={"name": f"upload-{i}.bin"},
+                    data=body(),
+                    headers={"Content-Length": str(size // chunk_size * chunk_size)},
+                ) as resp:
+                    assert resp.status == 201, resp.status
+
+    asyncio.run(run())
+
+
+async def measure(folder, relay, args):
+    runner = web.AppRunner(make_app(folder, relay))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    size = args.size_mb * 1024 * 1024
+    process = multiprocessing.Process(
+        target=client, args=(port, size, args.chunk_kb * 1024, args.uploads)
+    )
+    wall, cpu = time.perf_counter(), time.process_time()
+    process.start()
+    while process.is_alive():
+        await asyncio.sleep(0.05)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    await runner.cleanup()
+
+    assert process.exitcode == 0
+    gigabytes = size * args.uploads / 1024**3
+    print(
+        f"{'socketpair relay' if relay else 'direct':17} "
+        f"{size * args.uploads / wall / 1024**2:8.1f} MB/s  "
+        f"{cpu / gigabytes:6.2f} CPU s/GB"
+    )
+
+
+def main(args):
+    for relay in (True, False):
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            asyncio.run(measure(tmp + "/", relay, args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    parser.add_argument("--uploads", type=int, default=2)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    main(parser.parse_args())
@@ -38,3 +38,14 @@ def test(ctx):
 @task
 def server(ctx):
     ctx.run("adev runserver aquavalet")
+
+
+@task
+def serve(ctx, workers=None):
+    """
+    Run the production server with pre-forked workers, see aquavalet/server/prefork.py
+    """
+    cmd = "python -m aquavalet.server.prefork"
+    if workers:
+        cmd += " --workers {}".format(workers)
+    ctx.run(cmd, pty=True)
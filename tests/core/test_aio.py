@@ -0,0 +1,28 @@
+import threading
+
+import pytest
+
+from aquavalet import aio
+
+
+class TestRun:
+    @pytest.mark.asyncio
+    async def test_runs_in_pool(self):
+        thread_name = await aio.run(lambda: threading.current_thread().name)
+        assert thread_name.startswith("aquavalet-io")
+
+    @pytest.mark.asyncio
+    async def test_args_and_kwargs(self):
+        assert await aio.run(int, "ff", base=16) == 255
+
+    @pytest.mark.asyncio
+    async def test_raises(self):
+        with pytest.raises(FileNotFoundError):
+            await aio.run(open, "/does/not/exist")
+
+    @pytest.mark.asyncio
+    async def test_shutdown(self):
+        executor = aio.get_executor()
+        aio.shutdown()
+        assert aio.get_executor() is not executor
+        assert await aio.run(sum, [1, 2]) == 3
@@ -0,0 +1,72 @@
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from aquavalet import settings
+from aquavalet.app import app
+from aquavalet.server import batch
+from aquavalet import exceptions
+from aquavalet.providers.filesystem.provider import FileSystemProvider
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "folder").mkdir()
+    (tmp_path / "folder" / "a.txt").write_bytes(b"a" * 10)
+    (tmp_path / "b.txt").write_bytes(b"b" * 20)
+    return tmp_path
+
+
+class TestBatch:
+    @pytest.mark.asyncio
+    async def test_resolve(self, files):
+        paths = [f"{files}/b.txt", f"{files}/missing.txt", f"{files}/folder/"]
+
+        results = await batch.resolve("filesystem", paths)
+
+        assert [result["path"] for result in results] == paths
+        assert results[0]["data"]["attributes"]["size"] == 20
+        assert results[0]["data"]["attributes"]["kind"] == "file"
+        assert results[1]["error"]["error"] == "NotFoundError"
+        assert results[1]["error"]["status"] == 404
+        assert results[2]["data"]["attributes"]["kind"] == "folder"
+
+    @pytest.mark.asyncio
+    async def test_resolve_provider_error(self, files, monkeypatch):
+        async def metadata(self, item, version=None):
+            raise exceptions.MetadataError("Upstream said no")
+
+        monkeypatch.setattr(FileSystemProvider, "metadata", metadata)
+
+        results = await batch.resolve("filesystem", [f"{files}/b.txt"])
+
+        assert results[0]["error"] == {
+            "error": "MetadataError",
+            "message": "Upstream said no",
+            "status": 500,
+        }
+
+    @pytest.mark.asyncio
+    async def test_resolve_bounded(self, files, monkeypatch):
+        monkeypatch.setattr(settings, "BATCH_MAX_PATHS", 2)
+
+        with pytest.raises(exceptions.InvalidParameters):
+            await batch.resolve("filesystem", ["/a", "/b", "/c"])
+
+        with pytest.raises(exceptions.InvalidParameters):
+            await batch.resolve("filesystem", "/a")
+
+    @pytest.mark.asyncio
+    async def test_batch_route(self, files):
+        async with TestClient(TestServer(app())) as client:
+            resp = await client.post(
+                "/batch/filesystem",
+                json={"paths": [f"{files}/folder/a.txt", f"{files}/nope/"]},
+            )
+            assert resp.status == 200
+            data = (await resp.json())["data"]
+
+            assert data[0]["data"]["attributes"]["name"] == "a.txt"
+            assert data[1]["error"]["status"] == 404
+
+            resp = await client.post("/batch/filesystem", json={"no": "paths"})
+            assert resp.status == 400
@@ -0,0 +1,131 @@
+import time
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import concurrency, metrics, session, settings
+
+
+class TestLimiter:
+    @pytest.mark.asyncio
+    async def test_limits_and_serves_in_order(self):
+        limiter = concurrency.Limiter(2, maximum=2)
+        served = []
+        release = asyncio.Event()
+
+        async def operation(i):
+            async with limiter:
+                served.append(i)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(operation(i)) for i in range(5)]
+        await asyncio.sleep(0)
+        assert served == [0, 1]
+        assert limiter.in_flight == 2
+        assert limiter.waiting == 3
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert served == [0, 1, 2, 3, 4]
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        limiter = concurrency.Limiter(1)
+        await limiter.acquire()
+
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        limiter.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter.waiting == 0
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_grows_while_busy_and_latency_is_stable(self):
+        limiter = concurrency.Limiter(4, maximum=16, name="test-grow")
+        waiters = [asyncio.ensure_future(limiter.acquire()) for _ in range(20)]
+        await asyncio.sleep(0)
+        assert limiter.in_flight == 4
+
+        for _ in range(20):
+            limiter.observe(time.monotonic())
+        assert 7 <= limiter.limit < 8
+        assert limiter.in_flight == 7
+        assert metrics.concurrency_limit.values[("test-grow",)] == 7
+
+        # A limiter with slots to spare doesn't grow
+        for waiter in waiters:
+            waiter.cancel()
+        limiter.release()
+        limit = limiter.limit
+        limiter.observe(time.monotonic())
+        assert limiter.limit == limit
+
+    @pytest.mark.asyncio
+    async def test_holds_when_latency_rises(self):
+        limiter = concurrency.Limiter(4, maximum=16)
+        for _ in range(4):
+            await limiter.acquire()
+
+        limiter.observe(time.monotonic() - 0.01)
+        limit = limiter.limit
+        limiter.observe(time.monotonic() - 0.05)
+        assert limiter.limit == limit
+
+    @pytest.mark.asyncio
+    async def test_backs_off_once_per_burst_of_failures(self):
+        limiter = concurrency.Limiter(16, maximum=16)
+        sent = time.monotonic()
+
+        limiter.observe(sent, overloaded=True)
+        limiter.observe(sent, overloaded=True)
+        assert limiter.limit == 8
+
+        limiter.observe(time.monotonic(), overloaded=True)
+        assert limiter.limit == 4
+
+        for _ in range(5):
+            limiter.observe(time.monotonic(), overloaded=True)
+        assert limiter.limit == 1
+
+    @pytest.mark.asyncio
+    async def test_limiter_per_name(self):
+        assert concurrency.limiter("a") is concurrency.limiter("a")
+        assert concurrency.limiter("a") is not concurrency.limiter("b")
+        assert concurrency.limiter("a").limit == settings.CONCURRENT_OPS
+
+
+class TestTraceConfig:
+    @pytest.mark.asyncio
+    async def test_reports_responses_to_the_limiter(self):
+        statuses = iter([200, 503, 200])
+
+        async def handler(request):
+            return web.Response(status=next(statuses))
+
+        app = web.Application()
+        app.router.add_get("/", handler)
+        limiter = concurrency.Limiter(8, maximum=8)
+        async with TestServer(app) as server:
+            client = session.create_session()
+            try:
+                async with client.get(server.make_url("/")) as resp:
+                    assert resp.status == 200
+                assert limiter.baseline is None
+
+                for status in (503, 200):
+                    async with client.get(
+                        server.make_url("/"), trace_request_ctx=limiter
+                    ) as resp:
+                        assert resp.status == status
+            finally:
+                await client.close()
+
+        assert limiter.limit == 4
+        assert limiter.baseline is not None
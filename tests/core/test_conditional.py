@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from aquavalet import settings, exceptions
+from aquavalet.server import base
+from aquavalet.providers.filesystem import FileSystemProvider
+from aquavalet.providers.filesystem.metadata import FileSystemMetadata
+
+
+@pytest.fixture
+def item(tmp_path):
+    path = tmp_path / "test.txt"
+    path.write_bytes(b"test data")
+    os.utime(path, (1500000000, 1500000000))
+    return FileSystemMetadata(path=str(path))
+
+
+class TestValidators:
+    def test_strong_etag(self, item):
+        assert base.strong_etag(item) == f'"{item.etag_hash}"'
+        assert item.serialized()["etag"] == item.etag_hash
+
+    def test_weak_etag(self, tmp_path, item):
+        other = tmp_path / "other.txt"
+        other.write_bytes(b"other")
+        other = FileSystemMetadata(path=str(other))
+
+        etag = base.weak_etag([item, other])
+        assert etag.startswith('W/"')
+        assert etag == base.weak_etag([other, item])
+        assert etag != base.weak_etag([item])
+
+    def test_http_date(self, item):
+        assert base.http_date(item.modified) == "Fri, 14 Jul 2017 02:40:00 GMT"
+        assert base.http_date("") is None
+        assert base.http_date(None) is None
+
+
+class TestIsNotModified:
+    @pytest.mark.parametrize(
+        "if_none_match,expected",
+        [
+            ('"abc"', True),
+            ('W/"abc"', True),
+            ('"xyz", "abc"', True),
+            ("*", True),
+            ('"xyz"', False),
+        ],
+    )
+    def test_if_none_match(self, if_none_match, expected):
+        headers = {"If-None-Match": if_none_match}
+        assert base.is_not_modified(headers, '"abc"') is expected
+
+    def test_if_none_match_takes_precedence(self):
+        headers = {
+            "If-None-Match": '"xyz"',
+            "If-Modified-Since": "Fri, 14 Jul 2017 02:40:00 GMT",
+        }
+        last_modified = "Fri, 14 Jul 2017 02:40:00 GMT"
+        assert not base.is_not_modified(headers, '"abc"', last_modified)
+
+    @pytest.mark.parametrize(
+        "since,expected",
+        [
+            ("Fri, 14 Jul 2017 02:40:00 GMT", True),
+            ("Sat, 15 Jul 2017 00:00:00 GMT", True),
+            ("Thu, 13 Jul 2017 00:00:00 GMT", False),
+            ("not a date", False),
+        ],
+    )
+    def test_if_modified_since(self, since, expected):
+        headers = {"If-Modified-Since": since}
+        last_modified = "Fri, 14 Jul 2017 02:40:00 GMT"
+        assert base.is_not_modified(headers, '"abc"', last_modified) is expected
+
+    def test_no_validators(self):
+        assert not base.is_not_modified({}, '"abc"')
+        assert not base.is_not_modified({"If-None-Match": '"abc"'}, None)
+
+
+class TestParseRequestRanges:
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            ("bytes=0-1023,524288-525311", [(0, 1023), (524288, 525311)]),
+            ("bytes=500-599, 0-99", [(0, 99), (500, 599)]),
+            ("bytes=0-9,5-20,21-30", [(0, 30)]),
+            ("bytes=0-9,-100", [(0, 9), (1048476, 1048575)]),
+            ("bytes=0-9,2000000-", [(0, 9)]),
+            ("bytes=2000000-,3000000-3000009", []),
+            ("bytes=0-9,a-b", None),
+            ("items=0-9,10-19", None),
+        ],
+    )
+    def test_parse(self, header, expected):
+        assert base.parse_request_ranges(header, 1024 * 1024) == expected
+
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            ("bytes=-500", [(1048076, 1048575)]),
+            ("bytes=-2000000", [(0, 1048575)]),
+            ("bytes=1048000-", [(1048000, 1048575)]),
+        ],
+    )
+    def test_single_range(self, header, expected):
+        assert base.parse_request_ranges(header, 1024 * 1024) == expected
+
+    @pytest.mark.asyncio
+    async def test_single_suffix_range_download(self, tmp_path):
+        data = os.urandom(2000)
+        (tmp_path / "tail.bin").write_bytes(data)
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/tail.bin")
+
+        (range,) = base.parse_request_ranges("bytes=-500", item.size)
+        stream = await provider.download(item, range=range)
+        try:
+            assert stream.partial
+            assert stream.content_range == "bytes 1500-1999/2000"
+            assert bytes(await stream.read()) == data[-500:]
+        finally:
+            stream.close()
+
+    def test_too_many_ranges(self, monkeypatch):
+        monkeypatch.setattr(settings, "MAX_RANGES", 2)
+        assert base.parse_request_ranges("bytes=0-0,2-2,4-4", 10) is None
+
+
+class TestCursor:
+    @pytest.mark.parametrize("name", ["a.txt", "dossier é/", "?=&"])
+    def test_round_trip(self, name):
+        cursor = base.encode_cursor(name)
+        assert "=" not in cursor
+        assert base.decode_cursor(cursor) == name
+
+    def test_invalid(self):
+        with pytest.raises(exceptions.InvalidParameters):
+            base.decode_cursor("%%%")
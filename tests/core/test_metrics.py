@@ -0,0 +1,104 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from aquavalet import metrics, session
+from aquavalet.app import app
+
+
+class TestMetrics:
+    def test_counter(self):
+        counter = metrics.Counter("test_total", "Test.", ("provider", "action"))
+        counter.inc("filesystem", "meta")
+        counter.inc("filesystem", "meta", amount=2)
+        counter.inc("osfstorage", "download")
+
+        assert counter.render() == [
+            "# HELP test_total Test.",
+            "# TYPE test_total counter",
+            'test_total{provider="filesystem",action="meta"} 3',
+            'test_total{provider="osfstorage",action="download"} 1',
+        ]
+
+    def test_gauge_in_flight(self):
+        gauge = metrics.streams_in_flight
+        with metrics.stream_in_flight("filesystem", "test"):
+            assert gauge.values[("filesystem", "test")] == 1
+        assert gauge.values[("filesystem", "test")] == 0
+
+    def test_histogram(self):
+        histogram = metrics.Histogram(
+            "test_seconds", "Test.", ("action",), buckets=(0.1, 1)
+        )
+        histogram.observe(0.05, "meta")
+        histogram.observe(0.1, "meta")
+        histogram.observe(5, "meta")
+
+        assert histogram.render()[2:] == [
+            'test_seconds_bucket{action="meta",le="0.1"} 2',
+            'test_seconds_bucket{action="meta",le="1"} 2',
+            'test_seconds_bucket{action="meta",le="+Inf"} 3',
+            'test_seconds_sum{action="meta"} 5.15',
+            'test_seconds_count{action="meta"} 3',
+        ]
+
+    def test_label_escaping(self):
+        counter = metrics.Counter("test_total", "Test.", ("name",))
+        counter.inc('a "quoted"\\name')
+        assert counter.render()[-1] == 'test_total{name="a \\"quoted\\"\\\\name"} 1'
+
+    @pytest.mark.asyncio
+    async def test_metrics_route(self, tmp_path):
+        (tmp_path / "a.txt").write_bytes(b"a")
+        key = ("filesystem", "batch", 200)
+        before = metrics.requests.values.get(key, 0)
+
+        async with TestClient(TestServer(app())) as client:
+            resp = await client.post(
+                "/batch/filesystem", json={"paths": [f"{tmp_path}/a.txt"]}
+            )
+            assert resp.status == 200
+            resp = await client.post("/batch/filesystem", json={"no": "paths"})
+            assert resp.status == 400
+
+            resp = await client.get("/metrics")
+            assert resp.status == 200
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            text = await resp.text()
+
+        assert metrics.requests.values[key] == before + 1
+        assert metrics.requests.values[("filesystem", "batch", 400)] >= 1
+        assert (
+            'aquavalet_requests_total{provider="filesystem",action="batch",status="200"}'
+            in text
+        )
+        assert (
+            'aquavalet_request_duration_seconds_count{provider="filesystem",action="batch"}'
+            in text
+        )
+        assert (
+            'aquavalet_downloaded_bytes_total{provider="filesystem",action="batch"}'
+            in text
+        )
+        assert (
+            'aquavalet_uploaded_bytes_total{provider="filesystem",action="batch"}'
+            in text
+        )
+
+    @pytest.mark.asyncio
+    async def test_upstream_latency(self):
+        async def ok(request):
+            return web.Response(text="ok")
+
+        upstream = web.Application()
+        upstream.router.add_get("/", ok)
+        async with TestServer(upstream) as server:
+            async with session.get_session().get(str(server.make_url("/"))) as resp:
+                await resp.read()
+        await session.close_session()
+
+        assert (
+            "127.0.0.1",
+            "GET",
+            200,
+        ) in metrics.upstream_duration.values
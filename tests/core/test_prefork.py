@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER = """
+import os
+import sys
+from aiohttp import web
+from aquavalet.server.prefork import Arbiter
+
+async def pid(request):
+    return web.Response(text=str(os.getpid()))
+
+def app():
+    app = web.Application()
+    app.router.add_get("/pid", pid)
+    return app
+
+Arbiter(workers=int(sys.argv[1]), address="127.0.0.1", port=int(sys.argv[2]), app_factory=app).run()
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_pid(port):
+    # A new connection per request, so the kernel picks a worker each time
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/pid", timeout=5) as resp:
+        return int(resp.read())
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if condition():
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+@pytest.fixture
+def server():
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER, "3", str(port)],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    process.port = port
+    wait_for(lambda: get_pid(port))
+    yield process
+    if process.poll() is None:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def worker_pids(port, requests=60):
+    return {get_pid(port) for _ in range(requests)}
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="needs SO_REUSEPORT")
+class TestPrefork:
+    def test_workers_share_port(self, server):
+        pids = worker_pids(server.port)
+        assert len(pids) > 1
+        assert server.pid not in pids
+
+    def test_dead_worker_replaced(self, server):
+        pids = worker_pids(server.port)
+        victim = pids.pop()
+        os.kill(victim, signal.SIGKILL)
+
+        wait_for(lambda: victim not in worker_pids(server.port, 20))
+        wait_for(lambda: len(worker_pids(server.port)) == 3)
+
+    def test_reload_replaces_every_worker(self, server):
+        before = worker_pids(server.port)
+        server.send_signal(signal.SIGHUP)
+
+        wait_for(lambda: not before & worker_pids(server.port, 20))
+        assert server.poll() is None
+
+    def test_stop(self, server):
+        server.terminate()
+        assert server.wait(timeout=30) == 0
+        with pytest.raises(OSError):
+            get_pid(server.port)
@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import metrics, ratelimit, session, settings
+
+
+class TestTokenBucket:
+    @pytest.mark.asyncio
+    async def test_burst_then_rate(self):
+        bucket = ratelimit.TokenBucket(rate=50, burst=5, name="test-rate")
+
+        started = time.monotonic()
+        for _ in range(5):
+            assert await bucket.acquire() == 0
+        assert time.monotonic() - started < 0.02
+
+        for _ in range(5):
+            await bucket.acquire()
+        # 5 more tokens at 50 per second
+        assert time.monotonic() - started == pytest.approx(0.1, abs=0.04)
+        assert metrics.ratelimit_wait.values[("test-rate",)] > 0
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_served_in_order(self):
+        bucket = ratelimit.TokenBucket(rate=100, burst=1, name="test-order")
+        served = []
+
+        async def request(i):
+            await bucket.acquire()
+            served.append(i)
+
+        tasks = []
+        for i in range(5):
+            tasks.append(asyncio.ensure_future(request(i)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert bucket.waiting == 4
+        assert metrics.ratelimit_waiters.values[("test-order",)] == 4
+
+        await asyncio.gather(*tasks)
+        assert served == [0, 1, 2, 3, 4]
+        assert bucket.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_pause(self):
+        bucket = ratelimit.TokenBucket(rate=1000, burst=10)
+        bucket.pause(0.05)
+
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started >= 0.045
+
+
+class TestTraceConfig:
+    @pytest.mark.asyncio
+    async def test_limits_per_host_and_backs_off_on_429(self, monkeypatch):
+        monkeypatch.setattr(settings, "RATE_LIMITS", {"127.0.0.1": (1000, 100)})
+        statuses = iter([429, 200])
+
+        async def handler(request):
+            return web.Response(status=next(statuses), headers={"Retry-After": "0.1"})
+
+        app = web.Application()
+        app.router.add_get("/", handler)
+        async with TestServer(app) as server:
+            client = session.create_session()
+            try:
+                async with client.get(server.make_url("/")) as resp:
+                    assert resp.status == 429
+
+                started = time.monotonic()
+                async with client.get(server.make_url("/")) as resp:
+                    assert resp.status == 200
+                assert time.monotonic() - started >= 0.09
+            finally:
+                await client.close()
+
+        assert ratelimit.bucket("127.0.0.1").rate == 1000
+        assert ratelimit.bucket("localhost") is None
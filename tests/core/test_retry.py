@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import metrics, retry, session, settings
+from aquavalet.providers.filesystem import FileSystemProvider
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BACKOFF", 0.001)
+    monkeypatch.setattr(retry, "_BUDGET", None)
+
+
+def upstream(*statuses, headers=None):
+    """A server answering its requests with ``statuses`` in turn, and the requests it got."""
+    statuses = iter(statuses)
+    received = []
+
+    async def handler(request):
+        received.append((request.method, await request.read()))
+        return web.Response(status=next(statuses), headers=headers)
+
+    app = web.Application()
+    app.router.add_route("*", "/", handler)
+    return TestServer(app), received
+
+
+async def request(server, method="GET", **kwargs):
+    client = session.create_session()
+    try:
+        provider = FileSystemProvider({}, session=client)
+        async with provider.make_request(
+            method, str(server.make_url("/")), **kwargs
+        ) as resp:
+            return resp.status
+    finally:
+        await client.close()
+
+
+class TestRetry:
+    @pytest.mark.asyncio
+    async def test_retries_until_success(self):
+        server, received = upstream(503, 502, 200)
+        async with server:
+            assert await request(server) == 200
+        assert len(received) == 3
+        assert metrics.retries.values[("127.0.0.1", 503)] >= 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_attempts(self, monkeypatch):
+        monkeypatch.setattr(settings, "RETRY_ATTEMPTS", 2)
+        server, received = upstream(503, 503, 503, 200)
+        async with server:
+            assert await request(server) == 503
+        assert len(received) == 3
+        assert metrics.retry_give_ups.values[("127.0.0.1", "attempts")] >= 1
+
+    @pytest.mark.asyncio
+    async def test_honours_retry_after(self):
+        server, received = upstream(429, 200, headers={"Retry-After": "0.1"})
+        async with server:
+            started = time.monotonic()
+            assert await request(server) == 200
+            assert time.monotonic() - started >= 0.09
+        assert len(received) == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_on_long_retry_after(self):
+        server, received = upstream(503, 200, headers={"Retry-After": "3600"})
+        async with server:
+            assert await request(server) == 503
+        assert len(received) == 1
+
+    @pytest.mark.asyncio
+    async def test_only_retries_idempotent_requests(self):
+        server, received = upstream(503, 503, 200, 503, 200)
+        async with server:
+            assert await request(server, "POST", data=b"x") == 503
+            assert await request(server, "PUT", data=b"x", idempotent=True) == 200
+
+            async def stream():
+                yield b"x"
+
+            assert await request(server, "PUT", data=stream(), idempotent=True) == 503
+        assert [method for method, _ in received] == ["POST", "PUT", "PUT", "PUT"]
+        assert received[2] == ("PUT", b"x")
+
+    @pytest.mark.asyncio
+    async def test_not_retried_statuses(self):
+        server, received = upstream(500, 200)
+        async with server:
+            assert await request(server) == 500
+        assert len(received) == 1
+
+
+class TestBudget:
+    def test_spends_what_requests_earn(self):
+        budget = retry.Budget(ratio=0.5, minimum=0)
+        budget.balance = 0
+
+        assert not budget.withdraw()
+        budget.deposit()
+        budget.deposit()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+    def test_minimum_per_second(self):
+        budget = retry.Budget(ratio=0, minimum=100)
+        budget.balance = 0
+        time.sleep(0.02)
+        assert budget.withdraw()
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_stops_retries(self, monkeypatch):
+        monkeypatch.setattr(retry, "_BUDGET", retry.Budget(ratio=0, minimum=0))
+        retry.get_budget().balance = 1
+        server, received = upstream(503, 503, 503)
+        async with server:
+            assert await request(server) == 503
+        assert len(received) == 2
+        assert metrics.retry_give_ups.values[("127.0.0.1", "budget")] >= 1
@@ -0,0 +1,295 @@
+import os
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from aquavalet import aio, metrics, settings
+from aquavalet.app import app
+from aquavalet.streams.file import FileStreamReader
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "folder").mkdir()
+    (tmp_path / "folder" / "a.txt").write_bytes(b"a" * 10)
+    (tmp_path / "data.bin").write_bytes(os.urandom(100000))
+    return tmp_path
+
+
+def serve():
+    return TestClient(TestServer(app()))
+
+
+class TestMetadata:
+    @pytest.mark.asyncio
+    async def test_metadata(self, files):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/folder/a.txt")
+
+            assert resp.status == 200
+            data = (await resp.json())["data"]
+            assert data["attributes"]["name"] == "a.txt"
+            assert data["attributes"]["size"] == 10
+
+    @pytest.mark.asyncio
+    async def test_not_found(self, files):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/missing.txt")
+
+            assert resp.status == 404
+            assert (await resp.json())["error"] == "NotFoundError"
+
+
+class TestDownload:
+    @pytest.mark.asyncio
+    async def test_download_uses_sendfile(self, files, monkeypatch):
+        sent = []
+        sendfile = FileStreamReader.sendfile
+
+        async def spy(self, transport):
+            count = await sendfile(self, transport)
+            sent.append(count)
+            return count
+
+        monkeypatch.setattr(FileStreamReader, "sendfile", spy)
+        key = ("filesystem", "download")
+        before = metrics.bytes_downloaded.values.get(key, 0)
+
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/data.bin?serve=download")
+
+            assert resp.status == 200
+            assert resp.headers["Content-Length"] == "100000"
+            assert 'filename="data.bin"' in resp.headers["Content-Disposition"]
+            assert await resp.read() == (files / "data.bin").read_bytes()
+
+        # The client can have the body before the handler is back from the kernel
+        assert sent == [100000]
+        assert metrics.bytes_downloaded.values[key] == before + 100000
+
+    @pytest.mark.asyncio
+    async def test_download_mapped(self, files, monkeypatch):
+        monkeypatch.setattr(settings, "MMAP_ENABLED", True)
+
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/data.bin?serve=download")
+
+            assert resp.status == 200
+            assert await resp.read() == (files / "data.bin").read_bytes()
+
+    @pytest.mark.asyncio
+    async def test_download_not_modified(self, files):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/data.bin?serve=download")
+            etag = resp.headers["ETag"]
+
+            resp = await client.get(
+                f"/filesystem{files}/data.bin?serve=download",
+                headers={"If-None-Match": etag},
+            )
+
+            assert resp.status == 304
+            assert await resp.read() == b""
+
+
+class TestRanges:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "header,start,end",
+        [
+            ("bytes=10-19", 10, 19),
+            ("bytes=99990-", 99990, 99999),
+            ("bytes=-5", 99995, 99999),
+        ],
+    )
+    async def test_range(self, files, header, start, end):
+        data = (files / "data.bin").read_bytes()
+
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{files}/data.bin?serve=download", headers={"Range": header}
+            )
+
+            assert resp.status == 206
+            assert resp.headers["Accept-Ranges"] == "bytes"
+            assert resp.headers["Content-Range"] == f"bytes {start}-{end}/100000"
+            assert await resp.read() == data[start : end + 1]
+
+    @pytest.mark.asyncio
+    async def test_multiple_ranges(self, files):
+        data = (files / "data.bin").read_bytes()
+
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{files}/data.bin?serve=download",
+                headers={"Range": "bytes=0-9,500-509"},
+            )
+
+            assert resp.status == 206
+            content_type = resp.headers["Content-Type"]
+            assert content_type.startswith("multipart/byteranges; boundary=")
+            boundary = content_type.split("boundary=")[1]
+            body = await resp.read()
+            assert int(resp.headers["Content-Length"]) == len(body)
+            assert body.endswith(f"--{boundary}--\r\n".encode())
+            assert b"Content-Range: bytes 0-9/100000\r\n\r\n" + data[:10] in body
+            assert (
+                b"Content-Range: bytes 500-509/100000\r\n\r\n" + data[500:510] in body
+            )
+
+    @pytest.mark.asyncio
+    async def test_unsatisfiable(self, files):
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{files}/data.bin?serve=download",
+                headers={"Range": "bytes=100000-"},
+            )
+
+            assert resp.status == 416
+            assert resp.headers["Content-Range"] == "bytes */100000"
+            assert await resp.read() == b""
+
+    @pytest.mark.asyncio
+    async def test_malformed_range_is_ignored(self, files):
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{files}/data.bin?serve=download",
+                headers={"Range": "pages=1-2"},
+            )
+
+            assert resp.status == 200
+            assert len(await resp.read()) == 100000
+
+
+class TestChildren:
+    @pytest.fixture
+    def folder(self, tmp_path):
+        for name in "edcba":
+            (tmp_path / f"{name}.txt").write_bytes(name.encode())
+        (tmp_path / ".upload-0123456789abcdef").write_bytes(b"partial")
+        return tmp_path
+
+    @pytest.mark.asyncio
+    async def test_children(self, folder):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{folder}/?serve=children")
+
+            assert resp.status == 200
+            body = await resp.json()
+            names = sorted(child["attributes"]["name"] for child in body["data"])
+            assert names == ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt"]
+            assert resp.headers["ETag"].startswith('W/"')
+
+            resp = await client.get(
+                f"/filesystem{folder}/?serve=children",
+                headers={"If-None-Match": resp.headers["ETag"]},
+            )
+            assert resp.status == 304
+
+    @pytest.mark.asyncio
+    async def test_pages(self, folder):
+        names, cursor = [], None
+        async with serve() as client:
+            for _ in range(3):
+                params = {"serve": "children", "limit": "2"}
+                if cursor is not None:
+                    params["cursor"] = cursor
+                resp = await client.get(f"/filesystem{folder}/", params=params)
+
+                assert resp.status == 200
+                body = await resp.json()
+                names.append([child["attributes"]["name"] for child in body["data"]])
+                cursor = body["meta"]["next_cursor"]
+
+        assert names == [["a.txt", "b.txt"], ["c.txt", "d.txt"], ["e.txt"]]
+        assert cursor is None
+
+    @pytest.mark.asyncio
+    async def test_ndjson_page(self, folder):
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{folder}/?serve=children&limit=3",
+                headers={"Accept": "application/x-ndjson"},
+            )
+
+            assert resp.status == 200
+            assert resp.headers["Content-Type"] == "application/x-ndjson"
+            lines = (await resp.text()).splitlines()
+            assert [json.loads(line)["attributes"]["name"] for line in lines] == [
+                "a.txt",
+                "b.txt",
+                "c.txt",
+            ]
+
+            resp = await client.get(
+                f"/filesystem{folder}/?serve=children&format=ndjson&limit=3",
+                params={"cursor": resp.headers["X-Next-Cursor"]},
+            )
+            lines = (await resp.text()).splitlines()
+            assert [json.loads(line)["attributes"]["name"] for line in lines] == [
+                "d.txt",
+                "e.txt",
+            ]
+            assert "X-Next-Cursor" not in resp.headers
+
+    @pytest.mark.asyncio
+    async def test_ndjson_stream(self, folder, monkeypatch):
+        monkeypatch.setattr(settings, "CHILDREN_BATCH_SIZE", 2)
+
+        async with serve() as client:
+            resp = await client.get(
+                f"/filesystem{folder}/?serve=children&format=ndjson"
+            )
+
+            assert resp.status == 200
+            lines = (await resp.text()).splitlines()
+            names = sorted(json.loads(line)["attributes"]["name"] for line in lines)
+            assert names == ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("query", ["limit=0", "limit=many", "cursor=%25%25"])
+    async def test_invalid_parameters(self, folder, query):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{folder}/?serve=children&{query}")
+
+            assert resp.status == 400
+            assert (await resp.json())["error"] == "InvalidParameters"
+
+    @pytest.mark.asyncio
+    async def test_children_of_a_file(self, folder):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{folder}/a.txt?serve=children")
+
+            assert resp.status == 400
+
+
+class TestUsage:
+    @pytest.mark.asyncio
+    async def test_usage(self, files):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/?serve=usage")
+
+            assert resp.status == 200
+            data = (await resp.json())["data"]
+            assert data["type"] == "usage"
+            assert data["attributes"] == {"size": 100010, "files": 2, "folders": 1}
+
+    @pytest.mark.asyncio
+    async def test_usage_of_a_file(self, files):
+        async with serve() as client:
+            resp = await client.get(f"/filesystem{files}/data.bin?serve=usage")
+
+            assert resp.status == 400
+            assert (await resp.json())["error"] == "InvalidPathError"
+
+
+class TestCleanup:
+    @pytest.mark.asyncio
+    async def test_io_threads_shut_down(self, files):
+        async with serve() as client:
+            await client.get(f"/filesystem{files}/data.bin")
+            executor = aio.get_executor()
+
+        assert executor._shutdown
+        assert aio.get_executor() is not executor
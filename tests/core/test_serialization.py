@@ -0,0 +1,88 @@
+import hashlib
+from urllib.parse import quote
+
+import pytest
+
+from aquavalet import settings, utils
+from aquavalet.providers.osfstorage.metadata import OsfMetadata
+from aquavalet.providers.filesystem.metadata import FileSystemMetadata
+
+NAMES = ["test.txt", "with space.txt", "é?#;%.bin", "folder/", "a/b c/d/"]
+
+
+def legacy_links(item):
+    """The links as ``construct_path`` builds them, one call per action."""
+    segments = [seg for seg in item.attributes["path"].split("/") if seg]
+    segments = [quote(seg) for seg in segments]
+    actions = ["meta", "delete"]
+    actions += (
+        ["children", "upload", "download_as_zip"]
+        if item.kind == "folder"
+        else ["download"]
+    )
+    return {
+        "info" if action == "meta" else action: item.construct_path(segments, action)
+        for action in actions
+    }
+
+
+class TestLinks:
+    @pytest.mark.parametrize("name", NAMES)
+    def test_filesystem(self, tmp_path, name):
+        path = tmp_path / name
+        if name.endswith("/"):
+            path.mkdir(parents=True)
+        else:
+            path.write_bytes(b"data")
+        item = FileSystemMetadata(path=str(path) + ("/" if name.endswith("/") else ""))
+
+        assert item._json_api_links() == legacy_links(item)
+
+    @pytest.mark.parametrize("name", NAMES + ["/"])
+    def test_osf(self, name):
+        kind = "folder" if name.endswith("/") else "file"
+        item = OsfMetadata(
+            {
+                "attributes": {
+                    "name": name,
+                    "kind": kind,
+                    "path": "/" + name.lstrip("/"),
+                }
+            },
+            "osfstorage",
+            "guid0",
+        )
+
+        assert item._json_api_links() == legacy_links(item)
+
+    def test_domain_change(self, tmp_path, monkeypatch):
+        (tmp_path / "test.txt").write_bytes(b"data")
+        item = FileSystemMetadata(path=str(tmp_path / "test.txt"))
+        monkeypatch.setattr(settings, "DOMAIN", "https://files.example.com")
+
+        assert item._json_api_links()["info"].startswith("https://files.example.com/")
+
+
+class TestEtagHash:
+    def test_cached_per_etag(self, tmp_path):
+        (tmp_path / "test.txt").write_bytes(b"data")
+        item = FileSystemMetadata(path=str(tmp_path / "test.txt"))
+
+        expected = hashlib.sha256(f"filesystem::{item.etag}".encode()).hexdigest()
+        assert item.etag_hash == expected
+        assert item._etag_hash == (item.etag, expected)
+
+        item.raw["modified"] = "changed"
+        assert item.etag_hash == (
+            hashlib.sha256(f"filesystem::{item.etag}".encode()).hexdigest()
+        )
+
+
+class TestJsonDumps:
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_dumps(self, monkeypatch, fast):
+        monkeypatch.setattr(settings, "FAST_JSON", fast)
+        assert utils.json_dumps({"a": [1, "é", None]}) == '{"a":[1,"é",null]}'
+
+    def test_falls_back_for_big_integers(self):
+        assert utils.json_dumps({"size": 2**70}) == '{"size":%d}' % 2**70
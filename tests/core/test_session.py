@@ -0,0 +1,62 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import session
+from aquavalet.providers.osfstorage import OSFStorageProvider
+
+
+def make_server():
+    peers = []
+
+    async def handler(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({"authorization": request.headers["Authorization"]})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = TestServer(app)
+    server.peers = peers
+    return server
+
+
+class TestSession:
+    @pytest.mark.asyncio
+    async def test_get_session_is_shared(self):
+        shared = session.get_session()
+        assert session.get_session() is shared
+        assert OSFStorageProvider({}).session is shared
+
+        await session.close_session()
+        assert shared.closed
+        assert session.get_session() is not shared
+        await session.close_session()
+
+    @pytest.mark.asyncio
+    async def test_make_request_reuses_connections(self):
+        server = make_server()
+        await server.start_server()
+        provider = OSFStorageProvider({})
+        provider.token = "token"
+
+        async with provider.make_request("GET", str(server.make_url("/"))) as resp:
+            assert (await resp.json()) == {"authorization": "Bearer token"}
+
+        resp = await provider.make_request("GET", str(server.make_url("/")))
+        await resp.release()
+
+        # The second request went over the kept-alive connection of the first
+        assert len(server.peers) == 2
+        assert server.peers[0] == server.peers[1]
+
+        await session.close_session()
+        await server.close()
+
+    @pytest.mark.asyncio
+    async def test_app_hooks(self):
+        app = web.Application()
+        await session.on_startup(app)
+        assert app["session"] is session.get_session()
+
+        await session.on_cleanup(app)
+        assert app["session"].closed
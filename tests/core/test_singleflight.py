@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from aquavalet import singleflight
+
+
+class TestGroup:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one(self):
+        group = singleflight.Group()
+        calls = []
+
+        async def read():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(group.do("key", read) for _ in range(10)))
+
+        assert calls == [1]
+        assert [result for result, _ in results] == ["result"] * 10
+        assert [shared for _, shared in results].count(False) == 1
+        assert len(group) == 0
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_run_again(self):
+        group = singleflight.Group()
+        calls = []
+
+        async def read():
+            calls.append(1)
+            return len(calls)
+
+        assert await group.do("key", read) == (1, False)
+        assert await group.do("key", read) == (2, False)
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared(self):
+        group = singleflight.Group()
+
+        async def read():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(
+            group.do("key", read), group.do("key", read), return_exceptions=True
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(group) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_the_call(self):
+        group = singleflight.Group()
+        release = asyncio.Event()
+
+        async def read():
+            await release.wait()
+            return "result"
+
+        first = asyncio.ensure_future(group.do("key", read))
+        second = asyncio.ensure_future(group.do("key", read))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        assert await second == ("result", True)
+
+    @pytest.mark.asyncio
+    async def test_forget_splits_later_callers(self):
+        group = singleflight.Group()
+        release = asyncio.Event()
+        calls = []
+
+        async def read():
+            calls.append(1)
+            await release.wait()
+            return len(calls)
+
+        before = asyncio.ensure_future(group.do(("a", "/folder/"), read))
+        await asyncio.sleep(0)
+        group.forget(lambda key: key[1] == "/folder/")
+        after = asyncio.ensure_future(group.do(("a", "/folder/"), read))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert (await before)[1] is False
+        assert (await after)[1] is False
+        assert len(calls) == 2
@@ -0,0 +1,66 @@
+import json
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from aquavalet import aio, settings, tracing
+from aquavalet.app import app
+
+
+async def traced(request):
+    with tracing.span("provider"):
+        time.sleep(0.01)
+    tracing.mark("first_byte")
+    return web.json_response({})
+
+
+class TestTracing:
+    def test_span_and_mark(self):
+        trace = tracing.Trace("GET /")
+        with trace.span("validate_item"):
+            time.sleep(0.01)
+        trace.mark("first_byte")
+
+        (name, offset, duration), (mark, _, elapsed) = trace.spans
+        assert name == "validate_item"
+        assert duration >= 0.01
+        assert mark == "first_byte"
+        assert elapsed >= offset + duration
+
+        timing = trace.server_timing().split(", ")
+        assert [metric.split(";")[0] for metric in timing] == [
+            "validate_item",
+            "first_byte",
+            "total",
+        ]
+        assert float(timing[0].split("dur=")[1]) >= 10
+
+    def test_no_trace_is_a_noop(self):
+        assert tracing.current() is None
+        with tracing.span("provider"):
+            pass
+        tracing.mark("first_byte")
+
+    @pytest.mark.asyncio
+    async def test_server_timing_header(self, tmp_path, monkeypatch):
+        trace_file = tmp_path / "trace.jsonl"
+        monkeypatch.setattr(settings, "TRACE_FILE", str(trace_file))
+        application = app()
+        application.router.add_get("/traced", traced)
+
+        async with TestClient(TestServer(application)) as client:
+            resp = await client.get("/traced")
+            assert resp.status == 200
+            names = [
+                metric.split(";")[0]
+                for metric in resp.headers["Server-Timing"].split(", ")
+            ]
+        assert names == ["provider", "first_byte", "total"]
+
+        aio.shutdown()  # waits for the trace to be written
+        trace = json.loads(trace_file.read_text())
+        assert trace["name"] == "GET /traced"
+        assert [span["name"] for span in trace["spans"]] == ["provider", "first_byte"]
+        assert trace["duration"] >= 0.01
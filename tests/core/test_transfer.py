@@ -0,0 +1,230 @@
+import asyncio
+
+import pytest
+
+from aquavalet import settings, transfer
+from aquavalet.streams.base import BaseStream
+from aquavalet.providers.filesystem import FileSystemProvider
+
+
+class CountingStream(BaseStream):
+    """``size`` bytes read as asked, keeping count of the reads, failing after ``fail_after``."""
+
+    def __init__(self, size, fail_after=None):
+        super().__init__()
+        self.data = bytes(range(256)) * (size // 256)
+        self.position = 0
+        self.reads = 0
+        self.fail_after = fail_after
+        self.closed = False
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def close(self):
+        self.closed = True
+
+    async def _read(self, size):
+        if self.fail_after is not None and self.reads >= self.fail_after:
+            raise OSError("Read failed")
+        self.reads += 1
+        chunk = self.data[self.position : self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+class SlowProvider(FileSystemProvider):
+    """Downloads take ``delay`` seconds, or ``slow`` for files named ``slow*``, and the most
+    downloads seen at once is kept.  Files named ``fail*`` fail to download.
+    """
+
+    def __init__(self, delay=0.01, slow=0.01):
+        super().__init__({})
+        self.delay = delay
+        self.slow = slow
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.cancelled = 0
+
+    async def download(self, item, version=None, range=None):
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(
+                self.slow if item.name.startswith("slow") else self.delay
+            )
+            if item.name.startswith("fail"):
+                raise OSError("Upstream went away")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        return await super().download(item, version=version, range=range)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / "src"
+    (src / "folder" / "sub").mkdir(parents=True)
+    (src / "folder" / "empty").mkdir()
+    (src / "folder" / "a.txt").write_bytes(b"a" * 10)
+    (src / "folder" / "sub" / "b.txt").write_bytes(b"b" * 20)
+    for i in range(20):
+        (src / "folder" / "sub" / f"{i}.txt").write_bytes(str(i).encode())
+    (tmp_path / "dest").mkdir()
+    return tmp_path
+
+
+def listing(root):
+    return sorted(
+        (str(path.relative_to(root)), path.read_bytes() if path.is_file() else None)
+        for path in root.rglob("*")
+    )
+
+
+class TestReadAheadStream:
+    @pytest.mark.asyncio
+    async def test_reads_ahead_up_to_the_buffer(self):
+        source = CountingStream(64 * 1024)
+        stream = transfer.ReadAheadStream(source, chunk_size=1024, buffer_size=4096)
+        await asyncio.sleep(0.01)
+
+        # Four chunks queued, and a fifth waiting for room
+        assert source.reads == 5
+        assert stream.size == 64 * 1024
+
+        assert await stream.read(100) == source.data[:100]
+        assert await stream.read() == source.data[100:]
+        assert await stream.read() == b""
+        assert stream.at_eof()
+
+    @pytest.mark.asyncio
+    async def test_iterates_in_chunks(self):
+        source = CountingStream(10 * 1024)
+        stream = transfer.ReadAheadStream(source, chunk_size=4096, buffer_size=4096)
+
+        chunks = [chunk async for chunk in stream]
+
+        assert [len(chunk) for chunk in chunks] == [4096, 4096, 2048]
+        assert b"".join(chunks) == source.data
+
+    @pytest.mark.asyncio
+    async def test_read_error_after_the_chunks_before_it(self):
+        source = CountingStream(64 * 1024, fail_after=2)
+        stream = transfer.ReadAheadStream(source, chunk_size=1024, buffer_size=8192)
+
+        assert await stream.read(1024) == source.data[:1024]
+        assert await stream.read(1024) == source.data[1024:2048]
+        with pytest.raises(OSError, match="Read failed"):
+            await stream.read(1024)
+
+    @pytest.mark.asyncio
+    async def test_close(self):
+        source = CountingStream(64 * 1024)
+        stream = transfer.ReadAheadStream(source, chunk_size=1024, buffer_size=1024)
+        await asyncio.sleep(0)
+
+        stream.close()
+        reads = source.reads
+        await asyncio.sleep(0.01)
+        assert source.closed
+        assert source.reads == reads
+
+
+class TestTreeTransfer:
+    @pytest.mark.asyncio
+    async def test_copies_tree(self, tree):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tree}/src/folder/")
+        dest = await provider.validate_item(f"{tree}/dest/")
+
+        copier = transfer.TreeTransfer(provider, provider)
+        folder = await copier.run(item, dest)
+
+        assert folder.path == f"{tree}/dest/folder/"
+        assert listing(tree / "dest") == listing(tree / "src")
+        assert copier.files == 22
+        assert copier.folders == 3
+
+    @pytest.mark.asyncio
+    async def test_keeps_workers_busy(self, tree):
+        (tree / "src" / "folder" / "slow.txt").write_bytes(b"slow")
+        provider = SlowProvider(delay=0.01, slow=0.3)
+        item = await provider.validate_item(f"{tree}/src/folder/")
+        dest = await provider.validate_item(f"{tree}/dest/")
+
+        copier = transfer.TreeTransfer(provider, provider, workers=4)
+        run = asyncio.ensure_future(copier.run(item, dest))
+        await asyncio.sleep(0.2)
+        # The other files went through the other workers while the slow one was in flight
+        assert copier.files == 22
+        await run
+
+        assert provider.most_in_flight == 4
+        assert listing(tree / "dest") == listing(tree / "src")
+
+    @pytest.mark.asyncio
+    async def test_first_error_cancels_everything(self, tree):
+        (tree / "src" / "folder" / "fail.txt").write_bytes(b"fail")
+        (tree / "src" / "folder" / "slow.txt").write_bytes(b"slow")
+        provider = SlowProvider(delay=0.01, slow=10)
+        item = await provider.validate_item(f"{tree}/src/folder/")
+        dest = await provider.validate_item(f"{tree}/dest/")
+
+        with pytest.raises(OSError, match="Upstream went away"):
+            await asyncio.wait_for(
+                transfer.TreeTransfer(provider, provider, workers=4).run(item, dest),
+                timeout=5,
+            )
+
+        assert provider.cancelled >= 1
+        assert provider.in_flight == 0
+
+
+class TestCopyMove:
+    @pytest.mark.asyncio
+    async def test_move(self, tree):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tree}/src/folder/")
+        dest = await provider.validate_item(f"{tree}/dest/")
+        expected = listing(tree / "src")
+
+        await provider.move(item, dest, provider, "warn")
+
+        assert listing(tree / "dest") == expected
+        assert not (tree / "src" / "folder").exists()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("buffer_size", [0, 1024])
+    async def test_copy_file_closes_the_source(self, tree, monkeypatch, buffer_size):
+        monkeypatch.setattr(settings, "TRANSFER_BUFFER_SIZE", buffer_size)
+        source = CountingStream(4096)
+
+        class FailingProvider(FileSystemProvider):
+            async def download(self, item, version=None, range=None):
+                return source
+
+            async def upload(self, item, stream=None, new_name=None, conflict="warn"):
+                raise OSError("Disk full")
+
+        provider = FailingProvider({})
+        item = await provider.validate_item(f"{tree}/src/folder/a.txt")
+        dest = await provider.validate_item(f"{tree}/dest/")
+
+        with pytest.raises(OSError, match="Disk full"):
+            await transfer.copy_file(provider, item, provider, dest)
+        await asyncio.sleep(0.01)  # the read-ahead closes it once its read has stopped
+
+        assert source.closed
+
+    @pytest.mark.asyncio
+    async def test_copy_file(self, tree):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tree}/src/folder/a.txt")
+        dest = await provider.validate_item(f"{tree}/dest/")
+
+        await provider.copy(item, dest, provider, "warn")
+
+        assert (tree / "dest" / "a.txt").read_bytes() == b"a" * 10
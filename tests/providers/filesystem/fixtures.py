@@ -1,4 +1,5 @@
 import pytest
+from aquavalet import settings
 from aquavalet.providers.filesystem import FileSystemProvider
 from aquavalet.providers.filesystem.metadata import FileSystemMetadata
 import linecache
@@ -11,7 +12,10 @@ from pyfakefs.fake_filesystem_unittest import Patcher
 
 
 @pytest.fixture
-def provider():
+def provider(monkeypatch):
+    # pyfakefs file descriptors mean nothing to the kernel, keep syscalls it can't fake off them
+    monkeypatch.setattr(settings, "UPLOAD_PREALLOCATE", False)
+    monkeypatch.setattr(settings, "KERNEL_COPY", False)
     return FileSystemProvider({})
 
 
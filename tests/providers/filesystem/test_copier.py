@@ -0,0 +1,105 @@
+import os
+import errno
+
+import pytest
+
+from aquavalet import settings
+from aquavalet.providers.filesystem import copier
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub" / "deeper").mkdir(parents=True)
+    (src / "empty").mkdir()
+    (src / "a.txt").write_bytes(b"a" * 10)
+    (src / "sub" / "b.txt").write_bytes(b"b" * 20)
+    (src / "sub" / "deeper" / "c.txt").write_bytes(b"c" * 30)
+    os.chmod(src / "a.txt", 0o600)
+    return src
+
+
+class TestCopyFile:
+    @pytest.mark.parametrize("kernel_copy", [True, False])
+    def test_copy_file(self, tmp_path, monkeypatch, kernel_copy):
+        monkeypatch.setattr(settings, "KERNEL_COPY", kernel_copy)
+        src = tmp_path / "src.bin"
+        src.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+        os.chmod(src, 0o640)
+        progress = copier.CopyProgress(str(src), str(tmp_path / "dest.bin"))
+
+        copier.copy_file(str(src), str(tmp_path / "dest.bin"), progress=progress)
+
+        dest = tmp_path / "dest.bin"
+        assert dest.read_bytes() == src.read_bytes()
+        assert os.stat(dest).st_mode & 0o777 == 0o640
+        assert progress.files_done == 1
+        assert progress.bytes_done == src.stat().st_size
+
+    def test_copy_file_range_stops_short(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "KERNEL_COPY", True)
+        monkeypatch.setattr(copier, "_clone", lambda fsrc, fdst: False)
+        calls = []
+
+        def copy_file_range(src, dst, count):
+            calls.append(count)
+            if len(calls) > 1:
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            return os.write(dst, os.read(src, 1000))
+
+        monkeypatch.setattr(os, "copy_file_range", copy_file_range, raising=False)
+        src = tmp_path / "src.bin"
+        src.write_bytes(os.urandom(5000))
+        progress = copier.CopyProgress(str(src), str(tmp_path / "dest.bin"))
+
+        copier.copy_file(str(src), str(tmp_path / "dest.bin"), progress=progress)
+
+        assert len(calls) == 2
+        assert (tmp_path / "dest.bin").read_bytes() == src.read_bytes()
+        assert progress.bytes_done == 5000
+
+    def test_copy_file_missing(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            copier.copy_file(str(tmp_path / "missing"), str(tmp_path / "dest"))
+
+
+class TestCopyTree:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("kernel_copy", [True, False])
+    async def test_copy_tree(self, tree, tmp_path, monkeypatch, kernel_copy):
+        monkeypatch.setattr(settings, "KERNEL_COPY", kernel_copy)
+        dest = tmp_path / "dest"
+
+        progress = await copier.copy_tree(str(tree), str(dest), workers=2)
+
+        assert (dest / "a.txt").read_bytes() == b"a" * 10
+        assert (dest / "sub" / "b.txt").read_bytes() == b"b" * 20
+        assert (dest / "sub" / "deeper" / "c.txt").read_bytes() == b"c" * 30
+        assert (dest / "empty").is_dir()
+        assert os.stat(dest / "a.txt").st_mode & 0o777 == 0o600
+        assert progress.files_total == progress.files_done == 3
+        assert progress.bytes_total == progress.bytes_done == 60
+        assert progress not in copier.in_progress
+
+    @pytest.mark.asyncio
+    async def test_copy_tree_existing_dest(self, tree, tmp_path):
+        (tmp_path / "dest").mkdir()
+
+        with pytest.raises(FileExistsError):
+            await copier.copy_tree(str(tree), str(tmp_path / "dest"))
+
+        assert not copier.in_progress
+
+    @pytest.mark.asyncio
+    async def test_copy_tree_symlinks(self, tree, tmp_path):
+        os.symlink("sub", tree / "link")
+        os.symlink("a.txt", tree / "a-link")
+        dest = tmp_path / "dest"
+
+        progress = await copier.copy_tree(str(tree), str(dest))
+
+        assert os.readlink(dest / "link") == "sub"
+        assert os.readlink(dest / "a-link") == "a.txt"
+        assert not (dest / "sub" / "link").exists()
+        assert progress.files_total == progress.files_done == 3
+        assert progress.bytes_total == progress.bytes_done == 60
@@ -0,0 +1,133 @@
+import pytest
+
+from aquavalet.providers.filesystem import mapping as mapping_module
+from aquavalet.providers.filesystem.mapping import MappingCache
+from aquavalet.streams.file import MappedFileStreamReader
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"test-{i}.txt"
+        path.write_bytes(b"test data")
+        paths.append(str(path))
+    return paths
+
+
+class TestMappingCache:
+    def test_acquire_shares_mapping(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+
+        mapping = cache.acquire(files[0])
+        assert mapping.refs == 1
+        assert cache.acquire(files[0]) is mapping
+        assert mapping.refs == 2
+        assert cache.mapped_bytes == 9
+
+        mapping.release()
+        mapping.release()
+        assert mapping.refs == 0
+        assert not mapping.mmap.closed
+
+    def test_size_threshold(self, files, tmp_path):
+        cache = MappingCache(max_file_size=8, max_total=1024)
+        assert cache.acquire(files[0]) is None
+
+        empty = tmp_path / "empty.txt"
+        empty.write_bytes(b"")
+        assert cache.acquire(str(empty)) is None
+
+    def test_evicts_least_recently_used(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=18)
+
+        first = cache.acquire(files[0])
+        second = cache.acquire(files[1])
+        first.release()
+        second.release()
+        cache.acquire(files[0]).release()  # files[1] is now least recently used
+
+        third = cache.acquire(files[2])
+        assert third is not None
+        assert second.evicted and second.mmap.closed
+        assert not first.evicted
+        assert cache.mapped_bytes == 18
+        assert len(cache) == 2
+
+    def test_referenced_mappings_are_kept(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=18)
+
+        first = cache.acquire(files[0])
+        second = cache.acquire(files[1])
+
+        assert cache.acquire(files[2]) is None
+        assert not first.evicted and not second.evicted
+
+    def test_hit_does_not_open_the_file(self, files, monkeypatch):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+        mapping = cache.acquire(files[0])
+        opened = []
+
+        def counting_open(*args, **kwargs):
+            opened.append(args[0])
+            return open(*args, **kwargs)
+
+        monkeypatch.setattr(mapping_module, "open", counting_open, raising=False)
+
+        assert cache.acquire(files[0]) is mapping
+        assert opened == []
+        assert cache.acquire(files[1]) is not None
+        assert opened == [files[1]]
+
+    def test_modified_file_is_remapped(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+
+        mapping = cache.acquire(files[0])
+        with open(files[0], "wb") as fp:
+            fp.write(b"new test data")
+
+        new_mapping = cache.acquire(files[0])
+        assert new_mapping is not mapping
+        assert mapping.evicted and not mapping.mmap.closed
+        assert new_mapping.mmap[:] == b"new test data"
+
+        mapping.release()
+        assert mapping.mmap.closed
+        assert cache.mapped_bytes == 13
+
+
+class TestMappedFileStreamReader:
+    @pytest.mark.asyncio
+    async def test_read(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+        mapping = cache.acquire(files[0])
+
+        stream = MappedFileStreamReader(mapping)
+        stream.CHUNK_SIZE = 4
+
+        assert stream.size == 9
+        assert [bytes(chunk) async for chunk in stream] == [b"test", b" dat", b"a"]
+        assert stream.at_eof()
+        assert mapping.refs == 0
+
+    @pytest.mark.asyncio
+    async def test_read_range(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+        mapping = cache.acquire(files[0])
+
+        stream = MappedFileStreamReader(mapping, range=(5, 100))
+
+        assert stream.content_length == 4
+        assert bytes(await stream.read()) == b"data"
+        assert mapping.refs == 0
+
+    @pytest.mark.asyncio
+    async def test_close_releases(self, files):
+        cache = MappingCache(max_file_size=1024, max_total=1024)
+        mapping = cache.acquire(files[0])
+
+        stream = MappedFileStreamReader(mapping, range=(0, 1))
+        stream.close()
+        stream.close()
+
+        assert mapping.refs == 0
@@ -130,3 +130,24 @@ class TestMetadata:
             json_api_data["links"]["children"]
             == "http://localhost:7777/filesystem/folder%20test/?serve=children"
         )
+
+    def test_metadata_from_dir_entry(self, fs):
+        fs.create_dir("/folder test/")
+        fs.create_file("/folder test/test.txt", contents=b"test")
+        fs.create_dir("/folder test/subfolder/")
+
+        with os.scandir("/folder test/") as entries:
+            children = {
+                child.name: child
+                for child in map(FileSystemMetadata.from_dir_entry, entries)
+            }
+
+        file = children["test.txt"]
+        assert file.path == "/folder test/test.txt"
+        assert file.kind == "file"
+        assert file.size == 4
+        assert file.mime_type == "text/plain"
+
+        folder = children["subfolder"]
+        assert folder.path == "/folder test/subfolder/"
+        assert folder.kind == "folder"
@@ -2,11 +2,20 @@ import pytest
 
 import io
 import os
+import time
+import asyncio
 import zipfile
+import functools
+import threading
+import stat
+import collections
 
+from aquavalet.streams.base import StringStream
 from aquavalet.streams.file import FileStreamReader
+from aquavalet.providers.filesystem import FileSystemProvider
 from aquavalet.providers.filesystem.metadata import FileSystemMetadata
-from aquavalet import exceptions
+from aquavalet import aio, exceptions, settings
+from aquavalet import provider as base_provider
 
 from .fixtures import missing_file_metadata, provider
 
@@ -59,7 +68,7 @@ class TestValidateItem:
 
         assert (
             exc.value.message
-            == "Item at 'Item at '/missing.txt' could not be found, folders must end with '/'' could not be found, folders must end with '/'"
+            == "Item at '/missing.txt' could not be found, folders must end with '/'"
         )
 
 
@@ -113,7 +122,7 @@ class TestDownload:
 
         item = await provider.validate_item("test folder/")
 
-        stream = await provider.zip(item, None)
+        stream = await provider.zip(item)
 
         data = b""
         async for chunk in stream:
@@ -286,6 +295,176 @@ class TestChildren:
         assert folder.name == "test folder 2"
         assert folder.path == "test folder/test folder 2/"
 
+    @pytest.mark.asyncio
+    async def test_iter_children(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "CHILDREN_BATCH_SIZE", 3)
+        for i in range(10):
+            (tmp_path / f"file-{i}.txt").write_bytes(b"data")
+        (tmp_path / "folder").mkdir()
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        children = [child async for child in provider.iter_children(item)]
+
+        assert sorted(child.name for child in children) == sorted(
+            [f"file-{i}.txt" for i in range(10)] + ["folder"]
+        )
+        assert [child.kind for child in children].count("folder") == 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("generic", [False, True])
+    async def test_children_page(self, tmp_path, generic):
+        names = [f"file-{i:02}.txt" for i in range(25)]
+        for name in reversed(names):
+            (tmp_path / name).write_bytes(b"data")
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+        children_page = (
+            functools.partial(base_provider.BaseProvider.children_page, provider)
+            if generic
+            else provider.children_page
+        )
+
+        pages, cursor = [], None
+        while True:
+            page, cursor = await children_page(item, 10, cursor)
+            pages.append([child.name for child in page])
+            if cursor is None:
+                break
+
+        assert pages == [names[:10], names[10:20], names[20:]]
+
+
+class TestSharedReads:
+    @pytest.mark.asyncio
+    async def test_concurrent_children_share_one_listing(self, tmp_path, monkeypatch):
+        (tmp_path / "a.txt").write_bytes(b"a")
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+        listings = []
+        _children = provider._children
+
+        def counting_children(path):
+            listings.append(path)
+            time.sleep(0.05)
+            return _children(path)
+
+        monkeypatch.setattr(provider, "_children", counting_children)
+
+        results = await asyncio.gather(*(provider.children(item) for _ in range(5)))
+
+        assert len(listings) == 1
+        assert all([child.name for child in result] == ["a.txt"] for result in results)
+        assert len({id(result) for result in results}) == 5  # each caller owns its list
+        assert len({id(result[0]) for result in results}) == 5  # and its items
+
+    @pytest.mark.asyncio
+    async def test_other_credentials_never_join(self, tmp_path, monkeypatch):
+        (tmp_path / "a.txt").write_bytes(b"a")
+        listings = []
+        _children = FileSystemProvider._children
+
+        def counting_children(self, path):
+            listings.append(self.auth)
+            time.sleep(0.05)
+            return _children(self, path)
+
+        monkeypatch.setattr(FileSystemProvider, "_children", counting_children)
+        alice = FileSystemProvider({"token": "alice"})
+        bob = FileSystemProvider({"token": "bob"})
+        item = await alice.validate_item(f"{tmp_path}/")
+
+        await asyncio.gather(
+            alice.children(item), bob.children(item), alice.children(item)
+        )
+
+        assert sorted(auth["token"] for auth in listings) == ["alice", "bob"]
+
+    @pytest.mark.asyncio
+    async def test_write_splits_listing_in_flight(self, tmp_path, monkeypatch):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+        started = threading.Event()
+        _children = provider._children
+
+        def slow_children(path):
+            children = _children(path)
+            started.set()
+            time.sleep(0.1)
+            return children
+
+        monkeypatch.setattr(provider, "_children", slow_children)
+
+        stale = asyncio.ensure_future(provider.children(item))
+        await aio.run(started.wait)
+        await provider.create_folder(
+            await provider.validate_item(f"{tmp_path}/"), "new folder"
+        )
+        fresh = await provider.children(item)
+
+        assert [child.name for child in fresh] == ["new folder"]
+        assert await stale == []
+
+
+class TestUsage:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self, monkeypatch):
+        monkeypatch.setattr(base_provider, "_USAGE_CACHE", collections.OrderedDict())
+
+    @pytest.mark.asyncio
+    async def test_usage(self, tmp_path):
+        (tmp_path / "folder" / "sub" / "deeper").mkdir(parents=True)
+        (tmp_path / "folder" / "empty").mkdir()
+        (tmp_path / "folder" / "a.txt").write_bytes(b"a" * 10)
+        (tmp_path / "folder" / "sub" / "b.txt").write_bytes(b"b" * 20)
+        (tmp_path / "folder" / "sub" / "deeper" / "c.txt").write_bytes(b"c" * 30)
+        os.symlink(tmp_path / "folder" / "sub", tmp_path / "folder" / "link")
+
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/folder/")
+        usage = await provider.usage(item)
+
+        assert usage["files"] == 4  # the symlink counts as a file and isn't followed
+        assert usage["folders"] == 3
+        assert usage["size"] == 60 + os.lstat(tmp_path / "folder" / "link").st_size
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("ttl,expected_walks", [(60, 1), (0, 2)])
+    async def test_usage_cached(self, tmp_path, monkeypatch, ttl, expected_walks):
+        monkeypatch.setattr(settings, "USAGE_CACHE_TTL", ttl)
+        (tmp_path / "folder").mkdir()
+        (tmp_path / "folder" / "a.txt").write_bytes(b"a" * 10)
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/folder/")
+
+        walks = []
+        walk = provider._usage
+
+        async def counting_walk(*args):
+            walks.append(args)
+            return await walk(*args)
+
+        monkeypatch.setattr(provider, "_usage", counting_walk)
+
+        assert (await provider.usage(item))["size"] == 10
+        assert (await provider.usage(item))["size"] == 10
+        assert len(walks) == expected_walks
+
+    @pytest.mark.asyncio
+    async def test_usage_etag_change(self, tmp_path):
+        (tmp_path / "folder").mkdir()
+        (tmp_path / "folder" / "a.txt").write_bytes(b"a" * 10)
+        provider = FileSystemProvider({})
+
+        item = await provider.validate_item(f"{tmp_path}/folder/")
+        assert (await provider.usage(item))["files"] == 1
+
+        (tmp_path / "folder" / "b.txt").write_bytes(b"b" * 10)
+        os.utime(tmp_path / "folder", (0, 0))
+
+        item = await provider.validate_item(f"{tmp_path}/folder/")
+        assert (await provider.usage(item))["files"] == 2
+
 
 class TestMetadata:
     """
@@ -458,3 +637,141 @@ class TestOperations:
 
     def test_can_intra_move(self, provider):
         assert provider.can_intra_move(provider)
+
+
+class FailingStream:
+    """Yields some data, then fails like a dropped client connection"""
+
+    size = 1024
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield b"partial"
+        raise ConnectionResetError()
+
+
+class TestAtomicUpload:
+    @pytest.mark.asyncio
+    async def test_upload_preallocated(self, tmp_path):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        stream = StringStream(b"test data")
+        stream._size = 1024  # declared bigger than what is sent
+        await provider.upload(item, stream=stream, new_name="upload.txt")
+
+        assert (tmp_path / "upload.txt").read_bytes() == b"test data"
+        assert os.listdir(tmp_path) == ["upload.txt"]
+
+    @pytest.mark.asyncio
+    async def test_upload_permissions_follow_umask(self, tmp_path):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        umask = os.umask(0o027)
+        try:
+            await provider.upload(
+                item, stream=StringStream(b"test data"), new_name="upload.txt"
+            )
+        finally:
+            os.umask(umask)
+
+        assert os.stat(tmp_path / "upload.txt").st_mode & 0o777 == 0o640
+
+    @pytest.mark.asyncio
+    async def test_upload_syncs_the_folder(self, tmp_path, monkeypatch):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+        synced = []
+        fsync = os.fsync
+
+        def recording_fsync(fd):
+            synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+            fsync(fd)
+
+        monkeypatch.setattr(os, "fsync", recording_fsync)
+        await provider.upload(
+            item, stream=StringStream(b"test data"), new_name="upload.txt"
+        )
+
+        assert synced == [False, True]  # the file, then the rename in its folder
+
+    @pytest.mark.asyncio
+    async def test_temp_files_are_not_listed(self, tmp_path):
+        (tmp_path / "a.txt").write_bytes(b"a")
+        (tmp_path / ".upload-0123456789abcdef").write_bytes(b"in progress")
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        assert [child.name for child in await provider.children(item)] == ["a.txt"]
+        assert [child.name async for child in provider.iter_children(item)] == ["a.txt"]
+        page, _ = await provider.children_page(item, 10)
+        assert [child.name for child in page] == ["a.txt"]
+        assert (await provider.usage(item))["files"] == 1
+        assert (tmp_path / ".upload-0123456789abcdef").exists()
+
+    @pytest.mark.asyncio
+    async def test_stale_temp_files_are_removed(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_STALE_AFTER", 60)
+        stale = tmp_path / ".upload-0123456789abcdef"
+        stale.write_bytes(b"left behind")
+        os.utime(stale, (time.time() - 120, time.time() - 120))
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        assert await provider.children(item) == []
+        assert not stale.exists()
+
+    @pytest.mark.asyncio
+    async def test_upload_coalesces_writes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_BUFFER_SIZE", 4)
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        stream = StringStream(b"test data")
+        stream.CHUNK_SIZE = 1
+        await provider.upload(item, stream=stream, new_name="upload.txt")
+
+        assert (tmp_path / "upload.txt").read_bytes() == b"test data"
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_leaves_nothing(self, tmp_path):
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        with pytest.raises(ConnectionResetError):
+            await provider.upload(item, stream=FailingStream(), new_name="upload.txt")
+
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_failed_replace_keeps_original(self, tmp_path):
+        (tmp_path / "upload.txt").write_bytes(b"original")
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        with pytest.raises(ConnectionResetError):
+            await provider.upload(
+                item, stream=FailingStream(), new_name="upload.txt", conflict="replace"
+            )
+
+        assert (tmp_path / "upload.txt").read_bytes() == b"original"
+        assert os.listdir(tmp_path) == ["upload.txt"]
+
+    @pytest.mark.asyncio
+    async def test_replace_is_a_rename(self, tmp_path):
+        (tmp_path / "upload.txt").write_bytes(b"original")
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(f"{tmp_path}/")
+
+        await provider.upload(
+            item,
+            stream=StringStream(b"test data"),
+            new_name="upload.txt",
+            conflict="replace",
+        )
+
+        assert (tmp_path / "upload.txt").read_bytes() == b"test data"
+        assert os.listdir(tmp_path) == ["upload.txt"]
@@ -1,12 +1,11 @@
 import pytest
 import asyncio
-import aiohttp
 
 from aquavalet.streams.http import RequestStreamReader, ResponseStreamReader
 from aquavalet.streams.file import FileStreamReader
 from aquavalet.streams.zip import ZipStreamReader, ZipStreamGeneratorReader
 
-from aiohttp.web_request import Request
+from aiohttp.test_utils import make_mocked_request
 
 from aiohttp.client_reqrep import ClientResponse
 
@@ -17,9 +16,9 @@ class RequestStreamFactory:
         reader.feed_data(stream_data)
         reader.feed_eof()
 
-        headers = {"Content-Length": len(stream_data)}
-        request = Request(uri="http://fake.com", headers=headers, body=stream_data)
-        return RequestStreamReader(request, reader)
+        headers = {"Content-Length": str(len(stream_data))}
+        request = make_mocked_request("PUT", "/", headers=headers, payload=reader)
+        return RequestStreamReader(request)
 
 
 @pytest.fixture()
@@ -37,10 +36,9 @@ async def zip_generator(fs, provider):
     fs.create_file("test folder/test-2.txt", contents=b"test-2")
     fs.create_file("test folder/test folder 2/test-3.txt", contents=b"test-3")
 
-    session = aiohttp.ClientSession()
     item = await provider.validate_item("/")
     children = await provider.children(item)
-    return ZipStreamGeneratorReader(provider, item, children, session)
+    return ZipStreamGeneratorReader(provider, item, children)
 
 
 @pytest.fixture()
@@ -0,0 +1,99 @@
+import types
+import email.parser
+import email.policy
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import settings
+from aquavalet.streams.byteranges import coalesce_ranges
+from aquavalet.providers.filesystem import FileSystemProvider
+from aquavalet.providers.osfstorage.provider import OSFStorageProvider
+
+DATA = bytes(range(256)) * 64  # 16KB
+
+
+def parse_multipart(content_type, body):
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+    )
+    return [
+        (part["Content-Range"], part.get_payload(decode=True))
+        for part in message.iter_parts()
+    ]
+
+
+async def read_all(stream):
+    body = b""
+    async for chunk in stream:
+        body += chunk
+    return body
+
+
+class TestCoalesceRanges:
+    def test_coalesce(self):
+        assert coalesce_ranges([(0, 9), (15, 19), (100, 109)], gap=10) == [
+            ((0, 19), [(0, 9), (15, 19)]),
+            ((100, 109), [(100, 109)]),
+        ]
+        assert coalesce_ranges([(0, 9), (15, 19)], gap=0) == [
+            ((0, 9), [(0, 9)]),
+            ((15, 19), [(15, 19)]),
+        ]
+
+
+class TestFileSystemRanges:
+    @pytest.mark.asyncio
+    async def test_download_ranges(self, tmp_path):
+        (tmp_path / "data.bin").write_bytes(DATA)
+        provider = FileSystemProvider({})
+        item = await provider.validate_item(str(tmp_path / "data.bin"))
+
+        stream = await provider.download_ranges(item, [(0, 9), (1000, 1999)])
+        body = await read_all(stream)
+
+        assert len(body) == stream.content_length
+        assert stream.content_type.startswith("multipart/byteranges; boundary=")
+        assert parse_multipart(stream.content_type, body) == [
+            (f"bytes 0-9/{len(DATA)}", DATA[0:10]),
+            (f"bytes 1000-1999/{len(DATA)}", DATA[1000:2000]),
+        ]
+        assert stream.at_eof()
+
+
+class TestOsfRanges:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "gap, upstream",
+        [(0, ["bytes=0-9", "bytes=100-199", "bytes=10000-10099"]), (200, None)],
+    )
+    async def test_download_ranges(self, tmp_path, monkeypatch, gap, upstream):
+        monkeypatch.setattr(settings, "RANGE_COALESCE_GAP", gap)
+        (tmp_path / "data.bin").write_bytes(DATA)
+        requested = []
+
+        async def download(request):
+            requested.append(request.headers["Range"])
+            return web.FileResponse(tmp_path / "data.bin")
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", download)
+
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            provider = OSFStorageProvider({}, session=session)
+            provider.BASE_URL = str(server.make_url("/"))
+            provider.resource, provider.internal_provider = "guid0", "osfstorage"
+            item = types.SimpleNamespace(id="/file", name="data.bin", size=len(DATA))
+
+            ranges = [(0, 9), (100, 199), (10000, 10099)]
+            stream = await provider.download_ranges(item, ranges)
+            body = await read_all(stream)
+
+        assert len(body) == stream.content_length
+        assert parse_multipart(stream.content_type, body) == [
+            (f"bytes {start}-{end}/{len(DATA)}", DATA[start : end + 1])
+            for start, end in ranges
+        ]
+        assert sorted(requested) == (upstream or ["bytes=0-199", "bytes=10000-10099"])
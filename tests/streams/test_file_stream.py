@@ -1,4 +1,8 @@
+import socket
+import asyncio
+
 import pytest
+from aquavalet.streams.file import FileStreamReader
 from tests.streams.fixtures import file_stream
 
 
@@ -41,3 +45,79 @@ class TestFileStream:
     @pytest.mark.asyncio
     async def test_file_stream_size(self, file_stream):
         assert file_stream.size == 4
+
+
+class TestFileStreamSendfile:
+    async def sendfile(self, stream):
+        rsock, wsock = socket.socketpair()
+        reader, _rwriter = await asyncio.open_unix_connection(sock=rsock)
+        _wreader, writer = await asyncio.open_unix_connection(sock=wsock)
+
+        sent = await stream.sendfile(writer.transport)
+        writer.close()
+        return sent, await reader.read()
+
+    @pytest.mark.asyncio
+    async def test_sendfile(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test")
+
+        stream = FileStreamReader(open(path, "rb"))
+        assert stream.content_length == 4
+        assert await self.sendfile(stream) == (4, b"test")
+
+    @pytest.mark.asyncio
+    async def test_sendfile_range(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test")
+
+        stream = FileStreamReader(open(path, "rb"), range=(1, 2))
+        assert stream.content_length == 2
+        assert await self.sendfile(stream) == (2, b"es")
+
+    @pytest.mark.asyncio
+    async def test_sendfile_range_past_end(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test")
+
+        stream = FileStreamReader(open(path, "rb"), range=(2, 7))
+        assert stream.content_length == 2
+        assert await self.sendfile(stream) == (2, b"st")
+
+
+class TestFileStreamRange:
+    @pytest.mark.asyncio
+    async def test_range_is_read_in_chunks(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test data")
+
+        stream = FileStreamReader(open(path, "rb"), range=(0, 4294967295))
+        stream.CHUNK_SIZE = 4
+
+        assert [chunk async for chunk in stream] == [b"test", b" dat", b"a"]
+        assert stream.at_eof()
+
+    @pytest.mark.asyncio
+    async def test_range_open_ended(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test data")
+
+        stream = FileStreamReader(open(path, "rb"), range=(5, None))
+
+        assert stream.size == 4
+        assert await stream.read(2) == b"da"
+        assert not stream.at_eof()
+        assert await stream.read() == b"ta"
+        assert stream.at_eof()
+
+    @pytest.mark.asyncio
+    async def test_content_range(self, tmp_path):
+        path = tmp_path / "test.txt"
+        path.write_bytes(b"test data")
+
+        assert FileStreamReader(open(path, "rb")).content_range is None
+        stream = FileStreamReader(open(path, "rb"), range=(2, 4))
+        assert stream.content_range == "bytes 2-4/9"
+        assert stream.content_length == 3
+        stream = FileStreamReader(open(path, "rb"), range=(5, 100))
+        assert stream.content_range == "bytes 5-8/9"
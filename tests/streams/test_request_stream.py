@@ -1,4 +1,9 @@
+import asyncio
+
 import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from aquavalet.streams.http import RequestStreamReader
 from tests.streams.fixtures import RequestStreamFactory
 
 
@@ -34,3 +39,14 @@ class TestRequestStream:
         stream = RequestStreamFactory()
 
         assert stream.size == 9
+
+    @pytest.mark.asyncio
+    async def test_request_stream_size_chunked(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"test data")
+        reader.feed_eof()
+        request = make_mocked_request("PUT", "/", payload=reader)
+        stream = RequestStreamReader(request)
+
+        assert stream.size is None
+        assert await stream.read() == b"test data"
@@ -0,0 +1,88 @@
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aquavalet import exceptions
+from aquavalet.streams.http import ResponseStreamReader, parse_content_range
+
+DATA = bytes(range(256)) * 4
+
+
+def make_app(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(DATA)
+
+    async def ranged(request):
+        return web.FileResponse(path)
+
+    async def ignores_range(request):
+        return web.Response(body=DATA)
+
+    async def wrong_range(request):
+        return web.Response(
+            status=206, body=DATA[:10], headers={"Content-Range": "bytes 0-9/1024"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/ranged", ranged)
+    app.router.add_get("/ignores-range", ignores_range)
+    app.router.add_get("/wrong-range", wrong_range)
+    return app
+
+
+async def download(server, route, range=None):
+    session = aiohttp.ClientSession()
+    headers = {}
+    if range:
+        headers["Range"] = "bytes={}-{}".format(
+            range[0], "" if range[1] is None else range[1]
+        )
+    response = await session.get(server.make_url(route), headers=headers)
+    response.session = session
+    return response
+
+
+class TestParseContentRange:
+    def test_parse(self):
+        assert parse_content_range("bytes 0-9/1024") == (0, 9, 1024)
+        assert parse_content_range("bytes 5-9/*") == (5, 9, None)
+        assert parse_content_range("items 0-9/10") is None
+        assert parse_content_range(None) is None
+
+
+class TestResponseStreamRange:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("route", ["/ranged", "/ignores-range"])
+    @pytest.mark.parametrize("range", [(1000, 1009), (1000, None), (0, 3)])
+    async def test_only_requested_bytes(self, tmp_path, route, range):
+        async with TestServer(make_app(tmp_path)) as server:
+            response = await download(server, route, range)
+            stream = ResponseStreamReader(response, range)
+
+            end = len(DATA) - 1 if range[1] is None else range[1]
+            assert stream.partial
+            assert stream.content_range == f"bytes {range[0]}-{end}/{len(DATA)}"
+            assert stream.content_length == end - range[0] + 1
+            assert await stream.read() == DATA[range[0] : end + 1]
+            await response.session.close()
+
+    @pytest.mark.asyncio
+    async def test_mismatched_content_range(self, tmp_path):
+        async with TestServer(make_app(tmp_path)) as server:
+            response = await download(server, "/wrong-range", (100, 109))
+            with pytest.raises(exceptions.DownloadError):
+                ResponseStreamReader(response, (100, 109))
+            await response.session.close()
+
+    @pytest.mark.asyncio
+    async def test_no_range(self, tmp_path):
+        async with TestServer(make_app(tmp_path)) as server:
+            response = await download(server, "/ranged")
+            stream = ResponseStreamReader(response)
+
+            assert not stream.partial
+            assert stream.content_range is None
+            assert stream.content_length == len(DATA)
+            assert await stream.read() == DATA
+            await response.session.close()
@@ -29,8 +29,6 @@ class TestZipStreamGeneratorReader:
         with pytest.raises(StopAsyncIteration):
             await zip_generator.__anext__()
 
-        await zip_generator.session.close()
-
 
 class TestZipStreamReader:
     @pytest.mark.asyncio